@@ -0,0 +1,185 @@
+"""benchmark_async_handlers.py
+
+Compares the throughput (requests per second) and latency percentiles of
+the async handlers of GET and PATCH /v1/system_components/:name against
+sync handlers running the same code in the threadpool, as the API served
+them before. Many agents hold keep-alive connections open at once, each
+sending a request as soon as the last is answered; 1 in 10 is a PATCH.
+
+    python scripts/benchmark_async_handlers.py
+
+Both apps are served by a single uvicorn worker.
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import typing as t
+
+from fastapi import FastAPI
+from fastapi import HTTPException
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.main import in_memory_db
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+N_COMPONENTS = 1_000
+CONNECTIONS = [100, 1_000]
+DURATION_SECONDS = 5
+
+# the handlers as they were before they became coroutines
+sync_app = FastAPI()
+
+
+@sync_app.post("/v1/system_components", response_model=SystemComponent)
+def create_system_component(component: SystemComponent) -> None:
+    if not api_utils.create_system_component(component, in_memory_db):
+        raise HTTPException(status_code=409)
+
+    return component
+
+
+@sync_app.get("/v1/system_components/{component_name}", response_model=SystemComponent)
+def read_system_component(component_name: str) -> t.Dict[str, str]:
+    if component_name not in in_memory_db["system_components"]:
+        raise HTTPException(status_code=404)
+
+    return api_utils.get_system_component(component_name, in_memory_db)
+
+
+@sync_app.patch(
+    "/v1/system_components/{component_name}", response_model=SystemComponent
+)
+def update_system_component(
+    component_name: str, updated_component: SystemComponentUpdate
+) -> None:
+    usage_report = updated_component.copy(update={"name": component_name})
+    result = api_utils.apply_usage_report(usage_report, in_memory_db)
+    if result["status_code"] != 200:
+        raise HTTPException(status_code=result["status_code"])
+
+    return api_utils.get_system_component(component_name, in_memory_db)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def http_request(method: str, path: str, body: t.Optional[dict] = None) -> bytes:
+    payload = b"" if body is None else json.dumps(body).encode()
+    head = (
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+    )
+
+    return head.encode() + payload
+
+
+async def read_response(reader: asyncio.StreamReader) -> None:
+    head = await reader.readuntil(b"\r\n\r\n")
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            await reader.readexactly(int(line.split(b":")[1]))
+            return
+
+
+async def agent(
+    port: int, agent_id: int, deadline: float, latencies: t.List[float]
+) -> None:
+    """Send requests over one keep-alive connection until the deadline."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    n_requests = 0
+    while time.perf_counter() < deadline:
+        path = (
+            f"/v1/system_components/Component{(agent_id + n_requests) % N_COMPONENTS}"
+        )
+        if n_requests % 10 == 0:
+            body = {"current_storage_useage": n_requests % 400 + 1}
+            request = http_request("PATCH", path, body)
+        else:
+            request = http_request("GET", path)
+
+        start = time.perf_counter()
+        writer.write(request)
+        await read_response(reader)
+        latencies.append(time.perf_counter() - start)
+        n_requests += 1
+
+    writer.close()
+
+
+async def load_test(port: int, n_connections: int) -> t.Tuple[float, float, float]:
+    """Return requests per second, and the p50 and p99 latencies (in ms)."""
+    latencies = []
+    deadline = time.perf_counter() + DURATION_SECONDS
+    await asyncio.gather(
+        *(agent(port, i, deadline, latencies) for i in range(n_connections))
+    )
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[int(len(latencies) * p / 100)] * 1000
+
+    return len(latencies) / DURATION_SECONDS, percentile(50), percentile(99)
+
+
+async def seed(port: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for i in range(N_COMPONENTS):
+        body = {"name": f"Component{i}", "total_available_storage": 400}
+        writer.write(http_request("POST", "/v1/system_components", body))
+        await read_response(reader)
+    writer.close()
+
+
+async def wait_until_up(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+
+    raise RuntimeError("the server did not start")
+
+
+if __name__ == "__main__":
+    scripts = os.path.dirname(os.path.abspath(__file__))
+    apps = {
+        "sync": ["--app-dir", scripts, "benchmark_async_handlers:sync_app"],
+        "async": ["diskspacemonitor.main:app"],
+    }
+
+    print(
+        f"{'handlers':>8} | {'connections':>11} | {'req/sec':>8} | {'p50 ms':>7} | {'p99 ms':>7}"
+    )
+
+    for name, app in apps.items():
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                *(sys.executable, "-m", "uvicorn", *app),
+                *("--port", str(port), "--log-level", "warning", "--backlog", "4096"),
+            ]
+        )
+        try:
+            asyncio.run(wait_until_up(port))
+            asyncio.run(seed(port))
+            for n_connections in CONNECTIONS:
+                throughput, p50, p99 = asyncio.run(load_test(port, n_connections))
+                print(
+                    f"{name:>8} | {n_connections:>11} | {throughput:>8.0f} | "
+                    f"{p50:>7.1f} | {p99:>7.1f}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,46 @@
+"""benchmark_batch_ingest.py
+
+Compares reporting storage useage for many components with one PATCH
+request per component against a single POST /v1/component_events:batch
+request. Requests are sent through the FastAPI test client, so the
+figures exclude the network but include the per request HTTP overhead.
+
+    python scripts/benchmark_batch_ingest.py
+"""
+import time
+
+from fastapi.testclient import TestClient
+
+from diskspacemonitor.main import app
+
+N_COMPONENTS = 2_000
+
+
+if __name__ == "__main__":
+
+    client = TestClient(app)
+
+    for i in range(N_COMPONENTS):
+        client.post(
+            "/v1/system_components",
+            json={"name": f"Component{i}", "total_available_storage": 400},
+        )
+
+    reports = [
+        {"name": f"Component{i}", "current_storage_useage": i % 400}
+        for i in range(N_COMPONENTS)
+    ]
+
+    start = time.perf_counter()
+    for report in reports:
+        client.patch(f"/v1/system_components/{report['name']}", json=report)
+    patch_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.post("/v1/component_events:batch", json=reports)
+    batch_elapsed = time.perf_counter() - start
+
+    print(f"{N_COMPONENTS} useage reports")
+    print(f"{'one PATCH per report':>22}: {patch_elapsed:.2f}s")
+    print(f"{'one batch request':>22}: {batch_elapsed:.2f}s")
+    print(f"{'speedup':>22}: {patch_elapsed / batch_elapsed:.1f}x")
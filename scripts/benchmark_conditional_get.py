@@ -0,0 +1,129 @@
+"""benchmark_conditional_get.py
+
+Measures the CPU time a polling dashboard costs the API with and without
+conditional GETs. Every poll the dashboard lists the components, their
+latest useages and the resource warnings, and reads the details and
+recent history of the components it watches. Between polls agents report
+the useage of some components.
+
+With ETags, the dashboard sends back the ETag of its last response for
+each URL, and data which has not changed is answered with 304 Not
+Modified. Requests are made by calling the ASGI app directly, so the
+figures exclude the network and the server.
+
+    python scripts/benchmark_conditional_get.py
+"""
+import asyncio
+import random
+import time
+import typing as t
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.main import app
+from diskspacemonitor.main import in_memory_db
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+N_COMPONENTS = 1_000
+N_EVENTS_PER_COMPONENT = 100
+N_WATCHED = 50
+N_POLLS = 20
+# agent reports between two polls of the dashboard
+REPORTS_PER_POLL = [0, 10, 100]
+
+DASHBOARD_URLS = [
+    ("/v1/system_components", b"limit=100"),
+    ("/v1/component_events", b"limit=1000"),
+    ("/v1/resource_warnings", b"limit=100"),
+] + [
+    url
+    for i in range(N_WATCHED)
+    for url in [
+        (f"/v1/system_components/Component{i}", b""),
+        (f"/v1/component_events/Component{i}/history", b"limit=100"),
+    ]
+]
+
+
+async def get(path: str, query_string: bytes, etag: t.Optional[str]) -> tuple:
+    """Return the status and ETag of a response."""
+    headers = [(b"host", b"localhost")]
+    if etag is not None:
+        headers.append((b"if-none-match", etag.encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": headers,
+        "server": ("localhost", 80),
+        "client": ("localhost", 50000),
+    }
+    response = {}
+
+    async def receive() -> t.Dict[str, t.Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: t.Dict[str, t.Any]) -> None:
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["etag"] = dict(message["headers"]).get(b"etag", b"").decode()
+
+    await app(scope, receive, send)
+
+    return response["status"], response["etag"]
+
+
+def report_useages(n_reports: int) -> None:
+    for _ in range(n_reports):
+        usage_report = SystemComponentUpdate(
+            name=f"Component{random.randrange(N_COMPONENTS)}",
+            current_storage_useage=random.randint(1, 400),
+        )
+        api_utils.apply_usage_report(usage_report, in_memory_db)
+
+
+async def poll(n_reports: int, use_etags: bool) -> t.Tuple[float, float]:
+    """Return the CPU time (ms) per poll and the share of 304 responses."""
+    etags, cpu_seconds, not_modified = {}, 0.0, 0
+    for _ in range(N_POLLS):
+        report_useages(n_reports)
+
+        start = time.process_time()
+        for path, query in DASHBOARD_URLS:
+            etag = etags.get(path) if use_etags else None
+            status, etags[path] = await get(path, query, etag)
+            not_modified += status == 304
+        cpu_seconds += time.process_time() - start
+
+    n_requests = N_POLLS * len(DASHBOARD_URLS)
+
+    return cpu_seconds / N_POLLS * 1000, not_modified / n_requests
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    for i in range(N_COMPONENTS):
+        component = SystemComponent(name=f"Component{i}", total_available_storage=400)
+        api_utils.create_system_component(component, in_memory_db)
+    report_useages(N_COMPONENTS * N_EVENTS_PER_COMPONENT)
+
+    print(f"{len(DASHBOARD_URLS)} requests per poll, {N_COMPONENTS} components")
+    print(
+        f"{'reports/poll':>12} | {'no ETags ms':>11} | {'ETags ms':>8} | "
+        f"{'304s':>5} | {'CPU saved':>9}"
+    )
+
+    for n_reports in REPORTS_PER_POLL:
+        without_etags, _ = asyncio.run(poll(n_reports, use_etags=False))
+        with_etags, not_modified = asyncio.run(poll(n_reports, use_etags=True))
+        saved = 1 - with_etags / without_etags
+        print(
+            f"{n_reports:>12} | {without_etags:>11.1f} | {with_etags:>8.1f} | "
+            f"{not_modified:>5.0%} | {saved:>9.0%}"
+        )
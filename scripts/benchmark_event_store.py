@@ -0,0 +1,67 @@
+"""benchmark_event_store.py
+
+Compares the event history storage engines selectable in
+settings.EVENT_STORE: the bytes held per event, the cost of appending an
+event, and the cost of reading a page of history back out.
+
+    python scripts/benchmark_event_store.py
+"""
+import time
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.history import EVENT_STORES
+from diskspacemonitor.models.component_event import ComponentEvent
+
+N_EVENTS = 200_000
+PAGE_SIZE = 100
+
+
+def make_events(n_events: int) -> list:
+    start_ns = api_utils.return_epoch_ns()
+
+    return [
+        ComponentEvent(
+            event_id=api_utils.return_uuid(),
+            timestamp=api_utils.return_timestamp(start_ns + i * 10**9),
+            epoch_ns=start_ns + i * 10**9,
+            component_name="BuildSystem",
+            total_available_storage=600,
+            storage_limit=90,
+            current_storage_useage=i % 600,
+        )
+        for i in range(n_events)
+    ]
+
+
+if __name__ == "__main__":
+
+    events = make_events(N_EVENTS)
+
+    print(f"{N_EVENTS} events, pages of {PAGE_SIZE}")
+    print(
+        f"{'store':>10} | {'bytes/event':>11} | {'append (us)':>11} | "
+        f"{'page (ms)':>9} | {'expire half (ms)':>16}"
+    )
+
+    for name, event_store in EVENT_STORES.items():
+        event_history = event_store("BuildSystem")
+
+        start = time.perf_counter()
+        for event in events:
+            event_history.append(event)
+        append_us = (time.perf_counter() - start) / N_EVENTS * 1e6
+
+        bytes_per_event = event_history.nbytes() / N_EVENTS
+
+        start = time.perf_counter()
+        event_history.page(N_EVENTS // 2, N_EVENTS // 2 + PAGE_SIZE)
+        page_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        event_history.expire(events[N_EVENTS // 2].epoch_ns)
+        expire_ms = (time.perf_counter() - start) * 1000
+
+        print(
+            f"{name:>10} | {bytes_per_event:>11.1f} | {append_us:>11.2f} | "
+            f"{page_ms:>9.2f} | {expire_ms:>16.2f}"
+        )
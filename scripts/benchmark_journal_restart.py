@@ -0,0 +1,76 @@
+"""benchmark_journal_restart.py
+
+Measures cold start time with the journal persistence backend as the
+number of recorded writes grows, comparing a restart which replays the
+whole log against one which reads a snapshot and replays the log tail.
+
+Retention is set to 1,000 events per component, so once the log has
+been compacted the restart time stops growing with the write history.
+
+    python scripts/benchmark_journal_restart.py
+"""
+import os
+import tempfile
+import time
+
+import diskspacemonitor.settings as settings
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.storage.journal import JournalBackend
+
+N_COMPONENTS = 50
+TAIL_WRITES = 1_000
+settings.MAX_EVENTS_PER_COMPONENT = 1_000
+
+
+def record_history(directory: str, n_writes: int, compact: bool) -> None:
+    backend = JournalBackend(
+        os.path.join(directory, "monitor.journal"),
+        os.path.join(directory, "monitor.snapshot"),
+        fsync="os",
+        compact_every=n_writes * 2,
+    )
+    database = api_utils.create_in_memory_db(backend)
+
+    components = [
+        SystemComponent(name=f"Component{i}", total_available_storage=400)
+        for i in range(N_COMPONENTS)
+    ]
+    for component in components:
+        api_utils.register_system_component(component, database)
+
+    for i in range(n_writes):
+        if compact and i == n_writes - TAIL_WRITES:
+            api_utils.snapshot_in_memory_db(database)
+        api_utils.register_system_event(components[i % N_COMPONENTS], database)
+
+    backend.close()
+
+
+def time_restart(directory: str) -> float:
+    start = time.perf_counter()
+    backend = JournalBackend(
+        os.path.join(directory, "monitor.journal"),
+        os.path.join(directory, "monitor.snapshot"),
+    )
+    database = api_utils.create_in_memory_db(backend)
+    api_utils.load_in_memory_db(database)
+    elapsed = time.perf_counter() - start
+    backend.close()
+
+    return elapsed
+
+
+if __name__ == "__main__":
+
+    print(f"{N_COMPONENTS} components, 1000 events retained per component")
+    print(f"{'writes':>8} | {'log replay (s)':>14} | {'snapshot + tail (s)':>19}")
+
+    for n_writes in (10_000, 50_000, 100_000, 200_000):
+        timings = []
+        for compact in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                record_history(directory, n_writes, compact)
+                timings.append(time_restart(directory))
+
+        print(f"{n_writes:>8} | {timings[0]:>14.2f} | {timings[1]:>19.2f}")
@@ -0,0 +1,61 @@
+"""benchmark_resource_warnings.py
+
+Times how long it takes to list resource warnings as the event history
+of the monitored system grows. The number of warnings is held constant,
+so the latency should stay flat no matter how many events are stored.
+
+    python scripts/benchmark_resource_warnings.py
+"""
+import time
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.warn import WarningEnum
+
+N_COMPONENTS = 100
+N_WARNINGS = 1_000
+REPEATS = 20
+
+
+def build_database(events_per_component: int) -> dict:
+    database = api_utils.create_in_memory_db()
+
+    components = [
+        SystemComponent(name=f"Component{i}", total_available_storage=400)
+        for i in range(N_COMPONENTS)
+    ]
+    warnings_per_component = N_WARNINGS // N_COMPONENTS
+
+    for component in components:
+        api_utils.register_system_component(component, database)
+        for i in range(events_per_component):
+            warning = (
+                WarningEnum.over_memory_limit if i < warnings_per_component else None
+            )
+            api_utils.register_system_event(component, database, warning)
+
+    return database
+
+
+def time_listing(database: dict) -> float:
+    system_components = database["system_events"].keys()
+
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        warning_objects = api_utils.get_all_warnings(system_components, database)
+        api_utils.list_warning_dicts(warning_objects, database)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / REPEATS
+
+
+if __name__ == "__main__":
+
+    print(f"{N_COMPONENTS} components, {N_WARNINGS} warnings")
+    print(f"{'total events':>14} | {'list warnings (ms)':>18}")
+
+    for events_per_component in (10, 100, 1_000, 5_000):
+        database = build_database(events_per_component)
+        total_events = events_per_component * N_COMPONENTS
+        latency_ms = time_listing(database) * 1000
+        print(f"{total_events:>14} | {latency_ms:>18.2f}")
@@ -0,0 +1,104 @@
+"""benchmark_rules.py
+
+Measures the CPU time of a useage report as the number of warning rules
+grows, with the rules of each component compiled into its evaluation plan
+once against the rules interpreted on every report. Rules name other
+components, or groups of them, so each report is checked against every
+rule but few apply.
+
+Also measures the evaluation of a single useage in the warning band, by
+the compiled plan against the exceptions SystemComponent raises.
+
+    python scripts/benchmark_rules.py
+"""
+import random
+import time
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor import rules
+from diskspacemonitor import warn
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+N_COMPONENTS = 1_000
+N_REPORTS = 20_000
+N_RULES = [0, 10, 100, 1_000]
+N_EVALUATIONS = 200_000
+
+
+def make_rules(n_rules: int) -> list:
+    kinds = list(rules.RuleKind)
+    warning_rules = []
+    for i in range(n_rules):
+        # a third of the rules are for groups, the rest for single components
+        components = f"group{i}-*" if i % 3 == 0 else f"Component{i}"
+        threshold = {"absolute": 20, "percentage": 90, "growth_rate": 50}
+        kind = kinds[i % len(kinds)]
+        warning_rules.append(
+            {"components": components, "kind": kind, "threshold": threshold[kind]}
+        )
+
+    return warning_rules
+
+
+def us_per_report(n_rules: int, compiled: bool) -> float:
+    database = api_utils.create_in_memory_db()
+    database["rules"] = rules.RuleEngine(make_rules(n_rules))
+    if not compiled:
+        engine = database["rules"]
+        engine.plan_for = lambda name: rules.compile_plan(name, engine.rules)
+
+    for i in range(N_COMPONENTS):
+        component = SystemComponent(name=f"Component{i}", total_available_storage=400)
+        api_utils.create_system_component(component, database)
+
+    usage_reports = [
+        SystemComponentUpdate(
+            name=f"Component{random.randrange(N_COMPONENTS)}",
+            current_storage_useage=random.randint(1, 400),
+        )
+        for _ in range(N_REPORTS)
+    ]
+
+    start = time.process_time()
+    for usage_report in usage_reports:
+        api_utils.apply_usage_report(usage_report, database)
+
+    return (time.process_time() - start) / N_REPORTS * 1e6
+
+
+def ns_per_evaluation() -> tuple:
+    plan = rules.compile_plan("Component0", [])
+    component = SystemComponent(name="Component0", total_available_storage=400)
+
+    start = time.process_time()
+    for _ in range(N_EVALUATIONS):
+        plan.evaluate(400, 100, 395)
+    compiled = time.process_time() - start
+
+    start = time.process_time()
+    for _ in range(N_EVALUATIONS):
+        try:
+            component.set_current_storage_useage(395)
+        except warn.CloseToMemoryLimitError:
+            pass
+    raised = time.process_time() - start
+
+    return compiled / N_EVALUATIONS * 1e9, raised / N_EVALUATIONS * 1e9
+
+
+if __name__ == "__main__":
+    random.seed(0)
+
+    print(f"CPU time per useage report (microseconds), {N_COMPONENTS} components")
+    print(f"{'rules':>6} | {'interpreted':>11} | {'compiled':>8}")
+    for n_rules in N_RULES:
+        interpreted = us_per_report(n_rules, compiled=False)
+        compiled = us_per_report(n_rules, compiled=True)
+        print(f"{n_rules:>6} | {interpreted:>11.1f} | {compiled:>8.1f}")
+
+    compiled, raised = ns_per_evaluation()
+    print()
+    print("evaluating a useage close to the limit (nanoseconds)")
+    print(f"  compiled plan:    {compiled:>6.0f}")
+    print(f"  raised exception: {raised:>6.0f}")
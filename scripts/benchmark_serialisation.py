@@ -0,0 +1,142 @@
+"""benchmark_serialisation.py
+
+Measures the CPU time per request of our hottest read endpoints, with
+responses encoded straight to bytes (and the latest events encoded once,
+as they are registered) against responses validated against their
+response model and converted by jsonable_encoder, as before.
+
+Requests are made by calling the ASGI apps directly, so the figures
+exclude the network and the server but include routing, parameter
+parsing and serialisation.
+
+    python scripts/benchmark_serialisation.py
+"""
+import asyncio
+import time
+import typing as t
+
+from fastapi import FastAPI
+from fastapi import HTTPException
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.main import app
+from diskspacemonitor.main import in_memory_db
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+N_COMPONENTS = 1_000
+N_EVENTS_PER_COMPONENT = 100
+N_REQUESTS = 2_000
+
+ENDPOINTS = [
+    ("/v1/system_components/Component0", b""),
+    ("/v1/component_events/Component0", b""),
+    ("/v1/component_events/Component0/history", b"limit=100"),
+    ("/v1/system_components", b"limit=100"),
+    ("/v1/component_events", b"limit=1000"),
+]
+
+# the handlers as they serialised responses before
+baseline_app = FastAPI()
+
+
+@baseline_app.get(
+    "/v1/system_components/{component_name}", response_model=SystemComponent
+)
+async def read_system_component(component_name: str) -> SystemComponent:
+    if component_name not in in_memory_db["system_components"]:
+        raise HTTPException(status_code=404)
+
+    return api_utils.get_system_component(component_name, in_memory_db)
+
+
+@baseline_app.get("/v1/component_events/{component_name}")
+async def get_latest_useage(component_name: str) -> t.Dict[str, t.Any]:
+    return in_memory_db["latest_events"][component_name].return_custom_event_dict()
+
+
+@baseline_app.get("/v1/component_events/{component_name}/history")
+async def get_useage_history(
+    component_name: str, skip: int = 0, limit: t.Optional[int] = 100
+) -> t.List[t.Dict[str, t.Any]]:
+    page = api_utils.list_event_history(component_name, in_memory_db, skip, limit)
+
+    return [event.return_custom_event_dict() for event in page]
+
+
+@baseline_app.get("/v1/system_components")
+def list_system_components(
+    skip: int = 0, limit: t.Optional[int] = 100
+) -> t.List[SystemComponent]:
+    return api_utils.list_system_components(in_memory_db, skip, limit)
+
+
+@baseline_app.get("/v1/component_events")
+def get_all_latest_useages(
+    skip: int = 0, limit: t.Optional[int] = 100
+) -> t.List[t.Dict[str, t.Any]]:
+    latest_events = list(in_memory_db["latest_events"].values())
+
+    return [
+        event.return_custom_event_dict()
+        for event in api_utils.paginate(latest_events, skip, limit)
+    ]
+
+
+async def get(asgi_app: FastAPI, path: str, query_string: bytes) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80),
+        "client": ("localhost", 50000),
+    }
+
+    async def receive() -> t.Dict[str, t.Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: t.Dict[str, t.Any]) -> None:
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+
+    await asgi_app(scope, receive, send)
+
+
+async def cpu_us_per_request(asgi_app: FastAPI, path: str, query: bytes) -> float:
+    for _ in range(N_REQUESTS // 10):
+        await get(asgi_app, path, query)
+
+    start = time.process_time()
+    for _ in range(N_REQUESTS):
+        await get(asgi_app, path, query)
+
+    return (time.process_time() - start) / N_REQUESTS * 1e6
+
+
+if __name__ == "__main__":
+    for i in range(N_COMPONENTS):
+        component = SystemComponent(name=f"Component{i}", total_available_storage=400)
+        api_utils.create_system_component(component, in_memory_db)
+        for useage in range(1, N_EVENTS_PER_COMPONENT):
+            usage_report = SystemComponentUpdate(
+                name=component.name, current_storage_useage=useage
+            )
+            api_utils.apply_usage_report(usage_report, in_memory_db)
+
+    print(f"CPU time per request (microseconds), {N_COMPONENTS} components")
+    print(f"{'endpoint':>48} | {'before':>8} | {'after':>8} | {'speedup':>7}")
+
+    for path, query in ENDPOINTS:
+        before = asyncio.run(cpu_us_per_request(baseline_app, path, query))
+        after = asyncio.run(cpu_us_per_request(app, path, query))
+        endpoint = f"{path}?{query.decode()}" if query else path
+        print(
+            f"{endpoint:>48} | {before:>8.0f} | {after:>8.0f} | {before / after:>6.1f}x"
+        )
@@ -0,0 +1,46 @@
+"""benchmark_sqlite_backend.py
+
+Measures how many system events per second can be registered with the
+SQLite persistence backend for different batch sizes. A batch size of 1
+commits every write, as an unbuffered backend would.
+
+    python scripts/benchmark_sqlite_backend.py
+"""
+import os
+import tempfile
+import time
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.storage.sqlite import SQLiteBackend
+
+N_COMPONENTS = 100
+N_EVENTS = 20_000
+
+
+if __name__ == "__main__":
+
+    print(f"{N_EVENTS} events across {N_COMPONENTS} components")
+    print(f"{'batch size':>10} | {'events/sec':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for batch_size in (1, 50, 500, 5_000):
+            path = os.path.join(directory, f"monitor_{batch_size}.db")
+            database = api_utils.create_in_memory_db(
+                SQLiteBackend(path, batch_size=batch_size)
+            )
+            components = [
+                SystemComponent(name=f"Component{i}", total_available_storage=400)
+                for i in range(N_COMPONENTS)
+            ]
+            for component in components:
+                api_utils.register_system_component(component, database)
+
+            start = time.perf_counter()
+            for i in range(N_EVENTS):
+                component = components[i % N_COMPONENTS]
+                api_utils.register_system_event(component, database)
+            database["backend"].close()
+            elapsed = time.perf_counter() - start
+
+            print(f"{batch_size:>10} | {N_EVENTS / elapsed:>10.0f}")
@@ -0,0 +1,130 @@
+"""benchmark_workers.py
+
+Measures the throughput of the API (requests per second) as the number of
+uvicorn workers grows, with the workers sharing a SQLite database through
+the "shared" persistence backend. Each worker count is load tested with a
+read only mix of requests and with a mix in which 1 in 10 requests is a
+PATCH. Clients run in separate processes, keeping connections alive.
+
+    python scripts/benchmark_workers.py
+
+Throughput only scales with workers while the machine has cores to spare
+for both the workers and the clients.
+"""
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+N_COMPONENTS = 200
+N_CLIENTS = 8
+DURATION_SECONDS = 5
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            connection.request("GET", "/v1/system_components?limit=1")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError("the server did not start")
+
+
+def request(
+    connection: http.client.HTTPConnection, method: str, url: str, body: dict = None
+) -> None:
+    headers = {"Content-Type": "application/json"}
+    payload = None if body is None else json.dumps(body)
+    connection.request(method, url, body=payload, headers=headers)
+    connection.getresponse().read()
+
+
+def run_client(args: tuple) -> int:
+    """Send requests until the deadline, returning how many were served."""
+    port, client_id, write_every, deadline = args
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+
+    n_requests = 0
+    while time.time() < deadline:
+        name = f"Component{(client_id + n_requests * N_CLIENTS) % N_COMPONENTS}"
+        if write_every and n_requests % write_every == 0:
+            useage = n_requests % 400
+            body = {"current_storage_useage": useage + 1}
+            request(connection, "PATCH", f"/v1/system_components/{name}", body)
+        else:
+            request(connection, "GET", f"/v1/system_components/{name}")
+        n_requests += 1
+
+    return n_requests
+
+
+def measure(port: int, write_every: int) -> float:
+    deadline = time.time() + DURATION_SECONDS
+    with multiprocessing.Pool(N_CLIENTS) as pool:
+        served = pool.map(
+            run_client,
+            [(port, client, write_every, deadline) for client in range(N_CLIENTS)],
+        )
+
+    return sum(served) / DURATION_SECONDS
+
+
+if __name__ == "__main__":
+    print(f"{os.cpu_count()} cores, {N_CLIENTS} client processes")
+    print(f"{'workers':>7} | {'reads/sec':>10} | {'10% writes/sec':>14}")
+
+    for n_workers in WORKER_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            port = free_port()
+            env = dict(
+                os.environ,
+                PERSISTENCE_BACKEND="shared",
+                SQLITE_PATH=os.path.join(directory, "monitor.db"),
+            )
+            server = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "diskspacemonitor.main:app",
+                    "--port",
+                    str(port),
+                    "--workers",
+                    str(n_workers),
+                    "--log-level",
+                    "warning",
+                ],
+                env=env,
+            )
+            try:
+                wait_until_up(port)
+
+                connection = http.client.HTTPConnection("127.0.0.1", port)
+                for i in range(N_COMPONENTS):
+                    body = {"name": f"Component{i}", "total_available_storage": 400}
+                    request(connection, "POST", "/v1/system_components", body)
+
+                reads = measure(port, write_every=0)
+                mixed = measure(port, write_every=10)
+            finally:
+                server.terminate()
+                server.wait()
+
+        print(f"{n_workers:>7} | {reads:>10.0f} | {mixed:>14.0f}")
@@ -0,0 +1,177 @@
+"""export.py
+
+Contains generators which export the complete event and warning history
+of our db as newline-delimited JSON or CSV. Records are read from each
+event history as the export is written, filtered by component and time
+range as they are read, and encoded in chunks, so an export of any size
+starts immediately and holds only a chunk in memory.
+"""
+import csv
+import io
+import typing as t
+from enum import Enum
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor import serialise
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.resource_warning import ResourceWarning
+
+# the number of records encoded into each chunk of an export
+CHUNK_SIZE = 1_000
+
+EVENT_COLUMNS = [
+    "event_id",
+    "timestamp",
+    "epoch_ns",
+    "component_name",
+    "total_available_storage",
+    "storage_limit",
+    "current_storage_useage",
+]
+
+WARNING_COLUMNS = ["warning_id", "warning_type", *EVENT_COLUMNS]
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _component_names(database: dict, component_name: t.Optional[str]) -> t.List[str]:
+    if component_name is None:
+        return list(database["system_events"])
+
+    return [component_name] if component_name in database["system_events"] else []
+
+
+def iter_events(
+    database: dict,
+    component_name: t.Optional[str] = None,
+    since_ns: t.Optional[int] = None,
+    until_ns: t.Optional[int] = None,
+) -> t.Iterator[ComponentEvent]:
+    """Return the events of one (or every) component recorded between
+    since_ns and until_ns, component by component in time order. Each
+    component's events are copied holding its lock, and written out after."""
+    for name in _component_names(database, component_name):
+        with api_utils.component_lock(name, database):
+            event_history = database["system_events"].get(name)
+            if event_history is None:
+                continue
+            events = event_history.iter_range(since_ns, until_ns)
+        yield from events
+
+
+def iter_warnings(
+    database: dict,
+    component_name: t.Optional[str] = None,
+    since_ns: t.Optional[int] = None,
+    until_ns: t.Optional[int] = None,
+) -> t.Iterator[t.Tuple[ResourceWarning, ComponentEvent]]:
+    """Return the warnings of one (or every) component triggered between
+    since_ns and until_ns, paired to the event which triggered them."""
+    event_index = database["event_index"]
+
+    for name in _component_names(database, component_name):
+        warnings = list(database["resource_warnings"].get(name, {}).values())
+        for resource_warning in warnings:
+            event = event_index.get(resource_warning.component_event_id)
+            if event is None:
+                continue
+            if since_ns is not None and event.epoch_ns < since_ns:
+                continue
+            if until_ns is not None and event.epoch_ns > until_ns:
+                # warnings are stored in the order they were raised
+                break
+            yield resource_warning, event
+
+
+def _event_row(event: ComponentEvent) -> t.List[t.Any]:
+    return [
+        event.event_id,
+        event.timestamp,
+        event.epoch_ns,
+        event.component_name,
+        event.total_available_storage,
+        event.storage_limit,
+        event.current_storage_useage,
+    ]
+
+
+def _warning_row(
+    resource_warning: ResourceWarning, event: ComponentEvent
+) -> t.List[t.Any]:
+    return [
+        resource_warning.warning_id,
+        resource_warning.warning_type.value,
+        *_event_row(event),
+    ]
+
+
+def _chunks(records: t.Iterator[t.Any]) -> t.Iterator[t.List[t.Any]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _encode_csv(
+    columns: t.List[str], rows: t.Iterator[t.List[t.Any]]
+) -> t.Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(records: t.Iterator[t.Dict[str, t.Any]]) -> t.Iterator[bytes]:
+    for chunk in _chunks(records):
+        lines = [serialise.dumps(record) for record in chunk]
+        yield b"\n".join(lines) + b"\n"
+
+
+def export_events(
+    events: t.Iterator[ComponentEvent], export_format: ExportFormat
+) -> t.Iterator[bytes]:
+    """Encode events in the given format, a chunk at a time."""
+    if export_format == ExportFormat.csv:
+        return _encode_csv(EVENT_COLUMNS, (_event_row(event) for event in events))
+
+    return _encode_ndjson(event.return_custom_event_dict() for event in events)
+
+
+def export_warnings(
+    warnings: t.Iterator[t.Tuple[ResourceWarning, ComponentEvent]],
+    export_format: ExportFormat,
+) -> t.Iterator[bytes]:
+    """Encode warnings paired to their events in the given format, a chunk
+    at a time."""
+    if export_format == ExportFormat.csv:
+        rows = (
+            _warning_row(resource_warning, event)
+            for resource_warning, event in warnings
+        )
+        return _encode_csv(WARNING_COLUMNS, rows)
+
+    return _encode_ndjson(
+        resource_warning.return_custom_warning_dict(event)
+        for resource_warning, event in warnings
+    )
@@ -0,0 +1,277 @@
+"""feed.py
+
+Contains the change feed of our db, which pushes the ComponentEvents and
+ResourceWarnings registered in it to subscribers, as Server-Sent Events,
+rather than having them poll for changes.
+
+Each record published is numbered, and the latest records are kept in a
+ring buffer so a subscriber which reconnects resumes after the last record
+it received. Records are queued for each subscriber whose filters they
+match, up to the size of its queue. A subscriber which falls further behind
+than that catches up from the ring buffer instead, so a slow subscriber
+holds no more than its queue in memory. One which falls behind the ring
+buffer as well is sent a reset, and must reload what it needs from the
+other endpoints.
+"""
+import asyncio
+import itertools
+import threading
+import typing as t
+import uuid
+from collections import deque
+from enum import Enum
+
+KEEPALIVE = b": keep-alive\n\n"
+
+
+class FeedKind(str, Enum):
+    """The kinds of records pushed by the change feed."""
+
+    component_event = "component_event"
+    resource_warning = "resource_warning"
+
+
+class FeedRecord(t.NamedTuple):
+    sequence: int
+    kind: FeedKind
+    component_name: str
+    # the record encoded to JSON
+    data: bytes
+
+
+class Subscription:
+    """A subscriber to the change feed, with the queue of records matching
+    its filters which are yet to be sent to it."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        component_names: t.Optional[t.FrozenSet[str]],
+        kinds: t.Optional[t.FrozenSet[FeedKind]],
+        queue_size: int,
+    ) -> None:
+        self.component_names = component_names
+        self.kinds = kinds
+        self.queue_size = queue_size
+        self.queue = deque()
+        # the last record queued (or skipped by the filters)
+        self.last_sequence = 0
+        # set when the queue overflows, until caught up from the ring buffer
+        self.lagging = False
+        # set when records were lost, to the last record before them, until a
+        # reset is sent
+        self.missed = None
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self._woken = False
+
+    def matches(self, record: FeedRecord) -> bool:
+        if self.component_names is not None:
+            if record.component_name not in self.component_names:
+                return False
+
+        return self.kinds is None or record.kind in self.kinds
+
+    def offer(self, record: FeedRecord) -> None:
+        """Queue a record for the subscriber if it matches its filters. Called
+        with the lock of the feed held, from any thread."""
+        if self.lagging:
+            return
+
+        if self.matches(record):
+            if len(self.queue) >= self.queue_size:
+                self.lagging = True
+            else:
+                self.queue.append(record)
+                self.last_sequence = record.sequence
+            self.wake()
+        else:
+            self.last_sequence = record.sequence
+
+    def wake(self) -> None:
+        """Wake the stream of the subscriber, once per batch of records."""
+        if not self._woken:
+            self._woken = True
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+
+class ChangeFeed:
+    """Numbers the records published, keeping the latest in a ring buffer,
+    and hands them to the subscriptions whose filters they match.
+
+    Records may be published from any thread. The records of a
+    subscription are streamed from the event loop it subscribed on.
+    """
+
+    def __init__(self, buffer_size: int, queue_size: int) -> None:
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        # a prefix unique to this process, so ids handed out by another (or
+        # an earlier) process are not mistaken for ours
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscriptions = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def event_id(self, sequence: int) -> str:
+        return f"{self.epoch}-{sequence}"
+
+    def parse_event_id(self, event_id: str) -> t.Optional[int]:
+        """Return the sequence number of an id handed out by this feed."""
+        epoch, _, sequence = event_id.strip().partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+
+        return int(sequence)
+
+    def publish(self, kind: FeedKind, component_name: str, data: bytes) -> None:
+        with self._lock:
+            self._sequence += 1
+            record = FeedRecord(self._sequence, kind, component_name, data)
+            self._buffer.append(record)
+            for subscription in self._subscriptions:
+                subscription.offer(record)
+
+    def subscribe(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        component_names: t.Optional[t.Iterable[str]] = None,
+        kinds: t.Optional[t.Iterable[FeedKind]] = None,
+        after: t.Optional[str] = None,
+    ) -> Subscription:
+        """Subscribe to the records published from now on, or since the
+        record with the given id (the Last-Event-ID of a reconnecting
+        subscriber). A subscriber resuming from an id unknown to this feed is
+        sent a reset first."""
+        subscription = Subscription(
+            loop,
+            None if component_names is None else frozenset(component_names),
+            None if kinds is None else frozenset(kinds),
+            self.queue_size,
+        )
+
+        with self._lock:
+            subscription.last_sequence = self._sequence
+            if after is not None:
+                sequence = self.parse_event_id(after)
+                if sequence is None:
+                    subscription.missed = self._sequence
+                elif sequence < self._sequence:
+                    # the records since are read from the ring buffer
+                    subscription.last_sequence = sequence
+                    subscription.lagging = True
+            self._subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def reset(self) -> None:
+        """Send every subscriber a reset, when records were stored in our db
+        without being published (see utils.apply_changes)."""
+        with self._lock:
+            for subscription in self._subscriptions:
+                subscription.queue.clear()
+                subscription.lagging = False
+                subscription.last_sequence = self._sequence
+                subscription.missed = self._sequence
+                subscription.wake()
+
+    def take(
+        self, subscription: Subscription
+    ) -> t.Tuple[t.List[FeedRecord], t.Optional[int]]:
+        """Return the next records to send a subscriber and, if a reset must
+        be sent before them, the last record before those it missed.
+
+        A lagging subscriber is sent the records left in its queue before
+        it catches up, so a reset always comes before the records of a batch.
+        """
+        with self._lock:
+            subscription._woken = False
+            if subscription.queue:
+                records = list(subscription.queue)
+                subscription.queue.clear()
+            elif subscription.lagging:
+                records = self._catch_up(subscription)
+            else:
+                records = []
+
+            missed, subscription.missed = subscription.missed, None
+
+        return records, missed
+
+    def _catch_up(self, subscription: Subscription) -> t.List[FeedRecord]:
+        """Read up to a queue of the records a lagging subscriber is yet to
+        be sent from the ring buffer."""
+        if not self._buffer:
+            subscription.lagging = False
+            return []
+
+        first_sequence = self._buffer[0].sequence
+        if subscription.last_sequence + 1 < first_sequence:
+            subscription.missed = first_sequence - 1
+            subscription.last_sequence = first_sequence - 1
+
+        records = []
+        start = subscription.last_sequence + 1 - first_sequence
+        for record in itertools.islice(self._buffer, start, None):
+            if len(records) >= subscription.queue_size:
+                break
+            if subscription.matches(record):
+                records.append(record)
+            subscription.last_sequence = record.sequence
+
+        if subscription.last_sequence == self._sequence:
+            subscription.lagging = False
+
+        return records
+
+    def encode(self, record: FeedRecord) -> bytes:
+        """Encode a record as a Server-Sent Event."""
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+            self.event_id(record.sequence).encode(),
+            record.kind.value.encode(),
+            record.data,
+        )
+
+    def encode_reset(self, sequence: int) -> bytes:
+        """Encode a reset, carrying the id to resume from once reloaded."""
+        return b"id: %s\nevent: reset\ndata: {}\n\n" % (
+            self.event_id(sequence).encode()
+        )
+
+    async def stream(
+        self,
+        subscription: Subscription,
+        idle_seconds: float,
+        on_idle: t.Optional[t.Callable[[], t.Awaitable[None]]] = None,
+    ) -> t.AsyncIterator[bytes]:
+        """Stream the records of a subscription as Server-Sent Events,
+        unsubscribing when the stream is closed. A keep-alive comment is sent
+        (after awaiting on_idle, if given) whenever no record is published for
+        idle_seconds."""
+        try:
+            while True:
+                subscription._ready.clear()
+                records, missed = self.take(subscription)
+                if missed is not None:
+                    yield self.encode_reset(missed)
+                if records:
+                    yield b"".join(self.encode(record) for record in records)
+                if records or missed is not None:
+                    continue
+
+                try:
+                    await asyncio.wait_for(subscription._ready.wait(), idle_seconds)
+                except asyncio.TimeoutError:
+                    if on_idle is not None:
+                        await on_idle()
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(subscription)
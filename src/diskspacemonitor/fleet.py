@@ -0,0 +1,156 @@
+"""fleet.py
+
+Contains a column snapshot of every monitored SystemComponent, from which
+fleet-wide statistics are computed with NumPy.
+
+The snapshot is kept up to date as components are registered, updated and
+deleted, so a summary of the whole fleet is a handful of vectorised
+operations over contiguous arrays rather than a pass over every
+SystemComponent object.
+"""
+import typing as t
+
+import numpy as np
+
+from diskspacemonitor import settings
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class FleetColumns:
+    """The storage figures of every monitored component, one row per
+    component in parallel NumPy arrays.
+
+    Rows are packed at the front of the arrays, which double in size when
+    full. A deleted component's row is filled by moving the last row into it.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._rows = {}
+        self._names = []
+        self._total_available_storage = np.zeros(capacity, dtype=np.int64)
+        self._storage_limit = np.zeros(capacity, dtype=np.int64)
+        self._current_storage_useage = np.zeros(capacity, dtype=np.int64)
+        # the thresholds of each component's warning rules, NaN where unset
+        self._headroom = np.zeros(capacity, dtype=np.float64)
+        self._utilisation = np.full(capacity, np.nan, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, component_name: str) -> bool:
+        return component_name in self._rows
+
+    def _columns(self) -> t.List[np.ndarray]:
+        return [
+            self._total_available_storage,
+            self._storage_limit,
+            self._current_storage_useage,
+            self._headroom,
+            self._utilisation,
+        ]
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._total_available_storage)
+        (
+            self._total_available_storage,
+            self._storage_limit,
+            self._current_storage_useage,
+            self._headroom,
+            self._utilisation,
+        ) = (np.resize(column, capacity) for column in self._columns())
+
+    def update(
+        self,
+        component_name: str,
+        total_available_storage: int,
+        storage_limit: int,
+        current_storage_useage: int,
+        headroom: t.Optional[float] = None,
+        utilisation: t.Optional[float] = None,
+    ) -> None:
+        """Set the storage figures of a component, adding it if it is new,
+        along with the thresholds of its warning rules (see
+        rules.EvaluationPlan). By default, a component is close to its
+        storage limit within settings.CLOSE_TO_STORAGE_LIMIT_TRIGGER."""
+        row = self._rows.get(component_name)
+        if row is None:
+            if len(self) == len(self._total_available_storage):
+                self._grow()
+            row = len(self._names)
+            self._rows[component_name] = row
+            self._names.append(component_name)
+
+        self._total_available_storage[row] = total_available_storage
+        self._storage_limit[row] = storage_limit
+        self._current_storage_useage[row] = current_storage_useage
+        if headroom is None:
+            headroom = settings.CLOSE_TO_STORAGE_LIMIT_TRIGGER
+        self._headroom[row] = headroom
+        self._utilisation[row] = np.nan if utilisation is None else utilisation
+
+    def remove(self, component_name: str) -> None:
+        """Drop a component, moving the last row into its place."""
+        row = self._rows.pop(component_name, None)
+        if row is None:
+            return
+
+        last = len(self._names) - 1
+        last_name = self._names.pop()
+        if row != last:
+            for column in self._columns():
+                column[row] = column[last]
+            self._names[row] = last_name
+            self._rows[last_name] = row
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        """Return fleet-wide storage statistics.
+
+        Components are "over" their storage limit, or "close" to it, by the
+        thresholds of their warning rules, as rules.EvaluationPlan.evaluate
+        decides.
+        """
+        n_components = len(self)
+        total = self._total_available_storage[:n_components]
+        limit = self._storage_limit[:n_components]
+        useage = self._current_storage_useage[:n_components]
+        headroom = self._headroom[:n_components]
+        utilisation = self._utilisation[:n_components]
+
+        proportion_used = np.divide(
+            useage * 100.0,
+            total,
+            out=np.zeros(n_components, dtype=np.float64),
+            where=total != 0,
+        )
+        limit_in_gigabits = (total * (limit / 100)).astype(np.int64)
+        over_limit = useage > limit_in_gigabits
+        # comparisons with NaN are False, so unset thresholds never trigger
+        close_to_limit = ~over_limit & (
+            (limit_in_gigabits - useage <= headroom) | (useage >= utilisation * total)
+        )
+
+        if n_components:
+            percentiles = np.percentile(proportion_used, PERCENTILES).tolist()
+        else:
+            percentiles = [0.0] * len(PERCENTILES)
+
+        total_storage = int(total.sum())
+        total_used = int(useage.sum())
+
+        return {
+            "system_components": n_components,
+            "total_available_storage": total_storage,
+            "current_storage_useage": total_used,
+            "free_storage": total_storage - total_used,
+            "proportion_of_total_storage_used": {
+                "mean": float(proportion_used.mean()) if n_components else 0.0,
+                "max": float(proportion_used.max()) if n_components else 0.0,
+                **{
+                    f"p{percentile}": value
+                    for percentile, value in zip(PERCENTILES, percentiles)
+                },
+            },
+            "over_storage_limit": int(over_limit.sum()),
+            "close_to_storage_limit": int(close_to_limit.sum()),
+        }
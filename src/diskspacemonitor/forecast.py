@@ -0,0 +1,122 @@
+"""forecast.py
+
+Contains the growth forecast of a single SystemComponent, predicting when
+its storage useage will reach its storage limit.
+
+The forecast is a linear regression of storage useage over time, fitted
+online: every event updates five running sums in O(1), and the weight of
+older events halves every settings.FORECAST_HALF_LIFE_SECONDS so the
+forecast follows recent growth.
+"""
+import typing as t
+
+from diskspacemonitor import settings
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
+
+
+class GrowthForecast:
+    """An exponentially weighted linear regression of a component's storage
+    useage over time.
+
+    Times are measured in seconds relative to the latest event, so the sums
+    are shifted (and decayed) as each new event arrives.
+    """
+
+    def __init__(self, component_name: str, half_life_seconds: float) -> None:
+        self.component_name = component_name
+        self.half_life_seconds = half_life_seconds
+        self.first_epoch_ns = None
+        self.latest_epoch_ns = None
+        self.current_storage_useage = 0
+        self.storage_limit_in_gigabits = 0
+        self._weight = 0.0
+        self._sum_t = 0.0
+        self._sum_y = 0.0
+        self._sum_tt = 0.0
+        self._sum_ty = 0.0
+
+    def observe(self, event: ComponentEvent) -> None:
+        """Fit a new event into the regression. Events no later than the
+        latest event observed are ignored, so observing twice is harmless."""
+        if self.latest_epoch_ns is None:
+            self.first_epoch_ns = event.epoch_ns
+        elif event.epoch_ns <= self.latest_epoch_ns:
+            return
+        else:
+            dt = (event.epoch_ns - self.latest_epoch_ns) / 1e9
+            decay = 0.5 ** (dt / self.half_life_seconds)
+
+            # move the origin of time to the new event, then decay the sums
+            self._sum_tt = decay * (
+                self._sum_tt - 2 * dt * self._sum_t + dt * dt * self._weight
+            )
+            self._sum_ty = decay * (self._sum_ty - dt * self._sum_y)
+            self._sum_t = decay * (self._sum_t - dt * self._weight)
+            self._sum_y *= decay
+            self._weight *= decay
+
+        # the new event sits at t = 0, adding nothing to the t sums
+        self._weight += 1
+        self._sum_y += event.current_storage_useage
+
+        self.latest_epoch_ns = event.epoch_ns
+        self.current_storage_useage = event.current_storage_useage
+        # the same limit as SystemComponent.set_current_storage_useage
+        self.storage_limit_in_gigabits = int(
+            event.total_available_storage * (event.storage_limit / 100)
+        )
+
+    @property
+    def growth_rate(self) -> t.Optional[float]:
+        """The growth in storage useage, in Gigabits per second. None until
+        the events observed span settings.FORECAST_MIN_SPAN_SECONDS."""
+        if self.latest_epoch_ns is None:
+            return None
+
+        span = (self.latest_epoch_ns - self.first_epoch_ns) / 1e9
+        denominator = self._weight * self._sum_tt - self._sum_t**2
+        if span < settings.FORECAST_MIN_SPAN_SECONDS or denominator <= 0:
+            return None
+
+        return (self._weight * self._sum_ty - self._sum_t * self._sum_y) / denominator
+
+    @property
+    def seconds_until_limit(self) -> t.Optional[float]:
+        """The predicted time from the latest event until storage useage
+        exceeds the storage limit. None if useage is not growing."""
+        headroom = self.storage_limit_in_gigabits - self.current_storage_useage
+        if headroom < 0:
+            return 0.0
+
+        growth_rate = self.growth_rate
+        if growth_rate is None or growth_rate <= 0:
+            return None
+
+        return headroom / growth_rate
+
+    def predicts_limit_within(self, horizon_seconds: float) -> bool:
+        seconds_until_limit = self.seconds_until_limit
+
+        return (
+            seconds_until_limit is not None and seconds_until_limit <= horizon_seconds
+        )
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        growth_rate = self.growth_rate
+        seconds_until_limit = self.seconds_until_limit
+
+        predicted_timestamp = None
+        if seconds_until_limit is not None:
+            predicted_timestamp = format_epoch_ns(
+                self.latest_epoch_ns + int(seconds_until_limit * 1e9)
+            )
+
+        return {
+            "component_name": self.component_name,
+            "current_storage_useage": self.current_storage_useage,
+            "storage_limit_in_gigabits": self.storage_limit_in_gigabits,
+            "growth_per_hour": None if growth_rate is None else growth_rate * 3600,
+            "seconds_until_limit": seconds_until_limit,
+            "predicted_limit_timestamp": predicted_timestamp,
+        }
@@ -0,0 +1,301 @@
+"""history.py
+
+Contains the containers which hold the event history of a single
+SystemComponent. Every history is a ring buffer bounded by the retention
+policy in settings.py and exposes the same interface, so the storage
+engine can be chosen in settings.EVENT_STORE:
+
+    "dict"      EventHistory, a deque of ComponentEvent objects. This is
+                the reference implementation.
+    "columnar"  ColumnarEventHistory, compact parallel arrays from which
+                ComponentEvent objects are only built on the way out.
+"""
+import bisect
+import itertools
+import sys
+import typing as t
+from array import array
+from collections import deque
+
+from diskspacemonitor import settings
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
+
+
+def deep_sizeof(obj: t.Any) -> int:
+    """Approximate the number of bytes held by a model and its field values."""
+    size = sys.getsizeof(obj)
+    fields = getattr(obj, "__dict__", None)
+
+    if fields is not None:
+        size += sys.getsizeof(fields)
+        size += sum(deep_sizeof(value) for value in fields.values())
+
+    return size
+
+
+class EventHistory:
+    """The event history of a component, stored as ComponentEvent objects
+    in a deque. Once maxlen events are held the oldest event is evicted
+    for every new one.
+    """
+
+    def __init__(self, component_name: str, maxlen: t.Optional[int] = None) -> None:
+        self.component_name = component_name
+        self.maxlen = maxlen
+        self._events = deque(maxlen=maxlen)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> t.Iterator[ComponentEvent]:
+        return iter(self._events)
+
+    def __getitem__(self, index: int) -> ComponentEvent:
+        return self._events[index]
+
+    def append(self, event: ComponentEvent) -> int:
+        """Add an event to the history, returning the number of evicted events."""
+        evicted = int(len(self._events) == self.maxlen)
+        self._events.append(event)
+
+        return evicted
+
+    def expire(self, cutoff_ns: int) -> int:
+        """Evict events older than cutoff_ns, returning the number evicted."""
+        evicted = 0
+        # events are appended in time order, so expired events are at the front
+        while self._events and self._events[0].epoch_ns < cutoff_ns:
+            self._events.popleft()
+            evicted += 1
+
+        return evicted
+
+    def page(self, start: int, stop: t.Optional[int] = None) -> t.List[ComponentEvent]:
+        """Return events between the start and stop positions, clamped to
+        the history."""
+        start = max(start, 0)
+        stop = None if stop is None else max(stop, start)
+
+        return list(itertools.islice(self._events, start, stop))
+
+    def _bisect(self, epoch_ns: int, lo: int, after: bool) -> int:
+        # deques do not support bisect, so binary search by position
+        hi = len(self._events)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_ns = self._events[mid].epoch_ns
+            if mid_ns < epoch_ns or (after and mid_ns == epoch_ns):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def find_range(
+        self, since_ns: t.Optional[int] = None, until_ns: t.Optional[int] = None
+    ) -> t.Tuple[int, int]:
+        """Return the start and stop positions of the events recorded
+        between since_ns and until_ns (inclusive), by binary search."""
+        start, stop = 0, len(self._events)
+        if since_ns is not None:
+            start = self._bisect(since_ns, 0, after=False)
+        if until_ns is not None:
+            stop = self._bisect(until_ns, start, after=True)
+
+        return start, stop
+
+    def iter_range(
+        self, since_ns: t.Optional[int] = None, until_ns: t.Optional[int] = None
+    ) -> t.Iterator[ComponentEvent]:
+        """Return the events recorded between since_ns and until_ns
+        (inclusive). The range is copied before it is returned, so the
+        history can keep changing while it is read."""
+        start, stop = self.find_range(since_ns, until_ns)
+
+        return iter(self.page(start, stop))
+
+    def latest(self) -> t.Optional[ComponentEvent]:
+        return self._events[-1] if self._events else None
+
+    def oldest_epoch_ns(self) -> t.Optional[int]:
+        return self._events[0].epoch_ns if self._events else None
+
+    def nbytes(self) -> int:
+        """Estimate the bytes held by the history, sampling one event."""
+        if not self._events:
+            return sys.getsizeof(self._events)
+
+        return sys.getsizeof(self._events) + len(self._events) * deep_sizeof(
+            self._events[0]
+        )
+
+
+class ColumnarEventHistory:
+    """The event history of a component, stored as parallel columns.
+
+    Timestamps and storage figures are kept in typed arrays and event ids
+    as 16 raw bytes each, costing ~48 bytes per event. The component name
+    is held once per history. Evicted events are dropped by advancing an
+    offset into the columns, which are compacted once half of them is dead,
+    so appends and evictions are amortised O(1).
+    """
+
+    _ID_SIZE = 16
+
+    def __init__(self, component_name: str, maxlen: t.Optional[int] = None) -> None:
+        self.component_name = component_name
+        self.maxlen = maxlen
+        self._start = 0
+        self._ids = bytearray()
+        self._epoch_ns = array("q")
+        self._total_available_storage = array("q")
+        self._storage_limit = array("q")
+        self._current_storage_useage = array("q")
+
+    def __len__(self) -> int:
+        return len(self._epoch_ns) - self._start
+
+    def __iter__(self) -> t.Iterator[ComponentEvent]:
+        for position in range(self._start, len(self._epoch_ns)):
+            yield self._build_event(position)
+
+    def __getitem__(self, index: int) -> ComponentEvent:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("event history index out of range")
+
+        return self._build_event(self._start + index)
+
+    def _build_event(self, position: int) -> ComponentEvent:
+        epoch_ns = self._epoch_ns[position]
+
+        # columns only ever hold validated events, so skip re-validation
+        return ComponentEvent.construct(
+            event_id=self._event_id(position),
+            timestamp=format_epoch_ns(epoch_ns),
+            epoch_ns=epoch_ns,
+            component_name=self.component_name,
+            total_available_storage=self._total_available_storage[position],
+            storage_limit=self._storage_limit[position],
+            current_storage_useage=self._current_storage_useage[position],
+        )
+
+    def _event_id(self, position: int) -> str:
+        raw_id = self._ids[position * self._ID_SIZE : (position + 1) * self._ID_SIZE]
+        hex_id = raw_id.hex()
+
+        return (
+            f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-"
+            f"{hex_id[16:20]}-{hex_id[20:]}"
+        )
+
+    def _drop_front(self, count: int) -> int:
+        self._start += count
+
+        # compact once the dead prefix outgrows the live events
+        if self._start * 2 >= len(self._epoch_ns):
+            start = self._start
+            del self._ids[: start * self._ID_SIZE]
+            del self._epoch_ns[:start]
+            del self._total_available_storage[:start]
+            del self._storage_limit[:start]
+            del self._current_storage_useage[:start]
+            self._start = 0
+
+        return count
+
+    def append(self, event: ComponentEvent) -> int:
+        """Add an event to the history, returning the number of evicted events."""
+        self._ids += bytes.fromhex(event.event_id.replace("-", ""))
+        self._epoch_ns.append(event.epoch_ns)
+        self._total_available_storage.append(event.total_available_storage)
+        self._storage_limit.append(event.storage_limit)
+        self._current_storage_useage.append(event.current_storage_useage)
+
+        if self.maxlen is not None and len(self) > self.maxlen:
+            return self._drop_front(len(self) - self.maxlen)
+
+        return 0
+
+    def expire(self, cutoff_ns: int) -> int:
+        """Evict events older than cutoff_ns, returning the number evicted."""
+        first_kept = bisect.bisect_left(self._epoch_ns, cutoff_ns, lo=self._start)
+
+        return self._drop_front(first_kept - self._start)
+
+    def page(self, start: int, stop: t.Optional[int] = None) -> t.List[ComponentEvent]:
+        """Return events between the start and stop positions, clamped to
+        the history."""
+        start = max(start, 0)
+        stop = len(self) if stop is None else min(stop, len(self))
+
+        return [self._build_event(self._start + index) for index in range(start, stop)]
+
+    def find_range(
+        self, since_ns: t.Optional[int] = None, until_ns: t.Optional[int] = None
+    ) -> t.Tuple[int, int]:
+        """Return the start and stop positions of the events recorded
+        between since_ns and until_ns (inclusive), by binary search."""
+        lo, hi = self._start, len(self._epoch_ns)
+        if since_ns is not None:
+            lo = bisect.bisect_left(self._epoch_ns, since_ns, lo=lo)
+        if until_ns is not None:
+            hi = bisect.bisect_right(self._epoch_ns, until_ns, lo=lo)
+
+        return lo - self._start, hi - self._start
+
+    def iter_range(
+        self, since_ns: t.Optional[int] = None, until_ns: t.Optional[int] = None
+    ) -> t.Iterator[ComponentEvent]:
+        """Return the events recorded between since_ns and until_ns
+        (inclusive). The columns in range are copied before events are
+        built from them, so the history can keep changing while it is read."""
+        start, stop = self.find_range(since_ns, until_ns)
+        lo, hi = self._start + start, self._start + stop
+
+        columns = ColumnarEventHistory(self.component_name)
+        columns._ids = self._ids[lo * self._ID_SIZE : hi * self._ID_SIZE]
+        columns._epoch_ns = self._epoch_ns[lo:hi]
+        columns._total_available_storage = self._total_available_storage[lo:hi]
+        columns._storage_limit = self._storage_limit[lo:hi]
+        columns._current_storage_useage = self._current_storage_useage[lo:hi]
+
+        return iter(columns)
+
+    def latest(self) -> t.Optional[ComponentEvent]:
+        return self[-1] if len(self) else None
+
+    def oldest_epoch_ns(self) -> t.Optional[int]:
+        return self._epoch_ns[self._start] if len(self) else None
+
+    def nbytes(self) -> int:
+        """Return the bytes held by the columns."""
+        columns = (
+            self._epoch_ns,
+            self._total_available_storage,
+            self._storage_limit,
+            self._current_storage_useage,
+        )
+
+        return sys.getsizeof(self._ids) + sum(
+            sys.getsizeof(column) for column in columns
+        )
+
+
+EVENT_STORES = {
+    "dict": EventHistory,
+    "columnar": ColumnarEventHistory,
+}
+
+
+def new_event_history(
+    component_name: str,
+) -> t.Union[EventHistory, ColumnarEventHistory]:
+    """Return an empty event history using the storage engine and retention
+    policy set in settings.py"""
+    event_history_class = EVENT_STORES[settings.EVENT_STORE]
+
+    return event_history_class(component_name, settings.MAX_EVENTS_PER_COMPONENT)
@@ -0,0 +1,266 @@
+"""indexes.py
+
+Contains secondary indexes over the SystemComponents in our db, kept up to
+date as components are registered, updated and deleted, so components can
+be filtered and listed in order of a value without sorting (or visiting)
+every component per request.
+"""
+import bisect
+import itertools
+import typing as t
+from enum import Enum
+
+
+class HeadroomOrder(str, Enum):
+    limit_used = "limit_used"
+    free_storage = "free_storage"
+
+
+class ComponentSortKey(str, Enum):
+    created = "created"
+    name = "name"
+    utilisation = "utilisation"
+    storage_limit = "storage_limit"
+    free_storage = "free_storage"
+    limit_used = "limit_used"
+
+
+# names starting with a prefix sort between the prefix and this suffix added
+_MAX_CHARACTER = chr(0x10FFFF)
+
+# how many times fewer components a filter must match than the sort index
+# holds for its matches to be collected and sorted
+_SELECTIVITY = 8
+
+
+def storage_limit_in_gigabits(total_available_storage: int, storage_limit: int) -> int:
+    """The same limit as SystemComponent.set_current_storage_useage"""
+    return int(total_available_storage * (storage_limit / 100))
+
+
+def proportion_of_total_storage_used(
+    total_available_storage: int, current_storage_useage: int
+) -> float:
+    """The same proportion as SystemComponent.proportion_of_total_storage_used,
+    or 0% for a component without storage."""
+    if not total_available_storage:
+        return 0.0
+
+    return current_storage_useage / total_available_storage * 100
+
+
+def proportion_of_storage_limit_used(
+    total_available_storage: int, storage_limit: int, current_storage_useage: int
+) -> float:
+    """Return the storage in use as a proportion of the storage limit, over
+    100% once the limit is exceeded. A limit below 1G counts as 1G."""
+    limit = storage_limit_in_gigabits(total_available_storage, storage_limit)
+
+    return current_storage_useage / max(limit, 1) * 100
+
+
+class SortedIndex:
+    """The keys of records ordered by a value, in a sorted list of
+    (value, key) pairs. Keys with equal values are ordered by key.
+
+    Updating a key is a binary search plus a list insertion, and reading
+    the first or last k keys is a slice.
+    """
+
+    def __init__(self) -> None:
+        self._entries = []
+        self._values = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._values
+
+    def update(self, key: str, value: t.Any) -> None:
+        """Set the value of a key, adding it if it is new."""
+        old_value = self._values.get(key)
+        if old_value is not None:
+            if old_value == value:
+                return
+            self._entries.pop(bisect.bisect_left(self._entries, (old_value, key)))
+
+        self._values[key] = value
+        bisect.insort(self._entries, (value, key))
+
+    def remove(self, key: str) -> None:
+        old_value = self._values.pop(key, None)
+        if old_value is not None:
+            self._entries.pop(bisect.bisect_left(self._entries, (old_value, key)))
+
+    def value(self, key: str) -> t.Any:
+        return self._values[key]
+
+    def _position(self, value: t.Any, after: bool) -> int:
+        # the first position holding a value above (or from) the given value
+        lo, hi = 0, len(self._entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_value = self._entries[mid][0]
+            if mid_value < value or (after and mid_value == value):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def _bounds(self, lo: t.Any = None, hi: t.Any = None) -> t.Tuple[int, int]:
+        start = 0 if lo is None else self._position(lo, after=False)
+        stop = len(self._entries) if hi is None else self._position(hi, after=True)
+
+        return start, max(start, stop)
+
+    def count(self, lo: t.Any = None, hi: t.Any = None) -> int:
+        """Return the number of keys with values between lo and hi (inclusive)."""
+        start, stop = self._bounds(lo, hi)
+
+        return stop - start
+
+    def keys(
+        self, lo: t.Any = None, hi: t.Any = None, reverse: bool = False
+    ) -> t.Iterator[str]:
+        """Return the keys with values between lo and hi (inclusive), in
+        order of their values. The range is copied before it is returned,
+        so the index can keep changing while it is read."""
+        start, stop = self._bounds(lo, hi)
+        entries = self._entries[start:stop]
+        if reverse:
+            entries.reverse()
+
+        return (key for _, key in entries)
+
+    def first(self, k: int) -> t.List[str]:
+        """Return the k keys with the smallest values."""
+        return [key for _, key in self._entries[:k]]
+
+    def last(self, k: int) -> t.List[str]:
+        """Return the k keys with the largest values, largest first."""
+        start = max(len(self._entries) - k, 0)
+
+        return [key for _, key in reversed(self._entries[start:])]
+
+
+class ComponentIndexes:
+    """The secondary indexes over the system components in our db: a sorted
+    index per ComponentSortKey, and the set of components with an active
+    resource warning incident.
+    """
+
+    def __init__(self) -> None:
+        self.sorted_indexes = {sort_key: SortedIndex() for sort_key in ComponentSortKey}
+        self.warned = set()
+        self._registered = itertools.count()
+
+    def __getitem__(self, sort_key: ComponentSortKey) -> SortedIndex:
+        return self.sorted_indexes[sort_key]
+
+    def update(
+        self,
+        component_name: str,
+        total_available_storage: int,
+        storage_limit: int,
+        current_storage_useage: int,
+    ) -> None:
+        """Index the storage figures of a component, adding it if it is new."""
+        if component_name not in self[ComponentSortKey.created]:
+            self[ComponentSortKey.created].update(
+                component_name, next(self._registered)
+            )
+            self[ComponentSortKey.name].update(component_name, component_name)
+
+        values = {
+            ComponentSortKey.utilisation: proportion_of_total_storage_used(
+                total_available_storage, current_storage_useage
+            ),
+            ComponentSortKey.storage_limit: storage_limit,
+            ComponentSortKey.free_storage: (
+                total_available_storage - current_storage_useage
+            ),
+            ComponentSortKey.limit_used: proportion_of_storage_limit_used(
+                total_available_storage, storage_limit, current_storage_useage
+            ),
+        }
+        for sort_key, value in values.items():
+            self[sort_key].update(component_name, value)
+
+    def set_warned(self, component_name: str, warned: bool) -> None:
+        if warned:
+            self.warned.add(component_name)
+        else:
+            self.warned.discard(component_name)
+
+    def remove(self, component_name: str) -> None:
+        for sorted_index in self.sorted_indexes.values():
+            sorted_index.remove(component_name)
+        self.warned.discard(component_name)
+
+    def query(
+        self,
+        name_prefix: t.Optional[str] = None,
+        utilisation: t.Tuple[t.Optional[float], t.Optional[float]] = (None, None),
+        storage_limit: t.Tuple[t.Optional[int], t.Optional[int]] = (None, None),
+        has_warning: t.Optional[bool] = None,
+        sort_by: ComponentSortKey = ComponentSortKey.created,
+        descending: bool = False,
+    ) -> t.Iterator[str]:
+        """Return the names of the components matching every filter given,
+        in order of the sort key.
+
+        Each range filter is answered by its index. When the most selective
+        filter matches far fewer components than the sort index holds, the
+        components it matches are collected and sorted. Otherwise the sort
+        index is read in order and the other filters checked per component,
+        so a page can be returned without reading the rest of the index.
+        """
+        ranges = {}
+        if name_prefix:
+            ranges[ComponentSortKey.name] = (name_prefix, name_prefix + _MAX_CHARACTER)
+        if utilisation != (None, None):
+            ranges[ComponentSortKey.utilisation] = utilisation
+        if storage_limit != (None, None):
+            ranges[ComponentSortKey.storage_limit] = storage_limit
+
+        def matches(component_name: str) -> bool:
+            if has_warning is not None and has_warning != (
+                component_name in self.warned
+            ):
+                return False
+            for sort_key, (lo, hi) in ranges.items():
+                value = self[sort_key].value(component_name)
+                if (lo is not None and value < lo) or (hi is not None and value > hi):
+                    return False
+            return True
+
+        sort_index = self[sort_by]
+        lo, hi = ranges.get(sort_by, (None, None))
+        n_sorted = sort_index.count(lo, hi)
+
+        # collecting and sorting the matches of a filter only beats reading
+        # the sort index in order when the filter is much narrower
+        candidates, n_candidates = None, n_sorted // _SELECTIVITY
+        for sort_key, (range_lo, range_hi) in ranges.items():
+            n_matched = self[sort_key].count(range_lo, range_hi)
+            if n_matched < n_candidates:
+                candidates = self[sort_key].keys(range_lo, range_hi)
+                n_candidates = n_matched
+        if has_warning and len(self.warned) < n_candidates:
+            candidates = list(self.warned)
+
+        if candidates is None:
+            return filter(matches, sort_index.keys(lo, hi, reverse=descending))
+
+        return iter(
+            sorted(
+                filter(matches, candidates),
+                key=lambda component_name: (
+                    sort_index.value(component_name),
+                    component_name,
+                ),
+                reverse=descending,
+            )
+        )
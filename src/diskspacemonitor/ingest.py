@@ -0,0 +1,150 @@
+"""ingest.py
+
+Contains helpers for ingesting a stream of newline-delimited JSON storage
+useage reports, as sent by agents holding a connection open to
+POST /v1/component_events:stream.
+
+The stream is read incrementally and reports are applied in batches
+through the same path as PATCH /v1/system_components/:name. The next
+chunk of the stream is only read once the previous batch is applied, so
+a fast agent is slowed down by TCP flow control rather than buffered,
+and memory use is bounded by the batch size and the longest line allowed.
+"""
+import typing as t
+
+import pydantic
+from starlette.concurrency import run_in_threadpool
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor import settings
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+
+async def iter_ndjson_lines(
+    chunks: t.AsyncIterator[bytes], max_line_bytes: int
+) -> t.AsyncIterator[t.Optional[bytes]]:
+    """Split a stream of bytes into lines, ignoring blank lines.
+
+    Lines longer than max_line_bytes are discarded as they arrive, and
+    None is yielded in their place.
+    """
+    pending = b""
+    discarding = False
+
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+
+        for line in lines:
+            if discarding:
+                # the end of an oversized line
+                discarding = False
+                yield None
+            elif len(line) > max_line_bytes:
+                yield None
+            elif line.strip():
+                yield line
+
+        if len(pending) > max_line_bytes:
+            discarding, pending = True, b""
+
+    if discarding or len(pending) > max_line_bytes:
+        yield None
+    elif pending.strip():
+        yield pending
+
+
+class UsageStreamSummary:
+    """Tallies the results of the reports applied from a stream.
+
+    Only the first max_reported_errors failures are kept, so the summary of
+    a stream stays small however many of its reports fail. Failures are
+    identified by line number, counting non-blank lines from 1.
+    """
+
+    def __init__(self, max_reported_errors: int) -> None:
+        self.max_reported_errors = max_reported_errors
+        self.lines = 0
+        self.applied = 0
+        self.failed = 0
+        self.warnings = {}
+        self.errors = []
+
+    def add_failure(self, line_number: int, status_code: int, detail: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append(
+                {"line": line_number, "status_code": status_code, "detail": detail}
+            )
+
+    def add_results(
+        self, line_numbers: t.List[int], results: t.List[t.Dict[str, t.Any]]
+    ) -> None:
+        for line_number, result in zip(line_numbers, results):
+            if result["status_code"] != 200:
+                self.add_failure(line_number, result["status_code"], result["detail"])
+                continue
+
+            self.applied += 1
+            if warning_type := result["warning_type"]:
+                self.warnings[warning_type] = self.warnings.get(warning_type, 0) + 1
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "lines": self.lines,
+            "applied": self.applied,
+            "failed": self.failed,
+            "warnings": self.warnings,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def apply_usage_stream(
+    chunks: t.AsyncIterator[bytes], database: dict
+) -> t.Dict[str, t.Any]:
+    """Parse and apply a stream of newline-delimited JSON useage reports.
+
+    Parameters
+    ----------
+    chunks: async iterator of bytes
+        the body of the request, as it arrives.
+    database: dict
+        an dictionary serving as a database.
+
+    returns: a summary of the reports applied and the reports which failed.
+    """
+    summary = UsageStreamSummary(settings.STREAM_MAX_REPORTED_ERRORS)
+    batch, line_numbers = [], []
+
+    async for line in iter_ndjson_lines(chunks, settings.STREAM_MAX_LINE_BYTES):
+        summary.lines += 1
+
+        if line is None:
+            detail = f"Lines may not exceed {settings.STREAM_MAX_LINE_BYTES} bytes."
+            summary.add_failure(summary.lines, 413, detail)
+            continue
+
+        try:
+            usage_report = SystemComponentUpdate.parse_raw(line)
+        except pydantic.ValidationError as error:
+            summary.add_failure(summary.lines, 422, str(error))
+            continue
+
+        batch.append(usage_report)
+        line_numbers.append(summary.lines)
+
+        if len(batch) >= settings.STREAM_BATCH_SIZE:
+            results = await run_in_threadpool(
+                api_utils.apply_usage_reports, batch, database
+            )
+            summary.add_results(line_numbers, results)
+            batch, line_numbers = [], []
+
+    if batch:
+        results = await run_in_threadpool(
+            api_utils.apply_usage_reports, batch, database
+        )
+        summary.add_results(line_numbers, results)
+
+    return summary.to_dict()
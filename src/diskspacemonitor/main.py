@@ -2,80 +2,141 @@
 
 This module contains the functions which are triggered at each endpoint
 of our API. We are using a simple in-memory database to store and retrieve
-data when the application is running. These data are not persisted
-to disk.
+data when the application is running. These data are only persisted to
+disk when a persistence backend is configured in settings.py, in which
+case the in-memory database is rebuilt from it on startup.
+
+Endpoints reading or writing a single component (or a page of one) are
+coroutines, served on the event loop without a hop to the threadpool.
+Endpoints which scan every component are plain functions, run in the
+threadpool so they do not stall the event loop.
 """
+import asyncio
 import typing as t
-from collections import defaultdict
+from datetime import datetime
+from functools import partial
 
 from fastapi import FastAPI
+from fastapi import Header
 from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
 from fastapi import Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
+import diskspacemonitor.export as api_export
+import diskspacemonitor.ingest as api_ingest
+import diskspacemonitor.serialise as api_serialise
 import diskspacemonitor.utils as api_utils
-import diskspacemonitor.warn as monitor_warnings
+from diskspacemonitor import settings
+from diskspacemonitor.feed import FeedKind
+from diskspacemonitor.indexes import ComponentSortKey
+from diskspacemonitor.indexes import HeadroomOrder
 from diskspacemonitor.models.system_component import SystemComponent
 from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.models.warning_rule import WarningRule
+from diskspacemonitor.rollups import Resolution
+from diskspacemonitor.warn import WarningState
 
 
 app = FastAPI()
 
 # DATABASE
-in_memory_db = {
-    "system_components": {},
-    "system_events": defaultdict(list),
-    "resource_warnings": defaultdict(list),
-}
+in_memory_db = api_utils.create_in_memory_db(api_utils.create_persistence_backend())
 
 
-###################################################################
+@app.on_event("startup")
+def load_database() -> None:
+    """Rebuild the in-memory database from its persistence backend."""
+    api_utils.load_in_memory_db(in_memory_db)
+
+
+async def sync_database(request: Request, call_next: t.Callable) -> Response:
+    """Apply the writes other workers sharing the persistence backend made
+    since the last request, before serving a request."""
+    await run_in_threadpool(api_utils.sync_in_memory_db, in_memory_db)
+
+    return await call_next(request)
+
+
+# workers keep their in-memory databases in step through a shared backend
+if in_memory_db["backend"].shared:
+    app.middleware("http")(sync_database)
+
+
+@app.on_event("shutdown")
+def close_database() -> None:
+    """Snapshot the in-memory database (where the persistence backend
+    supports it) and write any buffered records through to the backend.
+    Resource warnings yet to be sent to webhooks are sent first."""
+    in_memory_db["notifier"].close(settings.NOTIFY_TIMEOUT_SECONDS)
+    api_utils.snapshot_in_memory_db(in_memory_db)
+    in_memory_db["backend"].close()
+
+
+##############################################################################
 #
-#                     System Component Endpoints
-#                     --------------------------
+#                          System Component Endpoints
+#                          --------------------------
 #
-#  POST    /v1/system_components         Create System Component
-#  GET     /v1/system_components/:name   Retrieve System Component
-#  PATCH   /v1/system_components/:name   Update System Component
-#  DELETE  /v1/system_components/:name   Delete System Component
-#  GET     /v1/system_components         List System Components
+#  POST    /v1/system_components                  Create System Component
+#  GET     /v1/system_components/:name            Retrieve System Component
+#  PATCH   /v1/system_components/:name            Update System Component
+#  DELETE  /v1/system_components/:name            Delete System Component
+#  GET     /v1/system_components                  List System Components
+#  GET     /v1/system_components:stats            Summarise System Components
+#  GET     /v1/system_components:least_headroom   List Components Closest to Limit
 #
-###################################################################
+##############################################################################
 
 
 @app.post("/v1/system_components", response_model=SystemComponent)
-def create_system_component(component: SystemComponent) -> None:
+async def create_system_component(component: SystemComponent) -> None:
     """Create a new system component in our monitored system."""
 
-    if component.name in in_memory_db["system_components"]:
+    if not await api_utils.create_system_component_async(component, in_memory_db):
         error_msg = f"{component.name} already exists in the monitored system."
         raise HTTPException(status_code=409, detail=error_msg)
 
-    api_utils.register_system_component(component, in_memory_db)
-    api_utils.register_system_event(component, in_memory_db)
-
-    return component
+    return api_serialise.JSONBytesResponse(api_serialise.encode_component(component))
 
 
 @app.get("/v1/system_components/{component_name}", response_model=SystemComponent)
-def read_system_component(component_name: str) -> t.Dict[str, str]:
+async def read_system_component(
+    component_name: str, if_none_match: t.Optional[str] = Header(None)
+) -> t.Dict[str, str]:
     """Retrieve data regarding a single system component of our monitored system.
 
     Path Parameters
     ---------------
     component_name: str
         the unique name of a system component.
+
+    Headers
+    -------
+    If-None-Match: str
+        the ETag of an earlier response, answered with 304 Not Modified
+        while it is current.
     """
     if component_name not in in_memory_db["system_components"]:
         error_msg = f"{component_name} does not exist in the monitored system."
         raise HTTPException(status_code=404, detail=error_msg)
 
+    etag = api_utils.version_etag(in_memory_db, component_name=component_name)
+    if (not_modified := api_serialise.not_modified(if_none_match, etag)) is not None:
+        return not_modified
+
     component = api_utils.get_system_component(component_name, in_memory_db)
 
-    return component
+    # encoded directly, bypassing validation against the response model
+    return api_serialise.JSONBytesResponse(
+        api_serialise.encode_component(component), headers={"ETag": etag}
+    )
 
 
 @app.patch("/v1/system_components/{component_name}", response_model=SystemComponent)
-def update_system_component(
+async def update_system_component(
     component_name: str, updated_component: SystemComponentUpdate
 ) -> None:
     """Update system component in our monitored system.
@@ -86,56 +147,21 @@ def update_system_component(
         the unique name of a system component.
 
     """
-    if component_name not in in_memory_db["system_components"]:
-        error_msg = f"{component_name} does not exist in the monitored system."
-        raise HTTPException(status_code=404, detail=error_msg)
-
-    system_component = in_memory_db["system_components"][component_name]
-
-    # update component total storage if in request
-    if new_total := updated_component.total_available_storage:
-        system_component.total_available_storage = new_total
-
-    # update component storage limit if in request
-    if new_storage_limit := updated_component.storage_limit:
-        try:
-            system_component.set_storage_limit(new_storage_limit)
-        except monitor_warnings.StorageLimitOutOfRangeError:
-
-            error_msg = f"{new_storage_limit} is not a valid storage limit. Must be between 0 - 100"
-            raise HTTPException(status_code=400, detail=error_msg)
-
-    # update component storage useage if in request
-    warning_flag, warning_type = False, None
-
-    if new_current_useage := updated_component.current_storage_useage:
-        try:
-            system_component.set_current_storage_useage(new_current_useage)
+    # the component named in the path is updated, whatever the body names
+    usage_report = updated_component.copy(update={"name": component_name})
 
-        except monitor_warnings.OverMemoryLimitError:
-            warning_flag, warning_type = (
-                True,
-                monitor_warnings.WarningEnum.over_memory_limit,
-            )
+    result = await api_utils.apply_usage_report_async(usage_report, in_memory_db)
 
-        except monitor_warnings.CloseToMemoryLimitError:
-            warning_flag, warning_type = (
-                True,
-                monitor_warnings.WarningEnum.close_to_memory_limit,
-            )
+    if result["status_code"] != 200:
+        raise HTTPException(status_code=result["status_code"], detail=result["detail"])
 
-    if warning_flag:
-        # register new system event along with a resource warning
-        api_utils.register_system_event(system_component, in_memory_db, warning_type)
-    else:
-        # register new system event only
-        api_utils.register_system_event(system_component, in_memory_db)
+    component = api_utils.get_system_component(component_name, in_memory_db)
 
-    return system_component
+    return api_serialise.JSONBytesResponse(api_serialise.encode_component(component))
 
 
 @app.delete("/v1/system_components/{component_name}")
-def delete_system_component(component_name: str) -> None:
+async def delete_system_component(component_name: str) -> None:
     """Remove a system component from our monitored system.
 
     Path Parameters
@@ -143,19 +169,58 @@ def delete_system_component(component_name: str) -> None:
     component_name: str
         the unique name of a system component.
     """
-    if component_name not in in_memory_db["system_components"]:
+    # not deleting the component from events or warnings to have backlog
+    if not await api_utils.delete_system_component_async(component_name, in_memory_db):
         error_msg = f"{component_name} does not exist in the monitored system."
         raise HTTPException(status_code=404, detail=error_msg)
 
-    # not deleting the component from events or warnings to have backlog
-    del in_memory_db["system_components"][component_name]
-
     return Response(status_code=204)
 
 
+@app.get("/v1/system_components:stats")
+def summarise_system_components() -> t.Dict[str, t.Any]:
+    """Summarise the storage of all currently monitored components of our
+    system: total capacity and useage, percentiles of the proportion of
+    storage used, and the number of components over or close to their
+    storage limit."""
+
+    return api_utils.summarise_fleet(in_memory_db)
+
+
+@app.get("/v1/system_components:least_headroom")
+async def list_least_headroom(
+    k: int = Query(50, ge=1), order_by: HeadroomOrder = HeadroomOrder.limit_used
+) -> t.List[t.Dict[str, t.Any]]:
+    """List the k components of our system with the least storage headroom,
+    along with their free storage and the proportion of their storage limit
+    in use.
+
+    Query Parameters
+    ----------------
+    k: int
+        The number of system components to return.
+    order_by: str
+        "limit_used" (the default) for the components using the most of
+        their storage limit, or "free_storage" for the components with the
+        least free storage.
+    """
+
+    return api_utils.list_least_headroom(in_memory_db, k, order_by)
+
+
 @app.get("/v1/system_components")
 def list_system_components(
-    skip: int = 0, limit: t.Optional[int] = 100
+    skip: int = Query(0, ge=0),
+    limit: t.Optional[int] = Query(100, ge=0),
+    name_prefix: t.Optional[str] = None,
+    min_utilisation: t.Optional[float] = None,
+    max_utilisation: t.Optional[float] = None,
+    min_storage_limit: t.Optional[int] = None,
+    max_storage_limit: t.Optional[int] = None,
+    has_warning: t.Optional[bool] = None,
+    sort_by: t.Optional[ComponentSortKey] = None,
+    descending: bool = False,
+    if_none_match: t.Optional[str] = Header(None),
 ) -> t.List[t.Dict[str, str]]:
     """List all currently monitored components of our system.
 
@@ -165,11 +230,49 @@ def list_system_components(
         The number of system components in our result set to skip.
     limit: int
         The total number of system components to return.
+    name_prefix: str
+        Only list system components whose name starts with this prefix.
+    min_utilisation, max_utilisation: float
+        Only list system components using between these proportions (0 - 100)
+        of their total storage.
+    min_storage_limit, max_storage_limit: int
+        Only list system components with a storage limit in this range.
+    has_warning: bool
+        Only list system components with (or without) an active resource
+        warning incident.
+    sort_by: str
+        List system components in order of "created" (the default), "name",
+        "utilisation", "storage_limit", "free_storage" or "limit_used".
+    descending: bool
+        List system components in descending order.
+
+    Headers
+    -------
+    If-None-Match: str
+        the ETag of an earlier response, answered with 304 Not Modified
+        while it is current.
     """
-    all_system_components = list(in_memory_db["system_components"].values())
-    filtered = all_system_components[skip : skip + limit]
+    etag = api_utils.version_etag(in_memory_db, "system_components")
+    if (not_modified := api_serialise.not_modified(if_none_match, etag)) is not None:
+        return not_modified
+
+    filtered = api_utils.list_system_components(
+        in_memory_db,
+        skip,
+        limit,
+        name_prefix=name_prefix,
+        min_utilisation=min_utilisation,
+        max_utilisation=max_utilisation,
+        min_storage_limit=min_storage_limit,
+        max_storage_limit=max_storage_limit,
+        has_warning=has_warning,
+        sort_by=sort_by,
+        descending=descending,
+    )
 
-    return filtered
+    return api_serialise.JSONBytesResponse(
+        api_serialise.encode_components(filtered), headers={"ETag": etag}
+    )
 
 
 #####################################################################################
@@ -179,13 +282,16 @@ def list_system_components(
 #
 #   GET   /v1/component_events/:name           Get latestest useage for a component
 #   GET   /v1/component_events/:name/history   Get historic useages for a component
+#   GET   /v1/component_events/:name/rollups   Get downsampled useages for a component
 #   GET   /v1/component_components             Get latestest useage for all components
 #
 ######################################################################################
 
 
 @app.get("/v1/component_events/{component_name}")
-def get_latest_useage(component_name: str) -> t.Dict[str, str]:
+async def get_latest_useage(
+    component_name: str, if_none_match: t.Optional[str] = Header(None)
+) -> t.Dict[str, str]:
     """
     Retrieve the latest storage useage of a component in the system.
 
@@ -193,16 +299,33 @@ def get_latest_useage(component_name: str) -> t.Dict[str, str]:
     ---------------
     component_name: str
         the unique name of a system component.
+
+    Headers
+    -------
+    If-None-Match: str
+        the ETag of an earlier response, answered with 304 Not Modified
+        while it is current.
     """
-    all_component_events = in_memory_db["system_events"][component_name]
-    latest_event = all_component_events[len(all_component_events) - 1]
+    etag = api_utils.version_etag(in_memory_db, component_name=component_name)
+    latest_event_json = in_memory_db["latest_event_json"].get(component_name)
+    if latest_event_json is None:
+        error_msg = f"{component_name} does not exist in the monitored system."
+        raise HTTPException(status_code=404, detail=error_msg)
+
+    if (not_modified := api_serialise.not_modified(if_none_match, etag)) is not None:
+        return not_modified
 
-    return latest_event.return_custom_event_dict()
+    return api_serialise.JSONBytesResponse(latest_event_json, headers={"ETag": etag})
 
 
 @app.get("/v1/component_events/{component_name}/history")
-def get_useage_history(
-    component_name: str, skip: int = 0, limit: t.Optional[int] = 100
+async def get_useage_history(
+    component_name: str,
+    skip: int = Query(0, ge=0),
+    limit: t.Optional[int] = Query(100, ge=0),
+    since: t.Optional[datetime] = None,
+    until: t.Optional[datetime] = None,
+    if_none_match: t.Optional[str] = Header(None),
 ) -> t.List[t.Dict[str, str]]:
     """
     List complete storage useage history for a component in the system.
@@ -218,20 +341,80 @@ def get_useage_history(
         The number of component events in our result set to skip.
     limit: int
         The total number of component events to return.
+    since: datetime
+        Only list component events recorded at or after this time.
+    until: datetime
+        Only list component events recorded at or before this time.
+
+    Headers
+    -------
+    If-None-Match: str
+        the ETag of an earlier response, answered with 304 Not Modified
+        while it is current.
     """
-    all_component_events = in_memory_db["system_events"][component_name]
-    event_history_response = [
-        event.return_custom_event_dict() for event in all_component_events
-    ]
+    api_utils.prune_expired_events(component_name, in_memory_db)
+
+    etag = api_utils.version_etag(in_memory_db, component_name=component_name)
+    if (not_modified := api_serialise.not_modified(if_none_match, etag)) is not None:
+        return not_modified
+
+    page = api_utils.list_event_history(
+        component_name,
+        in_memory_db,
+        skip,
+        limit,
+        since_ns=api_utils.datetime_to_epoch_ns(since),
+        until_ns=api_utils.datetime_to_epoch_ns(until),
+    )
+
+    return api_serialise.JSONBytesResponse(
+        api_serialise.encode_events(page), headers={"ETag": etag}
+    )
+
+
+@app.get("/v1/component_events/{component_name}/rollups")
+async def get_useage_rollups(
+    component_name: str,
+    resolution: Resolution = Resolution.hour,
+    since: t.Optional[datetime] = None,
+    until: t.Optional[datetime] = None,
+) -> t.List[t.Dict[str, t.Any]]:
+    """
+    List the storage useage history of a component in the system, downsampled
+    to the minimum, maximum and average useage per minute, hour or day.
+
+    Path Parameters
+    ---------------
+    component_name: str
+        the unique name of a system component.
 
-    filtered = event_history_response[skip : skip + limit]
+    Query Parameters
+    ----------------
+    resolution: str
+        The length of each bucket: "minute", "hour" (the default) or "day".
+    since: datetime
+        Only list buckets ending at or after this time.
+    until: datetime
+        Only list buckets starting at or before this time.
+    """
+    if component_name not in in_memory_db["rollups"]:
+        error_msg = f"{component_name} does not exist in the monitored system."
+        raise HTTPException(status_code=404, detail=error_msg)
 
-    return filtered
+    return api_utils.list_rollups(
+        component_name,
+        in_memory_db,
+        resolution,
+        since_ns=api_utils.datetime_to_epoch_ns(since),
+        until_ns=api_utils.datetime_to_epoch_ns(until),
+    )
 
 
 @app.get("/v1/component_events")
 def get_all_latest_useages(
-    skip: int = 0, limit: t.Optional[int] = 100
+    skip: int = Query(0, ge=0),
+    limit: t.Optional[int] = Query(100, ge=0),
+    if_none_match: t.Optional[str] = Header(None),
 ) -> t.List[t.Dict[str, str]]:
     """List the latest storage useage of all component in the system.
 
@@ -241,22 +424,64 @@ def get_all_latest_useages(
         The number of component events in our result set to skip.
     limit: int
         The total number of component events to return.
+
+    Headers
+    -------
+    If-None-Match: str
+        the ETag of an earlier response, answered with 304 Not Modified
+        while it is current.
     """
+    etag = api_utils.version_etag(in_memory_db, "component_events")
+    if (not_modified := api_serialise.not_modified(if_none_match, etag)) is not None:
+        return not_modified
+
+    # latest useages are encoded per component as events are registered
+    latest_event_json = list(in_memory_db["latest_event_json"].values())
+    filtered = api_utils.paginate(latest_event_json, skip, limit)
 
-    all_components = in_memory_db["system_events"].keys()
+    return api_serialise.JSONBytesResponse(
+        api_serialise.join_array(filtered), headers={"ETag": etag}
+    )
 
-    latest_events = []
-    for component in all_components:
-        all_component_events = in_memory_db["system_events"][component]
-        latest_events.append(all_component_events[len(all_component_events) - 1])
 
-    latest_events_for_each_component_response = [
-        event.return_custom_event_dict() for event in latest_events
-    ]
+@app.post("/v1/component_events:batch")
+def report_useages(
+    usage_reports: t.List[SystemComponentUpdate],
+) -> t.Dict[str, t.Union[int, t.List[t.Dict[str, str]]]]:
+    """Apply storage useage reports for many system components at once.
 
-    filtered = latest_events_for_each_component_response[skip : skip + limit]
+    Each report is applied as if it were sent to
+    PATCH /v1/system_components/:name, and must include the name of the
+    component. A report which fails does not stop the rest of the batch
+    from being applied.
+
+    returns: the number of applied and failed reports, and a result for each
+    report (in order) with its status code and any warning it triggered.
+    """
+    results = api_utils.apply_usage_reports(usage_reports, in_memory_db)
+    applied = sum(result["status_code"] == 200 for result in results)
 
-    return filtered
+    return {
+        "applied": applied,
+        "failed": len(results) - applied,
+        "results": results,
+    }
+
+
+@app.post("/v1/component_events:stream")
+async def stream_useages(request: Request) -> t.Dict[str, t.Any]:
+    """Apply a stream of storage useage reports sent as newline-delimited
+    JSON, one report per line in the format accepted by
+    POST /v1/component_events:batch.
+
+    Agents can hold this request open and keep writing reports to it.
+    Reports are applied in batches as they arrive, and a summary is
+    returned when the agent ends the stream.
+
+    returns: the number of lines read, applied and failed, counts of each
+    warning type triggered, and the first failed lines.
+    """
+    return await api_ingest.apply_usage_stream(request.stream(), in_memory_db)
 
 
 ##########################################################
@@ -271,7 +496,10 @@ def get_all_latest_useages(
 
 @app.get("/v1/resource_warnings")
 def list_resource_warnings(
-    skip: int = 0, limit: t.Optional[int] = 100
+    skip: int = Query(0, ge=0),
+    limit: t.Optional[int] = Query(100, ge=0),
+    state: WarningState = WarningState.active,
+    if_none_match: t.Optional[str] = Header(None),
 ) -> t.List[t.Dict[str, str]]:
     """List all current resource warnings in our s.
 
@@ -281,15 +509,283 @@ def list_resource_warnings(
         The number of system components in our result set to skip.
     limit: int
         The total number of system components to return.
+    state: WarningState
+        "active" (default) lists the latest warning of each incident not yet
+        resolved, "all" every warning retained, resolved or not.
+
+    Headers
+    -------
+    If-None-Match: str
+        the ETag of an earlier response, answered with 304 Not Modified
+        while it is current.
     """
-    # extract all resource warnings from the db and pair to the component
+    etag = api_utils.version_etag(in_memory_db, "resource_warnings")
+    if (not_modified := api_serialise.not_modified(if_none_match, etag)) is not None:
+        return not_modified
+
+    # extract the resource warnings from the db and pair to the component
     # that triggered them
-    system_components = in_memory_db["system_events"].keys()
-    warning_objects = api_utils.get_all_warnings(system_components, in_memory_db)
-    paired = api_utils.list_warning_dicts(
-        warning_objects, system_components, in_memory_db
+    if state == WarningState.active:
+        warning_objects = api_utils.get_active_warnings(in_memory_db)
+    else:
+        system_components = in_memory_db["system_events"].keys()
+        warning_objects = api_utils.get_all_warnings(system_components, in_memory_db)
+    page = api_utils.paginate(warning_objects, skip, limit)
+
+    filtered = api_utils.list_warning_dicts(page, in_memory_db)
+
+    return api_serialise.JSONBytesResponse(
+        api_serialise.dumps(filtered), headers={"ETag": etag}
+    )
+
+
+##################################################################
+#
+#                    Warning Rule Endpoints
+#                    ----------------------
+#
+#   GET   /v1/warning_rules         List the warning rules
+#   GET   /v1/warning_rules/:name   Get the thresholds of a component
+#
+##################################################################
+
+
+@app.get("/v1/warning_rules", response_model=t.List[WarningRule])
+def list_warning_rules() -> t.List[WarningRule]:
+    """List the warning rules set in settings.py, deciding when each system
+    component registers a resource warning."""
+
+    return in_memory_db["rules"].rules
+
+
+@app.get("/v1/warning_rules/{component_name}")
+async def get_warning_thresholds(component_name: str) -> t.Dict[str, t.Any]:
+    """Get the thresholds a system component registers resource warnings at,
+    compiled from the warning rules applying to it.
+
+    Path Parameters
+    ---------------
+    component_name: str
+        the unique name of a system component.
+    """
+    if component_name not in in_memory_db["system_components"]:
+        error_msg = f"{component_name} does not exist in the monitored system."
+        raise HTTPException(status_code=404, detail=error_msg)
+
+    plan = in_memory_db["rules"].plan_for(component_name)
+
+    return {"component_name": component_name, **plan.to_dict()}
+
+
+##################################################################
+#
+#                    Change Feed Endpoints
+#                    ---------------------
+#
+#   GET   /v1/change_feed   Subscribe to new events and warnings
+#
+##################################################################
+
+
+@app.get("/v1/change_feed")
+async def subscribe_to_changes(
+    component_name: t.Optional[t.List[str]] = Query(None),
+    kind: t.Optional[t.List[FeedKind]] = Query(None),
+    after: t.Optional[str] = None,
+    last_event_id: t.Optional[str] = Header(None),
+) -> StreamingResponse:
+    """Stream the component events and resource warnings registered from
+    now on, as Server-Sent Events, in place of polling for them.
+
+    Query Parameters
+    ----------------
+    component_name: list(str)
+        only stream the records of these components (default all).
+    kind: list(FeedKind)
+        only stream these kinds of record, "component_event" and/or
+        "resource_warning" (default both).
+    after: str
+        the id of the last record received, to resume the stream after it.
+
+    Headers
+    -------
+    Last-Event-ID: str
+        sent by a reconnecting EventSource, in place of after.
+    """
+    change_feed = in_memory_db["feed"]
+    subscription = change_feed.subscribe(
+        asyncio.get_running_loop(), component_name, kind, last_event_id or after
+    )
+
+    # workers apply the writes of the others while their streams are idle
+    on_idle, idle_seconds = None, settings.FEED_KEEPALIVE_SECONDS
+    if in_memory_db["backend"].shared:
+        on_idle = partial(run_in_threadpool, api_utils.sync_in_memory_db, in_memory_db)
+        idle_seconds = settings.FEED_SYNC_INTERVAL_SECONDS
+
+    return StreamingResponse(
+        change_feed.stream(subscription, idle_seconds, on_idle),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    filtered = paired[skip : skip + limit]
 
-    return filtered
+##################################################################
+#
+#                    Forecast Endpoints
+#                    ------------------
+#
+#   GET   /v1/forecasts/:name   Get time until limit for a component
+#   GET   /v1/forecasts         Get time until limit for all components
+#
+##################################################################
+
+
+@app.get("/v1/forecasts/{component_name}")
+async def get_forecast(component_name: str) -> t.Dict[str, t.Any]:
+    """Forecast when a component of our system will reach its storage limit,
+    from the growth of its storage useage.
+
+    Path Parameters
+    ---------------
+    component_name: str
+        the unique name of a system component.
+    """
+    if component_name not in in_memory_db["system_components"]:
+        error_msg = f"{component_name} does not exist in the monitored system."
+        raise HTTPException(status_code=404, detail=error_msg)
+
+    (forecast,) = api_utils.list_forecasts([component_name], in_memory_db)
+
+    return forecast
+
+
+@app.get("/v1/forecasts")
+def list_forecasts(
+    skip: int = Query(0, ge=0), limit: t.Optional[int] = Query(100, ge=0)
+) -> t.List[t.Dict[str, t.Any]]:
+    """Forecast when each component of our system will reach its storage limit.
+
+    Query Parameters
+    ----------------
+    skip: int
+        The number of forecasts in our result set to skip.
+    limit: int
+        The total number of forecasts to return.
+    """
+    # copied, as other threads can register and delete components meanwhile
+    system_components = list(in_memory_db["system_components"])
+    page = api_utils.paginate(system_components, skip, limit)
+
+    return api_utils.list_forecasts(page, in_memory_db)
+
+
+##########################################################################
+#
+#                          Export Endpoints
+#                          ----------------
+#
+#   GET   /v1/exports/component_events    Export complete useage history
+#   GET   /v1/exports/resource_warnings   Export complete warning history
+#
+##########################################################################
+
+
+@app.get("/v1/exports/component_events")
+def export_useage_history(
+    format: api_export.ExportFormat = api_export.ExportFormat.ndjson,
+    component_name: t.Optional[str] = None,
+    since: t.Optional[datetime] = None,
+    until: t.Optional[datetime] = None,
+) -> StreamingResponse:
+    """Export the storage useage history of all components in the system (or
+    a single component) as newline-delimited JSON or CSV. The export is
+    streamed as it is read from the db, so it starts immediately however
+    much history is held.
+
+    Query Parameters
+    ----------------
+    format: str
+        "ndjson" (the default) or "csv".
+    component_name: str
+        only export events of this system component.
+    since: datetime
+        only export events recorded at or after this time.
+    until: datetime
+        only export events recorded at or before this time.
+    """
+    events = api_export.iter_events(
+        in_memory_db,
+        component_name,
+        api_utils.datetime_to_epoch_ns(since),
+        api_utils.datetime_to_epoch_ns(until),
+    )
+
+    return StreamingResponse(
+        api_export.export_events(events, format),
+        media_type=api_export.MEDIA_TYPES[format],
+    )
+
+
+@app.get("/v1/exports/resource_warnings")
+def export_resource_warnings(
+    format: api_export.ExportFormat = api_export.ExportFormat.ndjson,
+    component_name: t.Optional[str] = None,
+    since: t.Optional[datetime] = None,
+    until: t.Optional[datetime] = None,
+) -> StreamingResponse:
+    """Export all resource warnings in the system (or those of a single
+    component) as newline-delimited JSON or CSV, paired to the event which
+    triggered them.
+
+    Query Parameters
+    ----------------
+    format: str
+        "ndjson" (the default) or "csv".
+    component_name: str
+        only export warnings of this system component.
+    since: datetime
+        only export warnings triggered at or after this time.
+    until: datetime
+        only export warnings triggered at or before this time.
+    """
+    warnings = api_export.iter_warnings(
+        in_memory_db,
+        component_name,
+        api_utils.datetime_to_epoch_ns(since),
+        api_utils.datetime_to_epoch_ns(until),
+    )
+
+    return StreamingResponse(
+        api_export.export_warnings(warnings, format),
+        media_type=api_export.MEDIA_TYPES[format],
+    )
+
+
+##########################################################
+#
+#                   Service Endpoints
+#                   -----------------
+#
+#   GET   /v1/memory_usage	 Get memory used by the db
+#   GET   /v1/notifications	 Get delivery stats of webhooks
+#
+###########################################################
+
+
+@app.get("/v1/memory_usage")
+def get_memory_usage() -> t.Dict[str, int]:
+    """Estimate the memory used by our in memory database, along with the
+    number of records it holds. Useful for sizing the service against the
+    retention policy in settings.py."""
+
+    return api_utils.estimate_memory_usage(in_memory_db)
+
+
+@app.get("/v1/notifications")
+def get_notification_stats() -> t.List[t.Dict[str, t.Any]]:
+    """Report, for each webhook resource warnings are sent to, the number
+    of warnings waiting to be sent, delivered, coalesced with an earlier
+    warning, dropped from a full queue, and failed after every retry."""
+
+    return in_memory_db["notifier"].stats()
@@ -1,3 +1,5 @@
+import datetime
+import functools
 from typing import Dict
 from typing import Union
 
@@ -5,17 +7,35 @@ import pydantic
 
 JSON = Union[Dict[str, str], Dict[str, Union[str, Dict[str, str]]]]
 
+TIMESTAMP_FORMAT = "%m.%d.%Y %H:%M:%S"
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_epoch_s(epoch_s: int) -> str:
+    moment = datetime.datetime.fromtimestamp(epoch_s)
+
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def format_epoch_ns(epoch_ns: int) -> str:
+    """Format a time in nanoseconds since the epoch as an event timestamp"""
+    # timestamps only resolve seconds, and events reported in the same
+    # second share one, so the formatted seconds are cached
+    return _format_epoch_s(epoch_ns // 1_000_000_000)
+
 
 class ComponentEvent(pydantic.BaseModel):
     """A ComponentEvent is a data point of a given SystemComponents storage
     useage one moment in time.
 
     note: These are automatically generated when new components are registered
-    and the storage limits and useages change.
+    and the storage limits and useages change. epoch_ns holds the same moment
+    as timestamp (in nanoseconds since the epoch) for internal comparisons.
     """
 
     event_id: str
     timestamp: str
+    epoch_ns: int
     component_name: str
     total_available_storage: int
     storage_limit: int
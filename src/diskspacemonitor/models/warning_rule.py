@@ -0,0 +1,24 @@
+from enum import Enum
+
+import pydantic
+
+
+class RuleKind(str, Enum):
+    # within threshold Gigabits of the storage limit
+    absolute = "absolute"
+    # using threshold percent of the total available storage
+    percentage = "percentage"
+    # growing faster than threshold Gigabits per hour
+    growth_rate = "growth_rate"
+
+
+class WarningRule(pydantic.BaseModel):
+    """A WarningRule sets when the SystemComponents whose names match its
+    components pattern (a glob, e.g. "build-*") register a resource warning.
+    Absolute and percentage rules register a "close to memory limit"
+    warning, growth rate rules a "predicted to reach memory limit" warning.
+    """
+
+    components: str = "*"
+    kind: RuleKind
+    threshold: float = pydantic.Field(..., ge=0)
@@ -0,0 +1,259 @@
+"""notify.py
+
+Contains the dispatcher delivering the resource warnings registered in our
+db to webhooks. Warnings are handed to the dispatcher as they are
+registered, and delivered by a background thread per webhook, so a slow or
+unreachable webhook never delays the request which raised a warning.
+
+Warnings are POSTed to each webhook in batches, as a JSON array in the
+format of GET /v1/resource_warnings. A warning of the same type as one
+queued for its component within the coalescing window is dropped, so a
+component hovering around its limit does not flood the webhook. Failed
+batches are retried with exponential backoff.
+"""
+import threading
+import time
+import typing as t
+import urllib.error
+import urllib.request
+from collections import deque
+
+from diskspacemonitor import serialise
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.resource_warning import ResourceWarning
+
+
+class Webhook:
+    """Delivers batches of warnings to one URL from a background thread.
+
+    Parameters
+    ----------
+    url: str
+        the URL warnings are POSTed to.
+    batch_size: int
+        the most warnings POSTed at once.
+    flush_interval: float
+        the longest time (in seconds) a warning waits for its batch to fill.
+    coalesce_seconds: float
+        repeats of a warning within this time (in seconds) are dropped.
+    max_retries: int
+        the number of times a failed batch is retried before it is dropped.
+    retry_backoff: float
+        the delay (in seconds) before the first retry, doubled every retry.
+    queue_size: int
+        the most warnings waiting to be sent, new warnings are dropped beyond.
+    timeout: float
+        the longest time (in seconds) a POST may take.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        coalesce_seconds: float = 60.0,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        queue_size: int = 10_000,
+        timeout: float = 5.0,
+    ) -> None:
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.coalesce_seconds = coalesce_seconds
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+        # guards the queue, and wakes the sender (and callers of flush)
+        self._condition = threading.Condition()
+        self._queue = deque()
+        # when a warning of each type was last queued for each component
+        self._last_queued = {}
+        self._in_flight = 0
+        self._flushing = 0
+
+        self._closed = threading.Event()
+        self._sender = threading.Thread(target=self._send_batches, daemon=True)
+        self._sender.start()
+
+    def submit(
+        self, component_name: str, warning_type: str, warning_dict: t.Dict[str, t.Any]
+    ) -> None:
+        """Queue a warning to be sent, unless it repeats one queued within
+        the coalescing window. Never blocks on the webhook."""
+        key = (component_name, warning_type)
+        now = time.monotonic()
+
+        with self._condition:
+            last_queued = self._last_queued.get(key)
+            if last_queued is not None and now - last_queued < self.coalesce_seconds:
+                self.coalesced += 1
+                return
+            if len(self._queue) >= self.queue_size:
+                self.dropped += 1
+                return
+
+            self._last_queued[key] = now
+            self._queue.append(warning_dict)
+
+            # wake the sender when a batch starts, and when it is full
+            if len(self._queue) in (1, self.batch_size):
+                self._condition.notify_all()
+
+    def flush(self, timeout: t.Optional[float] = None) -> bool:
+        """Send the warnings queued without waiting for their batch to fill,
+        returning whether they were all handled within the timeout."""
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(
+                    lambda: not self._queue and not self._in_flight, timeout
+                )
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout: t.Optional[float] = None) -> None:
+        """Send the warnings queued, then stop the sender. Batches still
+        failing when the webhook is closed are not retried."""
+        self._closed.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._sender.join(timeout)
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        return {
+            "url": self.url,
+            "queued": len(self._queue),
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _next_batch(self) -> t.Optional[t.List[t.Dict[str, t.Any]]]:
+        """Wait for a batch to fill, or for the flush interval to pass since
+        its first warning. Returns None once closed with nothing queued."""
+        with self._condition:
+            while not self._queue:
+                if self._closed.is_set():
+                    return None
+                self._condition.wait()
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size:
+                if self._flushing or self._closed.is_set():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            n_warnings = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(n_warnings)]
+            self._in_flight = len(batch)
+
+            return batch
+
+    def _send_batches(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            self._deliver(batch)
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+
+    def _deliver(self, batch: t.List[t.Dict[str, t.Any]]) -> None:
+        body = serialise.dumps(batch)
+        delay = self.retry_backoff
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._post(body)
+                self.delivered += len(batch)
+                return
+            except urllib.error.HTTPError as error:
+                # the batch was rejected, and would be rejected again
+                if error.code < 500 and error.code not in (408, 429):
+                    break
+            except OSError:
+                pass
+
+            if attempt == self.max_retries or self._closed.wait(delay):
+                break
+            delay *= 2
+
+        self.failed += len(batch)
+
+    def _post(self, body: bytes) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class WarningDispatcher:
+    """Hands every resource warning registered in our db to each webhook.
+
+    The webhooks (and their threads) are only started by the first warning,
+    so a db with no webhooks configured, or which never warns, starts none.
+
+    Parameters
+    ----------
+    urls: list(str)
+        the URLs of the webhooks.
+    **options:
+        the options of each Webhook.
+    """
+
+    def __init__(self, urls: t.Iterable[str], **options: t.Any) -> None:
+        self.urls = list(urls)
+        self.options = options
+        self._lock = threading.Lock()
+        self._webhooks = None
+
+    def submit(
+        self, resource_warning: ResourceWarning, system_event: ComponentEvent
+    ) -> None:
+        if not self.urls:
+            return
+
+        warning_dict = resource_warning.return_custom_warning_dict(system_event)
+        for webhook in self._start():
+            webhook.submit(
+                system_event.component_name, resource_warning.warning_type, warning_dict
+            )
+
+    def flush(self, timeout: t.Optional[float] = None) -> bool:
+        return all([webhook.flush(timeout) for webhook in self._webhooks or []])
+
+    def close(self, timeout: t.Optional[float] = None) -> None:
+        for webhook in self._webhooks or []:
+            webhook.close(timeout)
+
+    def stats(self) -> t.List[t.Dict[str, t.Any]]:
+        if self._webhooks is None:
+            counters = dict.fromkeys(
+                ["queued", "delivered", "coalesced", "dropped", "failed"], 0
+            )
+            return [{"url": url, **counters} for url in self.urls]
+
+        return [webhook.stats() for webhook in self._webhooks]
+
+    def _start(self) -> t.List[Webhook]:
+        if self._webhooks is None:
+            with self._lock:
+                if self._webhooks is None:
+                    self._webhooks = [Webhook(url, **self.options) for url in self.urls]
+
+        return self._webhooks
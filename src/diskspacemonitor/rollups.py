@@ -0,0 +1,282 @@
+"""rollups.py
+
+Contains the downsampled rollups of the useage history of a single
+SystemComponent. Every event registered for a component is folded into a
+bucket per resolution (minute, hour and day) holding the count, minimum,
+maximum and sum of its storage useage and proportion of storage used.
+
+Rollups are maintained incrementally as events are stored and kept for
+longer than the raw event history (see settings.ROLLUP_RETENTION), so long
+windows can be charted from a few thousand buckets. Persistence backends
+which compact away the raw events store the rollups in their snapshot.
+"""
+import bisect
+import sys
+import typing as t
+from array import array
+from enum import Enum
+
+from diskspacemonitor import settings
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
+
+
+class Resolution(str, Enum):
+    minute = "minute"
+    hour = "hour"
+    day = "day"
+
+
+BUCKET_SECONDS = {
+    Resolution.minute: 60,
+    Resolution.hour: 60 * 60,
+    Resolution.day: 24 * 60 * 60,
+}
+
+
+def proportion_used(event: ComponentEvent) -> float:
+    """Return the storage in use at an event as a proportion of 100%"""
+    if not event.total_available_storage:
+        return 0.0
+
+    return event.current_storage_useage / event.total_available_storage * 100
+
+
+class RollupSeries:
+    """Buckets of a single resolution, stored as parallel columns in time
+    order. Once max_buckets are held the oldest bucket is evicted for every
+    new one.
+    """
+
+    _COLUMN_NAMES = (
+        "start_s",
+        "count",
+        "useage_min",
+        "useage_max",
+        "useage_sum",
+        "proportion_min",
+        "proportion_max",
+        "proportion_sum",
+    )
+
+    # the packed bytes of a bucket, one 8 byte value per column
+    BUCKET_SIZE = 8 * len(_COLUMN_NAMES)
+
+    def __init__(self, bucket_seconds: int, max_buckets: t.Optional[int]) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max_buckets
+        self._start_s = array("q")
+        self._count = array("q")
+        self._useage_min = array("q")
+        self._useage_max = array("q")
+        self._useage_sum = array("q")
+        self._proportion_min = array("d")
+        self._proportion_max = array("d")
+        self._proportion_sum = array("d")
+
+    def __len__(self) -> int:
+        return len(self._start_s)
+
+    def _columns(self) -> t.List[array]:
+        return [
+            self._start_s,
+            self._count,
+            self._useage_min,
+            self._useage_max,
+            self._useage_sum,
+            self._proportion_min,
+            self._proportion_max,
+            self._proportion_sum,
+        ]
+
+    def add(self, epoch_ns: int, useage: int, proportion: float) -> None:
+        """Fold a data point into the bucket it falls in."""
+        start_s = epoch_ns // 1_000_000_000 // self.bucket_seconds * self.bucket_seconds
+
+        if not self._start_s or self._start_s[-1] < start_s:
+            if self.max_buckets is not None and len(self) >= self.max_buckets:
+                for column in self._columns():
+                    del column[0]
+            for column, value in zip(
+                self._columns(),
+                (start_s, 0, useage, useage, 0, proportion, proportion, 0.0),
+            ):
+                column.append(value)
+            position = len(self) - 1
+        else:
+            # events arrive in time order, so this is almost always the
+            # latest bucket
+            position = bisect.bisect_left(self._start_s, start_s)
+            if self._start_s[position] != start_s:
+                # older than every bucket kept, or in a gap in the series
+                return
+
+        self._count[position] += 1
+        self._useage_min[position] = min(self._useage_min[position], useage)
+        self._useage_max[position] = max(self._useage_max[position], useage)
+        self._useage_sum[position] += useage
+        self._proportion_min[position] = min(self._proportion_min[position], proportion)
+        self._proportion_max[position] = max(self._proportion_max[position], proportion)
+        self._proportion_sum[position] += proportion
+
+    def pack(self) -> bytes:
+        """Return the buckets of the series as little-endian bytes, column
+        by column."""
+        packed = []
+        for column in self._columns():
+            if sys.byteorder != "little":
+                column = array(column.typecode, column)
+                column.byteswap()
+            packed.append(column.tobytes())
+
+        return b"".join(packed)
+
+    def unpack(self, packed: bytes) -> None:
+        """Replace the buckets of the series with those packed by pack,
+        keeping the latest max_buckets."""
+        packed = memoryview(packed)
+        count = len(packed) // self.BUCKET_SIZE
+        start = 0
+        if self.max_buckets is not None:
+            start = max(count - self.max_buckets, 0)
+        offset = 0
+        for column in self._columns():
+            del column[:]
+            column.frombytes(packed[offset : offset + count * column.itemsize])
+            if sys.byteorder != "little":
+                column.byteswap()
+            del column[:start]
+            offset += count * column.itemsize
+
+    def copy(self) -> "RollupSeries":
+        rollup_series = RollupSeries(self.bucket_seconds, self.max_buckets)
+        for column, copied_column in zip(self._columns(), rollup_series._columns()):
+            copied_column.extend(column)
+
+        return rollup_series
+
+    def _bucket_dict(self, position: int) -> t.Dict[str, t.Any]:
+        count = self._count[position]
+
+        return {
+            "timestamp": format_epoch_ns(self._start_s[position] * 1_000_000_000),
+            "event_count": count,
+            "current_storage_useage": {
+                "min": self._useage_min[position],
+                "max": self._useage_max[position],
+                "avg": self._useage_sum[position] / count,
+            },
+            "proportion_of_total_storage_used": {
+                "min": self._proportion_min[position],
+                "max": self._proportion_max[position],
+                "avg": self._proportion_sum[position] / count,
+            },
+        }
+
+    def query(
+        self, since_ns: t.Optional[int] = None, until_ns: t.Optional[int] = None
+    ) -> t.List[t.Dict[str, t.Any]]:
+        """Return the buckets overlapping since_ns to until_ns (inclusive),
+        found by binary search."""
+        lo, hi = 0, len(self)
+        if since_ns is not None:
+            since_s = since_ns // 1_000_000_000
+            lo = bisect.bisect_right(self._start_s, since_s - self.bucket_seconds)
+        if until_ns is not None:
+            hi = bisect.bisect_right(self._start_s, until_ns // 1_000_000_000, lo=lo)
+
+        return [self._bucket_dict(position) for position in range(lo, hi)]
+
+    def nbytes(self) -> int:
+        return sum(
+            sys.getsizeof(column) + column.itemsize * len(column)
+            for column in self._columns()
+        )
+
+
+class ComponentRollups:
+    """The rollups of a component at every resolution, bounded by the
+    retention in settings.ROLLUP_RETENTION.
+    """
+
+    def __init__(self, component_name: str) -> None:
+        self.component_name = component_name
+        self.series = {
+            resolution: RollupSeries(
+                bucket_seconds, settings.ROLLUP_RETENTION.get(resolution.value)
+            )
+            for resolution, bucket_seconds in BUCKET_SECONDS.items()
+        }
+        # the time of the latest event folded in
+        self.latest_epoch_ns = None
+        # events up to this time are already folded into rollups restored
+        # from a snapshot, so are skipped as they are replayed
+        self.restored_epoch_ns = None
+
+    def add(self, event: ComponentEvent) -> None:
+        """Fold an event into the rollups at every resolution."""
+        if self.restored_epoch_ns is not None:
+            if event.epoch_ns <= self.restored_epoch_ns:
+                return
+
+        self.latest_epoch_ns = event.epoch_ns
+        proportion = proportion_used(event)
+        for rollup_series in self.series.values():
+            rollup_series.add(event.epoch_ns, event.current_storage_useage, proportion)
+
+    def query(
+        self,
+        resolution: Resolution,
+        since_ns: t.Optional[int] = None,
+        until_ns: t.Optional[int] = None,
+    ) -> t.List[t.Dict[str, t.Any]]:
+        return self.series[resolution].query(since_ns, until_ns)
+
+    def nbytes(self) -> int:
+        return sum(rollup_series.nbytes() for rollup_series in self.series.values())
+
+    def copy(self) -> "ComponentRollups":
+        component_rollups = ComponentRollups(self.component_name)
+        component_rollups.series = {
+            resolution: rollup_series.copy()
+            for resolution, rollup_series in self.series.items()
+        }
+        component_rollups.latest_epoch_ns = self.latest_epoch_ns
+        component_rollups.restored_epoch_ns = self.restored_epoch_ns
+
+        return component_rollups
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        """Return the rollups' plain values, to be snapshotted beside the
+        buckets returned by pack."""
+        return {
+            "component_name": self.component_name,
+            "latest_epoch_ns": self.latest_epoch_ns,
+            "buckets": {
+                resolution.value: len(rollup_series)
+                for resolution, rollup_series in self.series.items()
+            },
+        }
+
+    def pack(self) -> bytes:
+        """Return the buckets of every resolution as bytes, in the order of
+        to_dict."""
+        return b"".join(rollup_series.pack() for rollup_series in self.series.values())
+
+    @classmethod
+    def from_packed(
+        cls, rollups_dict: t.Dict[str, t.Any], packed: bytes
+    ) -> "ComponentRollups":
+        """Restore rollups snapshotted by to_dict and pack."""
+        component_rollups = cls(rollups_dict["component_name"])
+        packed = memoryview(packed)
+        offset = 0
+        for resolution, count in rollups_dict["buckets"].items():
+            size = count * RollupSeries.BUCKET_SIZE
+            rollup_series = component_rollups.series[Resolution(resolution)]
+            rollup_series.unpack(packed[offset : offset + size])
+            offset += size
+        component_rollups.latest_epoch_ns = rollups_dict["latest_epoch_ns"]
+        component_rollups.restored_epoch_ns = rollups_dict["latest_epoch_ns"]
+
+        return component_rollups
@@ -0,0 +1,194 @@
+"""rules.py
+
+Contains the rule engine deciding when a system component registers a
+resource warning, from the warning rules set in settings.py.
+
+Rules apply to the components whose names match their pattern. For each
+kind of rule, only the rules of the most specific scope matching a
+component apply: those naming it exactly, else those matching it by a glob
+pattern, else those matching every component ("*"). Among the rules which
+apply, the most sensitive threshold wins. Components no absolute rule
+matches get a default absolute rule of settings.CLOSE_TO_STORAGE_LIMIT_TRIGGER
+Gigabits.
+
+The rules of a component are compiled into an EvaluationPlan the first
+time it is updated, holding one threshold per kind of rule, so evaluating
+a useage report costs the same however many rules are set. Evaluating
+returns the type of warning triggered, rather than raising it.
+"""
+import fnmatch
+import typing as t
+
+from diskspacemonitor import settings
+from diskspacemonitor import warn
+from diskspacemonitor.forecast import GrowthForecast
+from diskspacemonitor.models.warning_rule import RuleKind
+from diskspacemonitor.models.warning_rule import WarningRule
+
+# the scopes of rules, most specific first. DEFAULT is the scope of the
+# default absolute rule, which any configured absolute rule replaces
+EXACT, PATTERN, GLOBAL, DEFAULT = range(4)
+
+# whether a greater threshold of each kind of rule is the more sensitive
+_GREATER_IS_SENSITIVE = {
+    RuleKind.absolute: True,
+    RuleKind.percentage: False,
+    RuleKind.growth_rate: False,
+}
+
+
+def rule_scope(rule: WarningRule) -> int:
+    if rule.components == "*":
+        return GLOBAL
+    if any(character in rule.components for character in "*?["):
+        return PATTERN
+
+    return EXACT
+
+
+class EvaluationPlan:
+    """The thresholds of the rules applying to one component."""
+
+    __slots__ = ("headroom", "utilisation", "growth_per_second")
+
+    def __init__(
+        self,
+        headroom: float,
+        utilisation: t.Optional[float] = None,
+        growth_per_second: t.Optional[float] = None,
+    ) -> None:
+        # warn within this many Gigabits of the storage limit
+        self.headroom = headroom
+        # warn when using this proportion of the total available storage
+        self.utilisation = utilisation
+        # warn when growing faster than this many Gigabits per second
+        self.growth_per_second = growth_per_second
+
+    def evaluate(
+        self,
+        total_available_storage: int,
+        storage_limit: int,
+        current_storage_useage: int,
+    ) -> t.Optional[warn.WarningEnum]:
+        """Return the type of warning a storage useage triggers, if any. A
+        useage over the storage limit always triggers a warning."""
+        # the same limit as SystemComponent.set_current_storage_useage
+        storage_limit_in_gigabits = int(total_available_storage * (storage_limit / 100))
+
+        if current_storage_useage > storage_limit_in_gigabits:
+            return warn.WarningEnum.over_memory_limit
+        if storage_limit_in_gigabits - current_storage_useage <= self.headroom:
+            return warn.WarningEnum.close_to_memory_limit
+        if self.utilisation is not None:
+            if current_storage_useage >= self.utilisation * total_available_storage:
+                return warn.WarningEnum.close_to_memory_limit
+
+        return None
+
+    def predicts_warning(self, growth_forecast: GrowthForecast) -> bool:
+        """Return whether the growth forecast of a component triggers a
+        warning: its limit is forecast within the horizon set in
+        settings.py, or it grows faster than the growth rate rules allow."""
+        if growth_forecast.predicts_limit_within(
+            settings.FORECAST_WARNING_HORIZON_SECONDS
+        ):
+            return True
+        if self.growth_per_second is None:
+            return False
+
+        growth_rate = growth_forecast.growth_rate
+
+        return growth_rate is not None and growth_rate >= self.growth_per_second
+
+    def cleared(
+        self,
+        total_available_storage: int,
+        storage_limit: int,
+        current_storage_useage: int,
+        growth_forecast: GrowthForecast,
+    ) -> bool:
+        """Return whether a storage useage is clear of every threshold by
+        settings.WARNING_CLEAR_MARGIN Gigabits, resolving an incident."""
+        margin = settings.WARNING_CLEAR_MARGIN
+        storage_limit_in_gigabits = int(total_available_storage * (storage_limit / 100))
+
+        if storage_limit_in_gigabits - current_storage_useage <= self.headroom + margin:
+            return False
+        if self.utilisation is not None:
+            clear_useage = self.utilisation * total_available_storage - margin
+            if current_storage_useage >= clear_useage:
+                return False
+
+        return not self.predicts_warning(growth_forecast)
+
+    def to_dict(self) -> t.Dict[str, t.Optional[float]]:
+        """The thresholds of the plan, in the units of the rules."""
+        percentage, growth_per_hour = None, None
+        if self.utilisation is not None:
+            percentage = self.utilisation * 100
+        if self.growth_per_second is not None:
+            growth_per_hour = self.growth_per_second * 3600
+
+        return {
+            RuleKind.absolute.value: self.headroom,
+            RuleKind.percentage.value: percentage,
+            RuleKind.growth_rate.value: growth_per_hour,
+        }
+
+
+def compile_plan(component_name: str, rules: t.Iterable[WarningRule]) -> EvaluationPlan:
+    """Compile the rules applying to a component into its evaluation plan."""
+    # the scope and threshold of the rules applying, per kind of rule
+    applying = {RuleKind.absolute: (DEFAULT, settings.CLOSE_TO_STORAGE_LIMIT_TRIGGER)}
+    for rule in rules:
+        if not fnmatch.fnmatchcase(component_name, rule.components):
+            continue
+
+        scope = rule_scope(rule)
+        current = applying.get(rule.kind)
+        if current is None or scope < current[0]:
+            applying[rule.kind] = (scope, rule.threshold)
+        elif scope == current[0]:
+            if _GREATER_IS_SENSITIVE[rule.kind]:
+                threshold = max(current[1], rule.threshold)
+            else:
+                threshold = min(current[1], rule.threshold)
+            applying[rule.kind] = (scope, threshold)
+
+    thresholds = {kind: threshold for kind, (_, threshold) in applying.items()}
+    percentage = thresholds.get(RuleKind.percentage)
+    growth_per_hour = thresholds.get(RuleKind.growth_rate)
+
+    return EvaluationPlan(
+        headroom=thresholds[RuleKind.absolute],
+        utilisation=None if percentage is None else percentage / 100,
+        growth_per_second=None if growth_per_hour is None else growth_per_hour / 3600,
+    )
+
+
+class RuleEngine:
+    """Holds the warning rules of our db, and the evaluation plan compiled
+    for each component.
+
+    Parameters
+    ----------
+    rules: list(WarningRule or dict)
+        the warning rules, as WarningRule objects or their dicts.
+    """
+
+    def __init__(
+        self, rules: t.Iterable[t.Union[WarningRule, t.Dict[str, t.Any]]] = ()
+    ) -> None:
+        self.rules = [WarningRule.parse_obj(rule) for rule in rules]
+        self._plans = {}
+
+    def plan_for(self, component_name: str) -> EvaluationPlan:
+        plan = self._plans.get(component_name)
+        if plan is None:
+            plan = compile_plan(component_name, self.rules)
+            self._plans[component_name] = plan
+
+        return plan
+
+    def forget(self, component_name: str) -> None:
+        self._plans.pop(component_name, None)
@@ -0,0 +1,105 @@
+"""serialise.py
+
+Contains the fast path used to serialise the responses of our hottest
+read endpoints. Response bodies are encoded straight to JSON bytes (with
+orjson when it is installed), rather than validated against a response
+model and converted by jsonable_encoder first.
+
+ComponentEvents never change once registered, so the latest event of each
+component is encoded once, as it is registered, and reading it (alone or
+in a list) costs no encoding at all.
+
+Responses carry the version of the records they were built from as an
+ETag, and a conditional GET for a version still current is answered with
+304 Not Modified before any record is read.
+"""
+import json
+import typing as t
+
+from fastapi import Response
+
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.system_component import SystemComponent
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# the same output as orjson, and as the JSONResponse of FastAPI
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(content: t.Any) -> bytes:
+    """Encode plain JSON data (dicts, lists, strings and numbers) to bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+
+    return _json_encoder.encode(content).encode("utf-8")
+
+
+def join_array(encoded: t.Iterable[bytes]) -> bytes:
+    """Join encoded JSON values into an encoded JSON array."""
+    return b"[" + b",".join(encoded) + b"]"
+
+
+def encode_event(event: ComponentEvent) -> bytes:
+    return dumps(event.return_custom_event_dict())
+
+
+def encode_events(events: t.Iterable[ComponentEvent]) -> bytes:
+    return dumps([event.return_custom_event_dict() for event in events])
+
+
+def component_dict(component: SystemComponent) -> t.Dict[str, t.Any]:
+    """The same dict as component.dict(), without pydantic's overhead."""
+    return {
+        "name": component.name,
+        "total_available_storage": component.total_available_storage,
+        "storage_limit": component.storage_limit,
+        "current_storage_useage": component.current_storage_useage,
+    }
+
+
+def encode_component(component: SystemComponent) -> bytes:
+    return dumps(component_dict(component))
+
+
+def encode_components(components: t.Iterable[SystemComponent]) -> bytes:
+    return dumps([component_dict(component) for component in components])
+
+
+class JSONBytesResponse(Response):
+    """A response whose content is JSON already encoded to bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+
+def etag_matches(if_none_match: t.Optional[str], etag: str) -> bool:
+    """Return whether the If-None-Match header of a request names the ETag
+    (using the weak comparison RFC 7232 requires for If-None-Match)."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+
+    return False
+
+
+def not_modified(if_none_match: t.Optional[str], etag: str) -> t.Optional[Response]:
+    """Return a 304 Not Modified response if the client already holds the
+    current version of a response, otherwise None."""
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return None
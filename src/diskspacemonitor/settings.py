@@ -1,7 +1,138 @@
+import json
+import os
+
 # how close (in Gigabits) should an Agents current storage useage
 # be to its storage limit before a "close to memory limit" warning is
 # registered. Default = 10 Gigabits from upper limit.
 CLOSE_TO_STORAGE_LIMIT_TRIGGER = 10
 
+# a resource warning opens an incident for its component, which stays
+# active until the component is clear of its storage limit again: more than
+# CLOSE_TO_STORAGE_LIMIT_TRIGGER + WARNING_CLEAR_MARGIN Gigabits below it,
+# and not forecast to reach it. While an incident is active, a warning is
+# only registered when it is more severe than the last (e.g. "over memory
+# limit" after "close to memory limit"), so a component hovering around its
+# limit does not register a warning per useage report.
+WARNING_CLEAR_MARGIN = 5
+
+# warning rules for a component, or a group of components whose names match
+# a glob pattern, as dicts of the fields of models.warning_rule.WarningRule:
+#   {"components": "CrashDumpStore", "kind": "absolute", "threshold": 50}
+#       warn within 50 Gigabits of the storage limit.
+#   {"components": "build-*", "kind": "percentage", "threshold": 80}
+#       warn when using 80% of the total available storage.
+#   {"components": "*", "kind": "growth_rate", "threshold": 5}
+#       warn when growing faster than 5 Gigabits per hour.
+# The rules of a component override those of its groups, which override
+# the rules for every component ("*") of the same kind, see rules.py.
+# CLOSE_TO_STORAGE_LIMIT_TRIGGER is the absolute rule of components which
+# no absolute rule matches. They can be set as a JSON array by an
+# environment variable of the same name.
+WARNING_RULES = json.loads(os.environ.get("WARNING_RULES", "[]"))
+
+# retention policy for the event history of each component. Histories are
+# ring buffers holding at most MAX_EVENTS_PER_COMPONENT events, and events
+# older than MAX_EVENT_AGE_SECONDS are evicted as new events arrive. Any
+# resource warnings triggered by an evicted event are evicted with it.
+# Set either to None to disable that limit.
+MAX_EVENTS_PER_COMPONENT = 10_000
+MAX_EVENT_AGE_SECONDS = None
+
+# storage engine used for the event history of each component:
+#   "dict"      ComponentEvent objects in a deque (reference implementation).
+#   "columnar"  compact typed arrays, roughly 15x fewer bytes per event.
+EVENT_STORE = "dict"
+
+# the number of downsampled rollup buckets of each component's useage kept
+# per resolution (set one to None to keep every bucket). Rollups outlive the
+# raw event history (the journal backend stores them in its snapshot), by
+# default a week of minutes, 90 days of hours and 5 years of days.
+ROLLUP_RETENTION = {"minute": 60 * 24 * 7, "hour": 24 * 90, "day": 365 * 5}
+
+# growth forecasts fit a regression of each component's storage useage over
+# time, in which the weight of an event halves every FORECAST_HALF_LIFE_SECONDS.
+# Forecasts are made once a component's events span FORECAST_MIN_SPAN_SECONDS,
+# and a "predicted to reach memory limit" warning is registered when the
+# limit is forecast within FORECAST_WARNING_HORIZON_SECONDS.
+FORECAST_HALF_LIFE_SECONDS = 6 * 60 * 60
+FORECAST_MIN_SPAN_SECONDS = 60
+FORECAST_WARNING_HORIZON_SECONDS = 24 * 60 * 60
+
+# whether the event history (and warnings) of a deleted component are kept
+# as a backlog, subject to the retention policy above.
+KEEP_HISTORY_OF_DELETED_COMPONENTS = True
+
+# writes to each system component are serialised by one of
+# COMPONENT_LOCK_SHARDS locks (chosen by the component's name), so writes to
+# different components rarely wait on each other.
+COMPONENT_LOCK_SHARDS = 64
+
+# backend recording the writes to our db so it can be rebuilt on restart:
+#   "memory"  nothing is persisted, data is lost when the application stops.
+#   "sqlite"  a SQLite database (WAL mode) at SQLITE_PATH. Writes are
+#             committed in batches of SQLITE_BATCH_SIZE, or at least every
+#             SQLITE_FLUSH_INTERVAL_SECONDS.
+#   "journal" an append-only log at JOURNAL_PATH, compacted into a snapshot
+#             at SNAPSHOT_PATH every JOURNAL_COMPACT_EVERY writes.
+#   "shared"  a SQLite database at SQLITE_PATH shared by several worker
+#             processes (uvicorn --workers). Writes are committed as they
+#             are made, and each worker applies the writes of the others
+#             from a log of the latest SHARED_CHANGE_LOG_SIZE changes.
+# The backend and SQLite path can be set by environment variables of the
+# same names.
+PERSISTENCE_BACKEND = os.environ.get("PERSISTENCE_BACKEND", "memory")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "diskspacemonitor.db")
+SQLITE_BATCH_SIZE = 500
+SQLITE_FLUSH_INTERVAL_SECONDS = 1.0
+SHARED_CHANGE_LOG_SIZE = 100_000
+JOURNAL_PATH = "diskspacemonitor.journal"
+SNAPSHOT_PATH = "diskspacemonitor.snapshot"
+JOURNAL_COMPACT_EVERY = 100_000
+
+# when writes to the journal are fsynced to disk: "always" (after every
+# write), "interval" (every JOURNAL_FSYNC_INTERVAL_MS milliseconds) or "os"
+# (left to the operating system).
+JOURNAL_FSYNC = "interval"
+JOURNAL_FSYNC_INTERVAL_MS = 100
+
+# useage reports streamed to POST /v1/component_events:stream are applied in
+# batches of STREAM_BATCH_SIZE lines. Lines longer than STREAM_MAX_LINE_BYTES
+# are rejected without being buffered, and the summary returned lists at
+# most STREAM_MAX_REPORTED_ERRORS failed lines.
+STREAM_BATCH_SIZE = 500
+STREAM_MAX_LINE_BYTES = 64 * 1024
+STREAM_MAX_REPORTED_ERRORS = 100
+
+# the change feed (GET /v1/change_feed) keeps the latest FEED_BUFFER_SIZE
+# records for subscribers resuming after a reconnect, and queues at most
+# FEED_QUEUE_SIZE records for each subscriber. A stream with nothing to send
+# is sent a keep-alive comment every FEED_KEEPALIVE_SECONDS. With the
+# "shared" backend, the writes of other workers are applied (and pushed)
+# every FEED_SYNC_INTERVAL_SECONDS instead.
+FEED_BUFFER_SIZE = 10_000
+FEED_QUEUE_SIZE = 1_000
+FEED_KEEPALIVE_SECONDS = 15.0
+FEED_SYNC_INTERVAL_SECONDS = 1.0
+
+# resource warnings are POSTed to each of WEBHOOK_URLS (which can be set by
+# an environment variable of the same name, separated by commas) in batches
+# of at most NOTIFY_BATCH_SIZE, sent at most NOTIFY_FLUSH_INTERVAL_SECONDS
+# after their first warning. A warning of the same type as one queued for
+# its component in the last NOTIFY_COALESCE_SECONDS is dropped. A failed
+# batch is retried NOTIFY_MAX_RETRIES times, the first after
+# NOTIFY_RETRY_BACKOFF_SECONDS and doubling after that. At most
+# NOTIFY_QUEUE_SIZE warnings wait to be sent to each webhook, and a POST
+# times out after NOTIFY_TIMEOUT_SECONDS.
+WEBHOOK_URLS = [
+    url.strip() for url in os.environ.get("WEBHOOK_URLS", "").split(",") if url.strip()
+]
+NOTIFY_BATCH_SIZE = 100
+NOTIFY_FLUSH_INTERVAL_SECONDS = 1.0
+NOTIFY_COALESCE_SECONDS = 60.0
+NOTIFY_MAX_RETRIES = 5
+NOTIFY_RETRY_BACKOFF_SECONDS = 0.5
+NOTIFY_QUEUE_SIZE = 10_000
+NOTIFY_TIMEOUT_SECONDS = 5.0
+
 
 # more settings would go here ....
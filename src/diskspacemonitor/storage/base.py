@@ -0,0 +1,109 @@
+"""base.py
+
+Contains the interface every persistence backend implements. Reads are
+always served from the in memory db built up in utils.py; a backend only
+records the writes made to it, so the db can be rebuilt when the
+application restarts.
+"""
+import abc
+import contextlib
+import typing as t
+from enum import Enum
+
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.resource_warning import ResourceWarning
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.rollups import ComponentRollups
+
+
+class ChangeKind(str, Enum):
+    component = "component"
+    delete = "delete"
+    event = "event"
+    # the changes since the last transaction are no longer logged, the db
+    # must be rebuilt from the backend's records
+    reload = "reload"
+
+
+# a change made by another process, with the record it wrote: a
+# SystemComponent, the name of a deleted component, an event along with its
+# resource warning, or None
+Change = t.Tuple[ChangeKind, t.Any]
+
+
+class PersistenceBackend(abc.ABC):
+    """Records the writes made to our in memory db.
+
+    Backends which replay a log of writes on startup can set snapshot_due
+    to ask for a snapshot of the db, which lets them discard the log.
+
+    Backends shared by several processes, each with its own in memory db,
+    set shared and report the changes the other processes made through
+    transaction.
+
+    Backends whose writes never wait on I/O unset blocking_writes, so
+    writes can be made from the event loop rather than the threadpool.
+    """
+
+    snapshot_due = False
+    shared = False
+    blocking_writes = True
+
+    @abc.abstractmethod
+    def save_component(self, component: SystemComponent) -> None:
+        """Record that a system component was registered."""
+
+    @abc.abstractmethod
+    def delete_component(self, component_name: str) -> None:
+        """Record that a system component was removed."""
+
+    @abc.abstractmethod
+    def save_event(
+        self, event: ComponentEvent, warning: t.Optional[ResourceWarning] = None
+    ) -> None:
+        """Record a system event, and the resource warning it triggered."""
+
+    @abc.abstractmethod
+    def load_components(self) -> t.Iterator[SystemComponent]:
+        """Return every registered system component."""
+
+    @abc.abstractmethod
+    def load_events(
+        self,
+    ) -> t.Iterator[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]]:
+        """Return every recorded system event (and its resource warning) in
+        the order they were registered."""
+
+    def write_snapshot(
+        self,
+        components: t.Iterable[SystemComponent],
+        events: t.Iterable[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]],
+        rollups: t.Iterable[ComponentRollups] = (),
+    ) -> None:
+        """Replace the records of the backend with a snapshot of the db. The
+        rollups of each component are snapshotted too, as they summarise
+        events no longer in the db. Snapshots are written while the db is
+        written to, so the given iterables are read lazily, once the
+        backend has marked the records the snapshot covers."""
+
+    def load_rollups(self) -> t.Iterator[ComponentRollups]:
+        """Return the rollups of the latest snapshot. Events replayed by
+        load_events which are already folded into them are skipped."""
+        return iter(())
+
+    @contextlib.contextmanager
+    def transaction(self, write: bool = True) -> t.Iterator[t.Iterable[Change]]:
+        """Yield the changes other processes made to the backend since the
+        last transaction, which must be applied to the db before it is read
+        or written. If write is set, the writes of other processes are held
+        off until the transaction ends. Backends used by a single process
+        have no changes to report.
+        """
+        yield ()
+
+    def flush(self) -> None:
+        """Write any buffered records through to storage."""
+
+    def close(self) -> None:
+        """Flush and release the backend."""
+        self.flush()
@@ -0,0 +1,397 @@
+"""journal.py
+
+Contains a persistence backend which records our db in an append-only
+log of operations, periodically compacted into a snapshot of the db.
+
+On startup the snapshot is memory-mapped and read, then only the log
+records written after it are replayed, so restart time is bounded by the
+size of the db (which the retention policy bounds) rather than by how
+long the application has been running. The snapshot only holds the events
+the retention policy keeps, so it also holds the useage rollups, which
+summarise older events.
+
+The snapshot is a JSON header line, holding the components and the sizes
+of the sections after it, followed by the events packed as EVENT_RECORDs
+and then the rollup buckets packed column by column. The header is read
+once, when the backend is opened or the snapshot is written.
+
+Log records are JSON lines carrying a sequence number. The snapshot
+stores the sequence number it covers, so log records already folded into
+it are skipped if the application stopped before the log was compacted.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import typing as t
+
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
+from diskspacemonitor.models.resource_warning import ResourceWarning
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.rollups import ComponentRollups
+from diskspacemonitor.rollups import RollupSeries
+from diskspacemonitor.storage.base import PersistenceBackend
+
+FSYNC_POLICIES = ("always", "interval", "os")
+
+# event id, epoch_ns, component index, total storage, storage limit, useage
+EVENT_RECORD = struct.Struct("<16sqIqqq")
+
+
+def _event_id_bytes(event_id: str) -> bytes:
+    return bytes.fromhex(event_id.replace("-", ""))
+
+
+def _event_id_str(raw_id: bytes) -> str:
+    hex_id = raw_id.hex()
+    return f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-{hex_id[16:20]}-{hex_id[20:]}"
+
+
+class JournalBackend(PersistenceBackend):
+    """A persistence backend writing to an append-only log and snapshot.
+
+    Parameters
+    ----------
+    journal_path: str
+        the path of the append-only log.
+    snapshot_path: str
+        the path of the snapshot the log is compacted into.
+    fsync: str
+        when log writes are fsynced to disk. "always" after every write,
+        "interval" every fsync_interval_ms, or "os" leaving it to the
+        operating system.
+    fsync_interval_ms: int
+        the time between fsyncs under the "interval" policy.
+    compact_every: int
+        the number of log records after which a snapshot is due.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        snapshot_path: str,
+        fsync: str = "interval",
+        fsync_interval_ms: int = 100,
+        compact_every: int = 100_000,
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, not {fsync}.")
+
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.fsync = fsync
+        self.fsync_interval_ms = fsync_interval_ms
+        self.compact_every = compact_every
+
+        self._lock = threading.Lock()
+        self._header, self._body_offset = self._read_snapshot_header()
+        self._snapshot_seq = self._header["seq"]
+        self._seq = max(self._snapshot_seq, self._last_logged_seq())
+        self._records_since_snapshot = self._seq - self._snapshot_seq
+        self._log = open(journal_path, "a", encoding="utf-8")
+        self._dirty = False
+
+        self._closed = threading.Event()
+        self._syncer = None
+        if fsync == "interval":
+            self._syncer = threading.Thread(target=self._sync_periodically, daemon=True)
+            self._syncer.start()
+
+    #
+    # writing the log
+    #
+
+    def _append(self, record: dict) -> None:
+        with self._lock:
+            self._seq += 1
+            self._records_since_snapshot += 1
+            record["seq"] = self._seq
+            self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+            if self.fsync == "always":
+                self._log.flush()
+                os.fsync(self._log.fileno())
+            elif self.fsync == "os":
+                self._log.flush()
+            else:
+                self._dirty = True
+
+    def _sync_periodically(self) -> None:
+        while not self._closed.wait(self.fsync_interval_ms / 1000):
+            self.flush()
+
+    def save_component(self, component: SystemComponent) -> None:
+        self._append({"op": "component", "component": component.dict()})
+
+    def delete_component(self, component_name: str) -> None:
+        self._append({"op": "delete", "name": component_name})
+
+    def save_event(
+        self, event: ComponentEvent, warning: t.Optional[ResourceWarning] = None
+    ) -> None:
+        record = {"op": "event", "event": event.dict(exclude={"timestamp"})}
+        if warning is not None:
+            record["warning"] = warning.dict()
+        self._append(record)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._log.closed:
+                return
+            self._log.flush()
+            if self.fsync != "os" and self._dirty:
+                os.fsync(self._log.fileno())
+            self._dirty = False
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        self.flush()
+        with self._lock:
+            self._log.close()
+
+    #
+    # compacting the log into a snapshot
+    #
+
+    @property
+    def snapshot_due(self) -> bool:
+        return self._records_since_snapshot >= self.compact_every
+
+    def write_snapshot(
+        self,
+        components: t.Iterable[SystemComponent],
+        events: t.Iterable[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]],
+        rollups: t.Iterable[ComponentRollups] = (),
+    ) -> None:
+        """Replace the snapshot with the given state of our db and drop the
+        log records it covers.
+
+        Writes carry on while the snapshot is written. It covers the log
+        records written before it began, so the state given must be read
+        lazily, after that. Events registered meanwhile can be in both the
+        snapshot and the log tail, and are only replayed once (see
+        load_events).
+        """
+        with self._lock:
+            self._log.flush()
+            snapshot_seq = self._seq
+            log_offset = self._log.tell()
+
+        names, warnings, packed_events = {}, {}, []
+        component_dicts = [component.dict() for component in components]
+        for event, warning in events:
+            name_index = names.setdefault(event.component_name, len(names))
+            packed_events.append(
+                EVENT_RECORD.pack(
+                    _event_id_bytes(event.event_id),
+                    event.epoch_ns,
+                    name_index,
+                    event.total_available_storage,
+                    event.storage_limit,
+                    event.current_storage_useage,
+                )
+            )
+            if warning is not None:
+                warnings[event.event_id] = [warning.warning_id, warning.warning_type]
+
+        rollup_dicts, packed_rollups = [], []
+        for component_rollups in rollups:
+            rollup_dicts.append(component_rollups.to_dict())
+            packed_rollups.append(component_rollups.pack())
+
+        header = {
+            "seq": snapshot_seq,
+            "components": component_dicts,
+            "names": list(names),
+            "warnings": warnings,
+            "event_count": len(packed_events),
+            "rollups": rollup_dicts,
+        }
+        header_line = json.dumps(header).encode("utf-8") + b"\n"
+
+        # write the new snapshot beside the old one and swap it in atomically
+        partial_path = f"{self.snapshot_path}.partial"
+        with open(partial_path, "wb") as snapshot:
+            snapshot.write(header_line)
+            snapshot.write(b"".join(packed_events))
+            snapshot.write(b"".join(packed_rollups))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+
+        with self._lock:
+            if self._log.closed:
+                # the log still holds every record, so the snapshot is moot
+                os.remove(partial_path)
+                return
+
+            os.replace(partial_path, self.snapshot_path)
+            self._drop_log_head(log_offset)
+            self._header, self._body_offset = header, len(header_line)
+            self._snapshot_seq = snapshot_seq
+            self._records_since_snapshot = self._seq - snapshot_seq
+
+    def _drop_log_head(self, offset: int) -> None:
+        """Replace the log with the records written from offset on. Must be
+        called holding the lock."""
+        self._log.flush()
+        partial_path = f"{self.journal_path}.partial"
+        with open(self.journal_path, "rb") as log, open(partial_path, "wb") as tail:
+            log.seek(offset)
+            tail.write(log.read())
+            tail.flush()
+            os.fsync(tail.fileno())
+
+        self._log.close()
+        os.replace(partial_path, self.journal_path)
+        self._log = open(self.journal_path, "a", encoding="utf-8")
+        self._dirty = False
+
+    #
+    # loading the snapshot and replaying the log
+    #
+
+    def _read_snapshot_header(self) -> t.Tuple[dict, int]:
+        """Return the snapshot header and the offset of the packed sections
+        after it."""
+        if not os.path.exists(self.snapshot_path):
+            header = {
+                "seq": 0,
+                "components": [],
+                "names": [],
+                "warnings": {},
+                "event_count": 0,
+                "rollups": [],
+            }
+            return header, 0
+
+        with open(self.snapshot_path, "rb") as snapshot:
+            header_line = snapshot.readline()
+
+        return json.loads(header_line), len(header_line)
+
+    def _last_logged_seq(self) -> int:
+        last_seq = 0
+        for record in self._read_log():
+            last_seq = record["seq"]
+
+        return last_seq
+
+    def _read_log(self) -> t.Iterator[dict]:
+        """Return the log records written after the snapshot."""
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn write at the end of the log, left by a crash
+                    break
+                if record["seq"] > self._snapshot_seq:
+                    yield record
+
+    def _read_snapshot_events(
+        self,
+    ) -> t.Iterator[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]]:
+        if not self._header["event_count"]:
+            return
+
+        offset = self._body_offset
+        size = offset + self._header["event_count"] * EVENT_RECORD.size
+        names, warnings = self._header["names"], self._header["warnings"]
+        with open(self.snapshot_path, "rb") as snapshot:
+            with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for position in range(offset, size, EVENT_RECORD.size):
+                    (
+                        raw_id,
+                        epoch_ns,
+                        name_index,
+                        total,
+                        limit,
+                        useage,
+                    ) = EVENT_RECORD.unpack_from(mapped, position)
+                    event_id = _event_id_str(raw_id)
+                    event = ComponentEvent.construct(
+                        event_id=event_id,
+                        timestamp=format_epoch_ns(epoch_ns),
+                        epoch_ns=epoch_ns,
+                        component_name=names[name_index],
+                        total_available_storage=total,
+                        storage_limit=limit,
+                        current_storage_useage=useage,
+                    )
+                    warning = None
+                    if event_id in warnings:
+                        warning_id, warning_type = warnings[event_id]
+                        warning = ResourceWarning(
+                            warning_id=warning_id,
+                            warning_type=warning_type,
+                            component_event_id=event_id,
+                        )
+                    yield event, warning
+
+    def load_components(self) -> t.Iterator[SystemComponent]:
+        self.flush()
+        components = {
+            component["name"]: component for component in self._header["components"]
+        }
+        for record in self._read_log():
+            if record["op"] == "component":
+                components[record["component"]["name"]] = record["component"]
+            elif record["op"] == "delete":
+                components.pop(record["name"], None)
+
+        for component in components.values():
+            yield SystemComponent(**component)
+
+    def load_rollups(self) -> t.Iterator[ComponentRollups]:
+        if not self._header["rollups"]:
+            return
+
+        offset = self._body_offset + self._header["event_count"] * EVENT_RECORD.size
+        with open(self.snapshot_path, "rb") as snapshot:
+            with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for rollups_dict in self._header["rollups"]:
+                    size = (
+                        sum(rollups_dict["buckets"].values()) * RollupSeries.BUCKET_SIZE
+                    )
+                    yield ComponentRollups.from_packed(
+                        rollups_dict, mapped[offset : offset + size]
+                    )
+                    offset += size
+
+    def load_events(
+        self,
+    ) -> t.Iterator[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]]:
+        self.flush()
+
+        # an event registered while a snapshot was written can be in both
+        # the snapshot and the log tail. The events of a component are
+        # registered in time order, so those in the log no later than its
+        # latest snapshotted event are skipped
+        latest_epoch_ns = {}
+        for event, warning in self._read_snapshot_events():
+            latest_epoch_ns[event.component_name] = max(
+                event.epoch_ns, latest_epoch_ns.get(event.component_name, -1)
+            )
+            yield event, warning
+
+        for record in self._read_log():
+            if record["op"] != "event":
+                continue
+            event_fields = record["event"]
+            snapshotted_ns = latest_epoch_ns.get(event_fields["component_name"], -1)
+            if event_fields["epoch_ns"] <= snapshotted_ns:
+                continue
+            event = ComponentEvent(
+                timestamp=format_epoch_ns(event_fields["epoch_ns"]), **event_fields
+            )
+            warning = None
+            if "warning" in record:
+                warning = ResourceWarning(**record["warning"])
+            yield event, warning
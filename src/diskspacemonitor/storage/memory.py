@@ -0,0 +1,37 @@
+"""memory.py
+
+Contains the default persistence backend, which persists nothing. The in
+memory db is the only copy of our data and is lost when the application
+stops.
+"""
+import typing as t
+
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.resource_warning import ResourceWarning
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.storage.base import PersistenceBackend
+
+
+class InMemoryBackend(PersistenceBackend):
+    """A persistence backend which keeps data in memory only."""
+
+    blocking_writes = False
+
+    def save_component(self, component: SystemComponent) -> None:
+        pass
+
+    def delete_component(self, component_name: str) -> None:
+        pass
+
+    def save_event(
+        self, event: ComponentEvent, warning: t.Optional[ResourceWarning] = None
+    ) -> None:
+        pass
+
+    def load_components(self) -> t.Iterator[SystemComponent]:
+        return iter(())
+
+    def load_events(
+        self,
+    ) -> t.Iterator[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]]:
+        return iter(())
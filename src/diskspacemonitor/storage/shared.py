@@ -0,0 +1,212 @@
+"""shared.py
+
+Contains a persistence backend which lets several worker processes (e.g.
+uvicorn --workers) serve the same db. Each worker keeps its own in memory
+db, and records its writes in a SQLite database the workers share, along
+with a log of the changes made.
+
+Before a worker serves a request it applies the changes the other workers
+logged since its last request. Writes are made in a transaction holding
+the SQLite database's write lock, so writes are serialised across workers
+and always applied to an up to date db.
+"""
+import contextlib
+import sqlite3
+import threading
+import typing as t
+
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
+from diskspacemonitor.models.resource_warning import ResourceWarning
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.storage.base import Change
+from diskspacemonitor.storage.base import ChangeKind
+from diskspacemonitor.storage.sqlite import SCHEMA
+from diskspacemonitor.storage.sqlite import SQLiteBackend
+
+CHANGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL
+);
+"""
+
+INSERT_CHANGE = "INSERT INTO changes (kind, key) VALUES (?, ?)"
+SELECT_CHANGES = """
+SELECT c.seq, c.kind, c.key,
+       s.total_available_storage, s.storage_limit, s.current_storage_useage,
+       e.epoch_ns, e.component_name, e.total_available_storage,
+       e.storage_limit, e.current_storage_useage, w.warning_id, w.warning_type
+FROM changes c
+LEFT JOIN system_components s ON c.kind = 'component' AND s.name = c.key
+LEFT JOIN component_events e ON c.kind = 'event' AND e.event_id = c.key
+LEFT JOIN resource_warnings w ON w.component_event_id = e.event_id
+WHERE c.seq > ?
+ORDER BY c.seq
+"""
+PRUNE_CHANGES = "DELETE FROM changes WHERE seq <= ?"
+
+
+class SharedSQLiteBackend(SQLiteBackend):
+    """A persistence backend shared by several processes through a SQLite
+    database. Unlike SQLiteBackend, writes are not buffered: they are made
+    in the transaction open when they are recorded.
+
+    Parameters
+    ----------
+    path: str
+        the path of the SQLite database file.
+    change_log_size: int
+        the number of changes kept in the log. A worker which falls further
+        behind rebuilds its db from the backend's records.
+    busy_timeout: float
+        the longest time (in seconds) to wait for the write lock.
+    """
+
+    shared = True
+
+    def __init__(
+        self, path: str, change_log_size: int = 100_000, busy_timeout: float = 30.0
+    ) -> None:
+        self.path = path
+        self.change_log_size = change_log_size
+
+        # transactions are begun and committed explicitly
+        self._connection = sqlite3.connect(
+            path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA + CHANGES_SCHEMA)
+
+        self._lock = threading.RLock()
+        self._depth = 0
+        # the sequence number of the last change applied, None until the
+        # first transaction (in which the db is loaded)
+        self._seq = None
+        self._writes_since_prune = 0
+
+    @contextlib.contextmanager
+    def transaction(self, write: bool = True) -> t.Iterator[t.Iterable[Change]]:
+        with self._lock:
+            if self._depth:
+                # the enclosing transaction has already reported the changes
+                self._depth += 1
+                try:
+                    yield ()
+                finally:
+                    self._depth -= 1
+                return
+
+            self._connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            self._depth = 1
+            try:
+                yield self._read_changes()
+                if write:
+                    self._prune_changes()
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            else:
+                self._connection.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def _read_changes(self) -> t.List[Change]:
+        if self._seq is None:
+            (self._seq,) = self._connection.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM changes"
+            ).fetchone()
+            return []
+
+        rows = self._connection.execute(SELECT_CHANGES, (self._seq,)).fetchall()
+        if not rows:
+            return []
+
+        first_seq, last_seq = rows[0][0], rows[-1][0]
+        expected_seq, self._seq = self._seq + 1, last_seq
+
+        # only the oldest changes are pruned, so a gap means this worker
+        # fell behind the log
+        if first_seq != expected_seq:
+            return [(ChangeKind.reload, None)]
+
+        return [self._change(row) for row in rows]
+
+    @staticmethod
+    def _change(row: tuple) -> Change:
+        _, kind, key, total, limit, useage = row[:6]
+        epoch_ns, name, event_total, event_limit, event_useage = row[6:11]
+        warning_id, warning_type = row[11:]
+
+        if kind == ChangeKind.delete:
+            return ChangeKind.delete, key
+
+        if kind == ChangeKind.component:
+            # None if the component has since been deleted
+            component = None
+            if total is not None:
+                component = SystemComponent(
+                    name=key,
+                    total_available_storage=total,
+                    storage_limit=limit,
+                    current_storage_useage=useage,
+                )
+            return ChangeKind.component, component
+
+        event = ComponentEvent(
+            event_id=key,
+            timestamp=format_epoch_ns(epoch_ns),
+            epoch_ns=epoch_ns,
+            component_name=name,
+            total_available_storage=event_total,
+            storage_limit=event_limit,
+            current_storage_useage=event_useage,
+        )
+        resource_warning = None
+        if warning_id is not None:
+            resource_warning = ResourceWarning(
+                warning_id=warning_id,
+                warning_type=warning_type,
+                component_event_id=key,
+            )
+
+        return ChangeKind.event, (event, resource_warning)
+
+    def _prune_changes(self) -> None:
+        if self._writes_since_prune >= self.change_log_size:
+            self._connection.execute(PRUNE_CHANGES, (self._seq - self.change_log_size,))
+            self._writes_since_prune = 0
+
+    def _buffer_write(self, statement: str, params: tuple) -> None:
+        self._connection.execute(statement, params)
+
+    def _log_change(self, kind: ChangeKind, key: str) -> None:
+        cursor = self._connection.execute(INSERT_CHANGE, (kind.value, key))
+        self._writes_since_prune += 1
+
+        # within a transaction every earlier change has been applied, so
+        # this worker's own change need not be
+        if self._depth:
+            self._seq = cursor.lastrowid
+
+    def save_component(self, component: SystemComponent) -> None:
+        super().save_component(component)
+        self._log_change(ChangeKind.component, component.name)
+
+    def delete_component(self, component_name: str) -> None:
+        super().delete_component(component_name)
+        self._log_change(ChangeKind.delete, component_name)
+
+    def save_event(
+        self, event: ComponentEvent, warning: t.Optional[ResourceWarning] = None
+    ) -> None:
+        super().save_event(event, warning)
+        self._log_change(ChangeKind.event, event.event_id)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,218 @@
+"""sqlite.py
+
+Contains a persistence backend which records our db in a SQLite database.
+The database runs in WAL mode, and writes are buffered and committed in
+batches (once settings.SQLITE_BATCH_SIZE records are buffered, or every
+settings.SQLITE_FLUSH_INTERVAL_SECONDS) so a single commit is paid for
+many PATCH requests.
+"""
+import itertools
+import sqlite3
+import threading
+import time
+import typing as t
+
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
+from diskspacemonitor.models.resource_warning import ResourceWarning
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.storage.base import PersistenceBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS system_components (
+    name TEXT PRIMARY KEY,
+    total_available_storage INTEGER NOT NULL,
+    storage_limit INTEGER NOT NULL,
+    current_storage_useage INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS component_events (
+    event_id TEXT PRIMARY KEY,
+    epoch_ns INTEGER NOT NULL,
+    component_name TEXT NOT NULL,
+    total_available_storage INTEGER NOT NULL,
+    storage_limit INTEGER NOT NULL,
+    current_storage_useage INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_component_events_component_name
+    ON component_events (component_name, epoch_ns);
+CREATE INDEX IF NOT EXISTS ix_component_events_epoch_ns
+    ON component_events (epoch_ns);
+CREATE TABLE IF NOT EXISTS resource_warnings (
+    warning_id TEXT PRIMARY KEY,
+    warning_type TEXT NOT NULL,
+    component_event_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_resource_warnings_component_event_id
+    ON resource_warnings (component_event_id);
+"""
+
+UPSERT_COMPONENT = """
+INSERT OR REPLACE INTO system_components
+    (name, total_available_storage, storage_limit, current_storage_useage)
+VALUES (?, ?, ?, ?)
+"""
+DELETE_COMPONENT = "DELETE FROM system_components WHERE name = ?"
+INSERT_EVENT = """
+INSERT OR IGNORE INTO component_events
+    (event_id, epoch_ns, component_name, total_available_storage,
+     storage_limit, current_storage_useage)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_WARNING = """
+INSERT OR IGNORE INTO resource_warnings
+    (warning_id, warning_type, component_event_id)
+VALUES (?, ?, ?)
+"""
+SELECT_EVENTS = """
+SELECT e.event_id, e.epoch_ns, e.component_name, e.total_available_storage,
+       e.storage_limit, e.current_storage_useage, w.warning_id, w.warning_type
+FROM component_events e
+LEFT JOIN resource_warnings w ON w.component_event_id = e.event_id
+ORDER BY e.epoch_ns
+"""
+
+
+class SQLiteBackend(PersistenceBackend):
+    """A persistence backend which buffers writes to a SQLite database.
+
+    Parameters
+    ----------
+    path: str
+        the path of the SQLite database file.
+    batch_size: int
+        the number of buffered records which triggers a commit.
+    flush_interval: float
+        the longest time (in seconds) a record stays buffered.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+        # flushes the buffer when writes stop arriving
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def _buffer_write(self, statement: str, params: tuple) -> None:
+        with self._lock:
+            self._buffer.append((statement, params))
+            buffer_full = len(self._buffer) >= self.batch_size
+            flush_due = time.monotonic() - self._last_flush >= self.flush_interval
+            if buffer_full or flush_due:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            # keep writes in order, but insert runs of one statement together
+            with self._connection:
+                for statement, writes in itertools.groupby(
+                    self._buffer, key=lambda write: write[0]
+                ):
+                    self._connection.executemany(
+                        statement, [params for _, params in writes]
+                    )
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def save_component(self, component: SystemComponent) -> None:
+        self._buffer_write(
+            UPSERT_COMPONENT,
+            (
+                component.name,
+                component.total_available_storage,
+                component.storage_limit,
+                component.current_storage_useage,
+            ),
+        )
+
+    def delete_component(self, component_name: str) -> None:
+        self._buffer_write(DELETE_COMPONENT, (component_name,))
+
+    def save_event(
+        self, event: ComponentEvent, warning: t.Optional[ResourceWarning] = None
+    ) -> None:
+        self._buffer_write(
+            INSERT_EVENT,
+            (
+                event.event_id,
+                event.epoch_ns,
+                event.component_name,
+                event.total_available_storage,
+                event.storage_limit,
+                event.current_storage_useage,
+            ),
+        )
+        if warning is not None:
+            self._buffer_write(
+                INSERT_WARNING,
+                (warning.warning_id, warning.warning_type, warning.component_event_id),
+            )
+
+    def load_components(self) -> t.Iterator[SystemComponent]:
+        self.flush()
+        rows = self._connection.execute(
+            "SELECT name, total_available_storage, storage_limit, "
+            "current_storage_useage FROM system_components"
+        )
+        for name, total, limit, useage in rows:
+            yield SystemComponent(
+                name=name,
+                total_available_storage=total,
+                storage_limit=limit,
+                current_storage_useage=useage,
+            )
+
+    def load_events(
+        self,
+    ) -> t.Iterator[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]]:
+        self.flush()
+        for row in self._connection.execute(SELECT_EVENTS):
+            event_id, epoch_ns, name, total, limit, useage, warning_id, warning = row
+            event = ComponentEvent(
+                event_id=event_id,
+                timestamp=format_epoch_ns(epoch_ns),
+                epoch_ns=epoch_ns,
+                component_name=name,
+                total_available_storage=total,
+                storage_limit=limit,
+                current_storage_useage=useage,
+            )
+            resource_warning = None
+            if warning_id is not None:
+                resource_warning = ResourceWarning(
+                    warning_id=warning_id,
+                    warning_type=warning,
+                    component_event_id=event_id,
+                )
+
+            yield event, resource_warning
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        self._connection.close()
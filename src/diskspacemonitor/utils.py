@@ -2,15 +2,182 @@
 
 This module containers helpers used by main.py
 """
-import datetime
+import contextlib
+import itertools
+import threading
+import time
 import typing as t
 import uuid
+from collections import defaultdict
+from collections import OrderedDict
+from datetime import datetime
 
+from starlette.concurrency import run_in_threadpool
+
+from diskspacemonitor import feed
+from diskspacemonitor import fleet
+from diskspacemonitor import forecast
+from diskspacemonitor import history
+from diskspacemonitor import indexes
+from diskspacemonitor import notify
+from diskspacemonitor import rollups
+from diskspacemonitor import rules
+from diskspacemonitor import serialise
+from diskspacemonitor import settings
 from diskspacemonitor import warn
 from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.component_event import format_epoch_ns
 from diskspacemonitor.models.resource_warning import ResourceWarning
 from diskspacemonitor.models.system_component import SystemComponent
 from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.storage.base import Change
+from diskspacemonitor.storage.base import ChangeKind
+from diskspacemonitor.storage.base import PersistenceBackend
+from diskspacemonitor.storage.journal import JournalBackend
+from diskspacemonitor.storage.memory import InMemoryBackend
+from diskspacemonitor.storage.shared import SharedSQLiteBackend
+from diskspacemonitor.storage.sqlite import SQLiteBackend
+
+
+def create_persistence_backend() -> PersistenceBackend:
+    """Return the persistence backend configured in settings.py"""
+    if settings.PERSISTENCE_BACKEND == "sqlite":
+        return SQLiteBackend(
+            settings.SQLITE_PATH,
+            batch_size=settings.SQLITE_BATCH_SIZE,
+            flush_interval=settings.SQLITE_FLUSH_INTERVAL_SECONDS,
+        )
+    if settings.PERSISTENCE_BACKEND == "journal":
+        return JournalBackend(
+            settings.JOURNAL_PATH,
+            settings.SNAPSHOT_PATH,
+            fsync=settings.JOURNAL_FSYNC,
+            fsync_interval_ms=settings.JOURNAL_FSYNC_INTERVAL_MS,
+            compact_every=settings.JOURNAL_COMPACT_EVERY,
+        )
+    if settings.PERSISTENCE_BACKEND == "shared":
+        return SharedSQLiteBackend(
+            settings.SQLITE_PATH, change_log_size=settings.SHARED_CHANGE_LOG_SIZE
+        )
+
+    return InMemoryBackend()
+
+
+def create_warning_dispatcher() -> notify.WarningDispatcher:
+    """Return a dispatcher for the webhooks configured in settings.py"""
+    return notify.WarningDispatcher(
+        settings.WEBHOOK_URLS,
+        batch_size=settings.NOTIFY_BATCH_SIZE,
+        flush_interval=settings.NOTIFY_FLUSH_INTERVAL_SECONDS,
+        coalesce_seconds=settings.NOTIFY_COALESCE_SECONDS,
+        max_retries=settings.NOTIFY_MAX_RETRIES,
+        retry_backoff=settings.NOTIFY_RETRY_BACKOFF_SECONDS,
+        queue_size=settings.NOTIFY_QUEUE_SIZE,
+        timeout=settings.NOTIFY_TIMEOUT_SECONDS,
+    )
+
+
+def create_in_memory_db(
+    backend: t.Optional[PersistenceBackend] = None,
+    notifier: t.Optional[notify.WarningDispatcher] = None,
+) -> dict:
+    """Return an empty dictionary serving as our in memory database. Writes
+    to the db are recorded by the given persistence backend, if any, and
+    the resource warnings registered are sent to the webhooks of the given
+    dispatcher, if any."""
+    return {
+        "backend": backend or InMemoryBackend(),
+        "notifier": notifier or create_warning_dispatcher(),
+        # guards the structures shared by all components (fleet, indexes)
+        "lock": threading.RLock(),
+        # serialise writes to each component, see component_lock
+        "component_locks": [
+            threading.RLock() for _ in range(settings.COMPONENT_LOCK_SHARDS)
+        ],
+        "snapshot_lock": threading.Lock(),
+        "system_components": {},
+        "fleet": fleet.FleetColumns(),
+        "indexes": indexes.ComponentIndexes(),
+        "system_events": {},
+        "rollups": {},
+        "forecasts": {},
+        "resource_warnings": defaultdict(OrderedDict),
+        # the latest warning of each component with an active incident
+        "active_warnings": {},
+        "rules": rules.RuleEngine(settings.WARNING_RULES),
+        "event_index": {},
+        "latest_events": {},
+        "latest_event_json": {},
+        # the version of each collection (and component) in our db, with a
+        # prefix unique to this process, see bump_versions
+        "versions": {},
+        "component_versions": {},
+        "version_sequence": itertools.count(1),
+        "version_epoch": uuid.uuid4().hex[:8],
+        "feed": feed.ChangeFeed(settings.FEED_BUFFER_SIZE, settings.FEED_QUEUE_SIZE),
+    }
+
+
+def component_lock(component_name: str, database: dict) -> threading.RLock:
+    """Return the lock serialising writes to a system component.
+
+    Components share a fixed number of locks (settings.COMPONENT_LOCK_SHARDS),
+    so writes to the same component are serialised while writes to
+    different components mostly proceed independently.
+    """
+    component_locks = database["component_locks"]
+
+    return component_locks[hash(component_name) % len(component_locks)]
+
+
+@contextlib.contextmanager
+def write_transaction(database: dict) -> t.Iterator[None]:
+    """Hold a write transaction on the persistence backend of our db,
+    applying the changes other processes sharing the backend made to it
+    first. Transactions nest, and are free for unshared backends."""
+    with database["backend"].transaction() as changes:
+        apply_changes(changes, database)
+        yield
+
+
+def sync_in_memory_db(database: dict) -> None:
+    """Apply the changes other processes sharing the persistence backend of
+    our db made to it since the last transaction."""
+    with database["backend"].transaction(write=False) as changes:
+        apply_changes(changes, database)
+
+
+def apply_changes(changes: t.Iterable[Change], database: dict) -> None:
+    """Apply changes made to the persistence backend of our db by another
+    process. Changes already in our db are skipped."""
+    for kind, record in changes:
+        if kind == ChangeKind.reload:
+            clear_in_memory_db(database)
+            restore_in_memory_db(database)
+            # the changes skipped were never pushed to subscribers
+            database["feed"].reset()
+        elif kind == ChangeKind.component:
+            # the component has since been deleted
+            if record is None:
+                continue
+            with component_lock(record.name, database):
+                if record.name not in database["system_components"]:
+                    database["system_components"][record.name] = record
+                    index_system_component(
+                        record.name,
+                        record.total_available_storage,
+                        record.storage_limit,
+                        record.current_storage_useage,
+                        database,
+                    )
+        elif kind == ChangeKind.delete:
+            with component_lock(record, database):
+                if record in database["system_components"]:
+                    forget_system_component(record, database)
+        elif kind == ChangeKind.event:
+            system_event, resource_warning = record
+            with component_lock(system_event.component_name, database):
+                replay_system_event(system_event, database, resource_warning)
 
 
 def return_uuid() -> str:
@@ -18,25 +185,324 @@ def return_uuid() -> str:
     return str(uuid.uuid4())
 
 
-def return_timestamp() -> str:
-    """Return current date and time in string format"""
-    return datetime.datetime.now().strftime("%m.%d.%Y %H:%M:%S")
+# the latest time returned by return_epoch_ns
+_clock = {"epoch_ns": 0, "lock": threading.Lock()}
+
+
+def return_epoch_ns() -> int:
+    """Return current time in nanoseconds since the epoch.
+
+    Times are strictly increasing, even if the system clock is set back,
+    so the history of every component stays in time order and can be
+    searched by time.
+    """
+    with _clock["lock"]:
+        _clock["epoch_ns"] = max(time.time_ns(), _clock["epoch_ns"] + 1)
+
+        return _clock["epoch_ns"]
+
+
+def advance_epoch_ns(epoch_ns: int) -> None:
+    """Make sure later times from return_epoch_ns follow epoch_ns."""
+    with _clock["lock"]:
+        _clock["epoch_ns"] = max(epoch_ns, _clock["epoch_ns"])
+
+
+def datetime_to_epoch_ns(moment: t.Optional[datetime]) -> t.Optional[int]:
+    """Convert a (query parameter) datetime to nanoseconds since the epoch.
+    Naive datetimes are taken as local time, like event timestamps."""
+    if moment is None:
+        return None
+
+    return round(moment.timestamp() * 1_000_000) * 1_000
+
+
+def return_timestamp(epoch_ns: t.Optional[int] = None) -> str:
+    """Return current (or the given) date and time in string format"""
+    if epoch_ns is None:
+        epoch_ns = return_epoch_ns()
+
+    return format_epoch_ns(epoch_ns)
+
+
+def bump_versions(
+    database: dict,
+    collections: t.Iterable[str],
+    component_name: t.Optional[str] = None,
+) -> None:
+    """Give the collections of our db (and the component) named a new
+    version, changing the ETags of their responses. Versions are bumped
+    once a change is complete, so a response is never older than its ETag.
+
+    Parameters
+    ----------
+    collections: Iterable[str]
+        "system_components", "component_events" and/or "resource_warnings".
+    component_name: str, optional
+        the name of a system component whose records have changed.
+    """
+    version = next(database["version_sequence"])
+    for collection in collections:
+        database["versions"][collection] = version
+    if component_name is not None:
+        database["component_versions"][component_name] = version
+
+
+def version_etag(
+    database: dict,
+    collection: t.Optional[str] = None,
+    component_name: t.Optional[str] = None,
+) -> str:
+    """Return the ETag of the current version of a collection of our db,
+    or of the records of a component. See bump_versions."""
+    if component_name is not None:
+        version = database["component_versions"].get(component_name, 0)
+    else:
+        version = database["versions"].get(collection, 0)
+
+    return f'"{database["version_epoch"]}-{version}"'
+
+
+def paginate(
+    records: t.Iterable[t.Any], skip: int = 0, limit: t.Optional[int] = None
+) -> t.Iterator[t.Any]:
+    """Lazily return a single page of records from our db.
+
+    Only the records in the requested page are yielded, so callers can
+    serialise a page without touching the rest of the result set.
+
+    Parameters
+    ----------
+    records: iterable
+        stored records in the order they should be listed.
+    skip: int
+        the number of records to skip.
+    limit: int, optional
+        the maximum number of records to return. No limit if None.
+    """
+    stop = None if limit is None else skip + limit
+
+    return itertools.islice(records, skip, stop)
+
+
+def create_system_component(component: SystemComponent, database: dict) -> bool:
+    """Register a new system component along with its first system event.
+    The component's lock is held throughout, so concurrent requests to
+    create the same component register it once.
+
+    returns: False if the component already exists, True otherwise.
+    """
+    with write_transaction(database), component_lock(component.name, database):
+        if component.name in database["system_components"]:
+            return False
+
+        register_system_component(component, database)
+        try:
+            register_system_event(component, database)
+        except Exception:
+            # never leave a component registered without its first event
+            deregister_system_component(component.name, database)
+            raise
+
+    return True
+
+
+def delete_system_component(component_name: str, database: dict) -> bool:
+    """Deregister a system component, holding its lock.
+
+    returns: False if the component does not exist, True otherwise.
+    """
+    with write_transaction(database), component_lock(component_name, database):
+        if component_name not in database["system_components"]:
+            return False
+
+        deregister_system_component(component_name, database)
+
+    return True
 
 
 def register_system_component(component: SystemComponent, database: dict) -> None:
     """Store a newly created systemc component in our db."""
     database["system_components"][component.name] = component
+    index_system_component(
+        component.name,
+        component.total_available_storage,
+        component.storage_limit,
+        component.current_storage_useage,
+        database,
+    )
+    database["backend"].save_component(component)
+    bump_versions(database, ["system_components"], component.name)
+
+
+def index_system_component(
+    component_name: str,
+    total_available_storage: int,
+    storage_limit: int,
+    current_storage_useage: int,
+    database: dict,
+) -> None:
+    """Copy the storage figures of a component into the column snapshot of
+    the fleet and the secondary indexes of our db."""
+    plan = database["rules"].plan_for(component_name)
+    with database["lock"]:
+        database["fleet"].update(
+            component_name,
+            total_available_storage,
+            storage_limit,
+            current_storage_useage,
+            plan.headroom,
+            plan.utilisation,
+        )
+        database["indexes"].update(
+            component_name,
+            total_available_storage,
+            storage_limit,
+            current_storage_useage,
+        )
+
+
+def unindex_system_component(component_name: str, database: dict) -> None:
+    with database["lock"]:
+        database["fleet"].remove(component_name)
+        database["indexes"].remove(component_name)
+
+
+def apply_component_update(
+    system_component: SystemComponent,
+    updated_component: SystemComponentUpdate,
+    plan: t.Optional[rules.EvaluationPlan] = None,
+) -> t.Optional[warn.WarningEnum]:
+    """Apply an update issued by an agent to a system component.
+
+    Parameters
+    ----------
+    system_component: SystemComponent
+        a system component registered in our db.
+    updated_component: SystemComponentUpdate
+        the attributes of the component to update.
+    plan: EvaluationPlan, optional
+        the compiled warning rules of the component (by default, those of
+        settings.CLOSE_TO_STORAGE_LIMIT_TRIGGER alone).
+
+    returns: the type of resource warning triggered by the new storage
+    useage, if any.
+
+    raises: StorageLimitOutOfRangeError if the new storage limit is invalid.
+    """
+    # update component storage limit if in request. It is validated first,
+    # so a rejected update changes nothing
+    if new_storage_limit := updated_component.storage_limit:
+        system_component.set_storage_limit(new_storage_limit)
+
+    # update component total storage if in request
+    if new_total := updated_component.total_available_storage:
+        system_component.total_available_storage = new_total
+
+    # update component storage useage if in request
+    if new_current_useage := updated_component.current_storage_useage:
+        system_component.current_storage_useage = new_current_useage
+        if plan is None:
+            plan = rules.compile_plan(system_component.name, [])
+
+        return plan.evaluate(
+            system_component.total_available_storage,
+            system_component.storage_limit,
+            new_current_useage,
+        )
+
+    return None
+
+
+def apply_usage_report(
+    usage_report: SystemComponentUpdate, database: dict
+) -> t.Dict[str, t.Optional[str]]:
+    """Apply an update issued by an agent to the system component it names
+    and register the resulting system event, holding the component's lock.
+
+    returns: the status code of the update, along with the warning type it
+    triggered or the reason it failed.
+    """
+    component_name = usage_report.name
+
+    if component_name is None:
+        detail = "A usage report must include the name of a system component."
+        return {"name": None, "status_code": 422, "detail": detail}
+
+    with write_transaction(database), component_lock(component_name, database):
+        system_component = database["system_components"].get(component_name)
+        if system_component is None:
+            detail = f"{component_name} does not exist in the monitored system."
+            return {"name": component_name, "status_code": 404, "detail": detail}
+
+        plan = database["rules"].plan_for(component_name)
+        try:
+            warning_type = apply_component_update(system_component, usage_report, plan)
+        except warn.StorageLimitOutOfRangeError:
+            new_storage_limit = usage_report.storage_limit
+            detail = (
+                f"{new_storage_limit} is not a valid storage limit. "
+                "Must be between 0 - 100"
+            )
+            return {"name": component_name, "status_code": 400, "detail": detail}
+
+        warning_type = register_system_event(system_component, database, warning_type)
+
+    return {"name": component_name, "status_code": 200, "warning_type": warning_type}
+
+
+def apply_usage_reports(
+    usage_reports: t.Iterable[SystemComponentUpdate], database: dict
+) -> t.List[t.Dict[str, t.Optional[str]]]:
+    """Apply a batch of updates issued by agents, in order, in a single
+    transaction. See apply_usage_report."""
+    with write_transaction(database):
+        return [
+            apply_usage_report(usage_report, database) for usage_report in usage_reports
+        ]
+
+
+async def run_write(
+    database: dict, write: t.Callable[..., t.Any], *args: t.Any
+) -> t.Any:
+    """Make a write to our db from a coroutine. Writes are made inline when
+    the persistence backend of the db never blocks, as they only touch
+    memory and hold locks briefly, and in the threadpool otherwise so the
+    event loop never waits on I/O."""
+    if database["backend"].blocking_writes:
+        return await run_in_threadpool(write, *args)
+
+    return write(*args)
+
+
+async def create_system_component_async(
+    component: SystemComponent, database: dict
+) -> bool:
+    """See create_system_component."""
+    return await run_write(database, create_system_component, component, database)
+
+
+async def delete_system_component_async(component_name: str, database: dict) -> bool:
+    """See delete_system_component."""
+    return await run_write(database, delete_system_component, component_name, database)
+
+
+async def apply_usage_report_async(
+    usage_report: SystemComponentUpdate, database: dict
+) -> t.Dict[str, t.Optional[str]]:
+    """See apply_usage_report."""
+    return await run_write(database, apply_usage_report, usage_report, database)
 
 
 def register_system_event(
     component: t.Union[SystemComponent, SystemComponentUpdate],
     database: dict,
     warning: t.Optional[warn.WarningEnum] = None,
-) -> None:
+) -> t.Optional[warn.WarningEnum]:
     """Store a new system event in our db when a system component storage
     useage is updated. If this event triggers a resource warning (when
     storage exceeds (or comes close to exceeing) our components storage
-    limit, also store this warning in our db.
+    limit, or is forecast to reach it soon), also store this warning in our db.
 
     Parameters
     ----------
@@ -46,28 +512,569 @@ def register_system_event(
         an dictionary serving as a database.
     warning: WarningEnum, optional
         a warning type if (only if the event triggered a warning).
+
+    returns: the type of resource warning registered, if any.
     """
 
     # always register the system event to capture updates to components
-    time_of_event = return_timestamp()
+    epoch_ns = return_epoch_ns()
+    time_of_event = return_timestamp(epoch_ns)
     event_id = return_uuid()
     system_event = ComponentEvent(
         event_id=event_id,
         timestamp=time_of_event,
+        epoch_ns=epoch_ns,
         component_name=component.name,
         total_available_storage=component.total_available_storage,
         storage_limit=component.storage_limit,
         current_storage_useage=component.current_storage_useage,
     )
-    database["system_events"][component.name].append(system_event)
+
+    growth_forecast = forecast_system_event(system_event, database)
+    plan = database["rules"].plan_for(component.name)
+    if warning is None and plan.predicts_warning(growth_forecast):
+        warning = warn.WarningEnum.predicted_to_reach_memory_limit
+
+    # while an incident is active, only a more severe warning is registered
+    active_warning = database["active_warnings"].get(component.name)
+    if warning and active_warning is not None:
+        active_severity = warn.WARNING_SEVERITY[active_warning.warning_type]
+        if warn.WARNING_SEVERITY[warning] <= active_severity:
+            warning = None
 
     # if the system event triggered a warning, register it seperately as well
+    resource_warning = None
     if warning:
         warning_id = return_uuid()
         resource_warning = ResourceWarning(
             warning_id=warning_id, warning_type=warning, component_event_id=event_id
         )
-        database["resource_warnings"][component.name].append(resource_warning)
+
+    store_system_event(system_event, database, resource_warning)
+    database["backend"].save_event(system_event, resource_warning)
+    publish_system_event(system_event, database, resource_warning)
+
+    # only the process registering a warning sends it, never blocking on it
+    if resource_warning is not None:
+        database["notifier"].submit(resource_warning, system_event)
+
+    if database["backend"].snapshot_due:
+        snapshot_in_background(database)
+
+    return warning
+
+
+def forecast_system_event(
+    system_event: ComponentEvent, database: dict
+) -> forecast.GrowthForecast:
+    """Fit a system event into the growth forecast of its component,
+    returning the forecast."""
+    component_name = system_event.component_name
+
+    growth_forecast = database["forecasts"].get(component_name)
+    if growth_forecast is None:
+        growth_forecast = forecast.GrowthForecast(
+            component_name, settings.FORECAST_HALF_LIFE_SECONDS
+        )
+        database["forecasts"][component_name] = growth_forecast
+    growth_forecast.observe(system_event)
+
+    return growth_forecast
+
+
+def store_system_event(
+    system_event: ComponentEvent,
+    database: dict,
+    resource_warning: t.Optional[ResourceWarning] = None,
+) -> None:
+    """Add a system event (and the resource warning it triggered) to the
+    event history and indexes of our db."""
+    component_name = system_event.component_name
+
+    event_history = database["system_events"].get(component_name)
+    if event_history is None:
+        event_history = history.new_event_history(component_name)
+        database["system_events"][component_name] = event_history
+
+    # the history is a ring buffer, the oldest event is evicted when it is full
+    if event_history.append(system_event):
+        evict_warnings(component_name, database)
+    prune_expired_events(component_name, database)
+
+    component_rollups = database["rollups"].get(component_name)
+    if component_rollups is None:
+        component_rollups = rollups.ComponentRollups(component_name)
+        database["rollups"][component_name] = component_rollups
+    component_rollups.add(system_event)
+    growth_forecast = forecast_system_event(system_event, database)
+
+    # keep a snapshot of the latest event (and its encoded response body) per
+    # component, and track its incident
+    is_resolved = False
+    if component_name in database["system_components"]:
+        active_warnings = database["active_warnings"]
+        if resource_warning is not None:
+            active_warnings[component_name] = resource_warning
+        elif component_name in active_warnings:
+            is_resolved = (
+                database["rules"]
+                .plan_for(component_name)
+                .cleared(
+                    system_event.total_available_storage,
+                    system_event.storage_limit,
+                    system_event.current_storage_useage,
+                    growth_forecast,
+                )
+            )
+            if is_resolved:
+                del active_warnings[component_name]
+
+        index_system_component(
+            component_name,
+            system_event.total_available_storage,
+            system_event.storage_limit,
+            system_event.current_storage_useage,
+            database,
+        )
+        database["indexes"].set_warned(
+            component_name, component_name in active_warnings
+        )
+        database["latest_events"][component_name] = system_event
+        database["latest_event_json"][component_name] = serialise.encode_event(
+            system_event
+        )
+
+    if resource_warning is not None:
+        event_id = system_event.event_id
+        database["resource_warnings"][component_name][event_id] = resource_warning
+
+        # index the triggering event so the warning can be paired in O(1)
+        database["event_index"][event_id] = system_event
+
+    changed = []
+    if component_name in database["system_components"]:
+        changed += ["system_components", "component_events"]
+    if resource_warning is not None or is_resolved:
+        changed.append("resource_warnings")
+    bump_versions(database, changed, component_name)
+
+
+def publish_system_event(
+    system_event: ComponentEvent,
+    database: dict,
+    resource_warning: t.Optional[ResourceWarning] = None,
+) -> None:
+    """Push a system event (and the resource warning it triggered) to the
+    subscribers of the change feed of our db."""
+    component_name = system_event.component_name
+    change_feed = database["feed"]
+
+    # the latest event of a monitored component is already encoded
+    event_json = None
+    if database["latest_events"].get(component_name) is system_event:
+        event_json = database["latest_event_json"][component_name]
+    if event_json is None:
+        event_json = serialise.encode_event(system_event)
+    change_feed.publish(feed.FeedKind.component_event, component_name, event_json)
+
+    if resource_warning is not None:
+        warning_dict = resource_warning.return_custom_warning_dict(system_event)
+        change_feed.publish(
+            feed.FeedKind.resource_warning,
+            component_name,
+            serialise.dumps(warning_dict),
+        )
+
+
+def load_in_memory_db(database: dict) -> None:
+    """Rebuild our db from the records of its persistence backend.
+
+    The state of each component is restored from its latest event, and the
+    retention policy in settings.py is applied as events are replayed.
+    """
+    with database["backend"].transaction(write=False):
+        restore_in_memory_db(database)
+
+
+def restore_in_memory_db(database: dict) -> None:
+    """Replay the records of the persistence backend into our db. See
+    load_in_memory_db."""
+    backend = database["backend"]
+
+    for component in backend.load_components():
+        database["system_components"][component.name] = component
+        index_system_component(
+            component.name,
+            component.total_available_storage,
+            component.storage_limit,
+            component.current_storage_useage,
+            database,
+        )
+
+    # rollups outlive the events the backend keeps, so are restored first
+    for component_rollups in backend.load_rollups():
+        component_name = component_rollups.component_name
+        is_monitored = component_name in database["system_components"]
+        if not is_monitored and not settings.KEEP_HISTORY_OF_DELETED_COMPONENTS:
+            continue
+        database["rollups"][component_name] = component_rollups
+
+    for system_event, resource_warning in backend.load_events():
+        is_monitored = system_event.component_name in database["system_components"]
+        if not is_monitored and not settings.KEEP_HISTORY_OF_DELETED_COMPONENTS:
+            continue
+        store_system_event(system_event, database, resource_warning)
+
+    # new events must follow the replayed ones, whatever the system clock says
+    for event_history in list(database["system_events"].values()):
+        if (latest_event := event_history.latest()) is not None:
+            advance_epoch_ns(latest_event.epoch_ns)
+
+    for component_name, latest_event in database["latest_events"].items():
+        component = database["system_components"][component_name]
+        component.total_available_storage = latest_event.total_available_storage
+        component.storage_limit = latest_event.storage_limit
+        component.current_storage_useage = latest_event.current_storage_useage
+
+
+def clear_in_memory_db(database: dict) -> None:
+    """Empty our db, keeping its persistence backend, dispatcher and locks."""
+    empty_database = create_in_memory_db(database["backend"])
+    for key in (
+        "backend",
+        "notifier",
+        "lock",
+        "component_locks",
+        "snapshot_lock",
+        # versions keep counting, so no ETag is handed out twice
+        "versions",
+        "component_versions",
+        "version_sequence",
+        "version_epoch",
+        # subscribers stay subscribed
+        "feed",
+    ):
+        del empty_database[key]
+
+    database.update(empty_database)
+
+
+def replay_system_event(
+    system_event: ComponentEvent,
+    database: dict,
+    resource_warning: t.Optional[ResourceWarning] = None,
+) -> None:
+    """Store a system event registered by another process, bringing its
+    component up to date. Events no later than the latest event stored for
+    the component are skipped."""
+    component_name = system_event.component_name
+
+    event_history = database["system_events"].get(component_name)
+    latest_event = event_history.latest() if event_history else None
+    if latest_event is not None and latest_event.epoch_ns >= system_event.epoch_ns:
+        return
+
+    # new events must follow the replayed one
+    advance_epoch_ns(system_event.epoch_ns)
+    store_system_event(system_event, database, resource_warning)
+    publish_system_event(system_event, database, resource_warning)
+
+    component = database["system_components"].get(component_name)
+    if component is not None:
+        component.total_available_storage = system_event.total_available_storage
+        component.storage_limit = system_event.storage_limit
+        component.current_storage_useage = system_event.current_storage_useage
+
+
+def snapshot_in_memory_db(database: dict) -> None:
+    """Hand the current state of our db to its persistence backend, so it
+    can compact the writes it has recorded into a snapshot. A snapshot
+    being written in the background is waited for first."""
+    with database["snapshot_lock"]:
+        write_snapshot(database)
+
+
+def snapshot_in_background(database: dict) -> None:
+    """Write a snapshot of our db from a background thread, so the write
+    which made it due does not wait for it. A snapshot requested while
+    another is being written is skipped."""
+    if not database["snapshot_lock"].acquire(blocking=False):
+        return
+
+    def snapshot() -> None:
+        try:
+            write_snapshot(database)
+        finally:
+            database["snapshot_lock"].release()
+
+    threading.Thread(target=snapshot, name="snapshot", daemon=True).start()
+
+
+def write_snapshot(database: dict) -> None:
+    """Write a snapshot of our db, see snapshot_in_memory_db.
+
+    Writes carry on meanwhile. Each component is copied holding only its
+    own lock, so its events, warnings and rollups are copied consistently,
+    and at most one component's writes wait on the snapshot at a time.
+    """
+
+    def all_components() -> t.Iterator[SystemComponent]:
+        yield from list(database["system_components"].values())
+
+    def all_events() -> (
+        t.Iterator[t.Tuple[ComponentEvent, t.Optional[ResourceWarning]]]
+    ):
+        for component_name in list(database["system_events"]):
+            with component_lock(component_name, database):
+                event_history = database["system_events"].get(component_name)
+                if event_history is None:
+                    continue
+                warnings = database["resource_warnings"].get(component_name, {})
+                events = [
+                    (event, warnings.get(event.event_id)) for event in event_history
+                ]
+
+                # the warning of an active incident outlives its event, so the
+                # event is snapshotted ahead of the history to restore it
+                active_warning = database["active_warnings"].get(component_name)
+                if active_warning is not None:
+                    event = database["event_index"][active_warning.component_event_id]
+                    oldest_epoch_ns = event_history.oldest_epoch_ns()
+                    if oldest_epoch_ns is None or event.epoch_ns < oldest_epoch_ns:
+                        events.insert(0, (event, active_warning))
+
+            yield from events
+
+    def all_rollups() -> t.Iterator[rollups.ComponentRollups]:
+        for component_name in list(database["rollups"]):
+            with component_lock(component_name, database):
+                component_rollups = database["rollups"].get(component_name)
+                if component_rollups is not None:
+                    component_rollups = component_rollups.copy()
+            if component_rollups is not None:
+                yield component_rollups
+
+    database["backend"].write_snapshot(all_components(), all_events(), all_rollups())
+
+
+def evict_warnings(component_name: str, database: dict) -> None:
+    """Forget the resource warnings of a component triggered by events which
+    have been evicted from its history.
+
+    Warnings are stored in the order they were raised, so the warnings to
+    evict are those at the front triggered before the oldest retained event.
+    The warning of an active incident is kept however old it is.
+    """
+    warnings = database["resource_warnings"][component_name]
+    event_history = database["system_events"].get(component_name)
+    oldest_epoch_ns = event_history.oldest_epoch_ns() if event_history else None
+    active_warning = database["active_warnings"].get(component_name)
+
+    n_warnings = len(warnings)
+    while warnings:
+        event_id, resource_warning = next(iter(warnings.items()))
+        if resource_warning is active_warning:
+            break
+        event = database["event_index"][event_id]
+        if oldest_epoch_ns is not None and event.epoch_ns >= oldest_epoch_ns:
+            break
+
+        warnings.popitem(last=False)
+        del database["event_index"][event_id]
+
+    if len(warnings) < n_warnings:
+        bump_versions(database, ["resource_warnings"])
+
+
+def prune_expired_events(component_name: str, database: dict) -> None:
+    """Evict the events of a component which are older than the maximum
+    event age set in settings.py"""
+    if settings.MAX_EVENT_AGE_SECONDS is None:
+        return
+
+    # reads prune as well as writes, so the component's lock is taken here
+    with component_lock(component_name, database):
+        event_history = database["system_events"].get(component_name)
+        if not event_history:
+            return
+
+        cutoff_ns = return_epoch_ns() - int(settings.MAX_EVENT_AGE_SECONDS * 1e9)
+
+        if event_history.expire(cutoff_ns):
+            evict_warnings(component_name, database)
+            bump_versions(database, [], component_name)
+
+
+def deregister_system_component(component_name: str, database: dict) -> None:
+    """Stop monitoring a system component. Its events and warnings are kept
+    in our db as a backlog (unless disabled in settings.py), but it is
+    dropped from the latest useages."""
+    forget_system_component(component_name, database)
+    database["backend"].delete_component(component_name)
+
+
+def forget_system_component(component_name: str, database: dict) -> None:
+    """Remove a system component from our db, without recording it in the
+    persistence backend. See deregister_system_component."""
+    # readers of the indexes look the components up while holding the lock
+    with database["lock"]:
+        del database["system_components"][component_name]
+        unindex_system_component(component_name, database)
+    database["latest_events"].pop(component_name, None)
+    database["latest_event_json"].pop(component_name, None)
+    # an unmonitored component can never clear its incident
+    database["active_warnings"].pop(component_name, None)
+    database["rules"].forget(component_name)
+
+    if not settings.KEEP_HISTORY_OF_DELETED_COMPONENTS:
+        for event_id in database["resource_warnings"].pop(component_name, {}):
+            database["event_index"].pop(event_id, None)
+        database["system_events"].pop(component_name, None)
+        database["rollups"].pop(component_name, None)
+        database["forecasts"].pop(component_name, None)
+
+    bump_versions(
+        database,
+        ["system_components", "component_events", "resource_warnings"],
+        component_name,
+    )
+
+
+def list_event_history(
+    component_name: str,
+    database: dict,
+    skip: int = 0,
+    limit: t.Optional[int] = None,
+    since_ns: t.Optional[int] = None,
+    until_ns: t.Optional[int] = None,
+) -> t.List[ComponentEvent]:
+    """Return a single page of the event history of a component, optionally
+    limited to events recorded between since_ns and until_ns (inclusive).
+
+    The time range is found by binary search over the history, and the
+    history only builds the events in the requested page. The component's
+    lock is held meanwhile, so no event is appended or evicted under the
+    positions found.
+    """
+    with component_lock(component_name, database):
+        event_history = database["system_events"].get(component_name)
+        if event_history is None:
+            return []
+
+        start, stop = event_history.find_range(since_ns, until_ns)
+        start += skip
+        if limit is not None:
+            stop = min(stop, start + limit)
+
+        return event_history.page(start, stop) if start < stop else []
+
+
+def list_rollups(
+    component_name: str,
+    database: dict,
+    resolution: rollups.Resolution,
+    since_ns: t.Optional[int] = None,
+    until_ns: t.Optional[int] = None,
+) -> t.List[t.Dict[str, t.Any]]:
+    """Return the rollup buckets of a component at the given resolution,
+    optionally limited to buckets overlapping since_ns to until_ns."""
+    component_rollups = database["rollups"].get(component_name)
+    if component_rollups is None:
+        return []
+
+    return component_rollups.query(resolution, since_ns, until_ns)
+
+
+def list_forecasts(
+    component_names: t.Iterable[str], database: dict
+) -> t.List[t.Dict[str, t.Any]]:
+    """Return the growth forecasts of the given components."""
+    return [
+        database["forecasts"][component_name].to_dict()
+        for component_name in component_names
+        if component_name in database["forecasts"]
+    ]
+
+
+def list_system_components(
+    database: dict,
+    skip: int = 0,
+    limit: t.Optional[int] = None,
+    name_prefix: t.Optional[str] = None,
+    min_utilisation: t.Optional[float] = None,
+    max_utilisation: t.Optional[float] = None,
+    min_storage_limit: t.Optional[int] = None,
+    max_storage_limit: t.Optional[int] = None,
+    has_warning: t.Optional[bool] = None,
+    sort_by: t.Optional[indexes.ComponentSortKey] = None,
+    descending: bool = False,
+) -> t.List[SystemComponent]:
+    """Return a single page of the system components in our db matching
+    every filter given, in order of sort_by. Filters and sorting are
+    answered by the secondary indexes of our db (see ComponentIndexes.query).
+
+    Without filters or a sort key, components are listed in the order they
+    were registered straight from the db.
+    """
+    system_components = database["system_components"]
+    filters = {
+        "name_prefix": name_prefix,
+        "utilisation": (min_utilisation, max_utilisation),
+        "storage_limit": (min_storage_limit, max_storage_limit),
+        "has_warning": has_warning,
+    }
+
+    if sort_by is None and all(
+        value in (None, (None, None)) for value in filters.values()
+    ):
+        return list(paginate(system_components.values(), skip, limit))
+
+    with database["lock"]:
+        component_names = database["indexes"].query(
+            sort_by=sort_by or indexes.ComponentSortKey.created,
+            descending=descending,
+            **filters,
+        )
+        page = list(paginate(component_names, skip, limit))
+
+    return [
+        system_components[component_name]
+        for component_name in page
+        if component_name in system_components
+    ]
+
+
+def list_least_headroom(
+    database: dict,
+    k: int,
+    order_by: indexes.HeadroomOrder = indexes.HeadroomOrder.limit_used,
+) -> t.List[t.Dict[str, t.Any]]:
+    """Return the k components with the least headroom, either the most of
+    their storage limit used or the least free storage, read in order from
+    the index of that value."""
+    free_storage = database["indexes"][indexes.ComponentSortKey.free_storage]
+    limit_used = database["indexes"][indexes.ComponentSortKey.limit_used]
+
+    with database["lock"]:
+        if order_by == indexes.HeadroomOrder.free_storage:
+            component_names = free_storage.first(k)
+        else:
+            component_names = limit_used.last(k)
+
+        return [
+            {
+                **database["system_components"][component_name].dict(),
+                "free_storage": free_storage.value(component_name),
+                "proportion_of_storage_limit_used": limit_used.value(component_name),
+            }
+            for component_name in component_names
+        ]
+
+
+def summarise_fleet(database: dict) -> t.Dict[str, t.Any]:
+    """Return storage statistics across every monitored component."""
+    with database["lock"]:
+        return database["fleet"].summary()
 
 
 def get_system_component(component_name: str, database: dict) -> t.Dict[str, str]:
@@ -76,9 +1083,9 @@ def get_system_component(component_name: str, database: dict) -> t.Dict[str, str
 
 
 def get_all_warnings(
-    system_components: t.List[str], database: dict
-) -> t.List[ResourceWarning]:
-    """Retrieve all resource warnings from our in memory db.
+    system_components: t.Iterable[str], database: dict
+) -> t.Iterator[ResourceWarning]:
+    """Lazily retrieve all resource warnings from our in memory db.
 
     Parameters
     ----------
@@ -87,48 +1094,87 @@ def get_all_warnings(
     database: dict
         an dictionary serving as a database.
 
-    returns: a list of ResourceWarnings for each components.
+    returns: an iterator of ResourceWarnings for each components.
     """
 
-    all_resource_warning_objects = []
+    # copied, as other threads can register components and warnings meanwhile
+    for component in list(system_components):
+        yield from list(database["resource_warnings"].get(component, {}).values())
 
-    for component in system_components:
-        for warning_object in database["resource_warnings"][component]:
-            all_resource_warning_objects.append(warning_object)
 
-    return all_resource_warning_objects
+def get_active_warnings(database: dict) -> t.List[ResourceWarning]:
+    """Retrieve the latest resource warning of each active incident."""
+    return list(database["active_warnings"].values())
 
 
 def list_warning_dicts(
-    warning_objects: t.List[ResourceWarning],
-    system_components: t.List[str],
-    database: dict,
+    warning_objects: t.Iterable[ResourceWarning], database: dict
 ) -> t.List[t.Dict[str, str]]:
-    """Pair each resource warning object to the system component that
+    """Pair each resource warning object to the system event that
     triggered it and return as dict.
 
+    Events which triggered a warning are indexed by their event_id when
+    they are registered, so pairing is a single lookup per warning.
+
     Parameters
     ----------
     warning_objects: list(ResourceWarning)
         a list of ResourceWarnings
-    system_components: list(str)
-        a list of system component names currently being monitored.
     database: dict
         an dictionary serving as a database.
 
     returns: a list of resource warnings in dictionary format.
     """
 
+    event_index = database["event_index"]
     paired_warnings = []
 
     for resource_warning in warning_objects:
-        warning_event_component_id = resource_warning.component_event_id
-        for component in system_components:
-            events_for_component = database["system_events"][component]
-            for event in events_for_component:
-                if warning_event_component_id == event.event_id:
-                    paired_warnings.append(
-                        resource_warning.return_custom_warning_dict(event)
-                    )
+        event = event_index.get(resource_warning.component_event_id)
+        if event is not None:
+            paired_warnings.append(resource_warning.return_custom_warning_dict(event))
 
     return paired_warnings
+
+
+def estimate_memory_usage(database: dict) -> t.Dict[str, int]:
+    """Estimate how much memory our in memory db is using.
+
+    Event sizes are reported by each event history, and warning sizes are
+    estimated from a single sample per component, so the figures are
+    approximate but cheap enough to compute per request.
+
+    returns: record counts and estimated sizes in bytes.
+    """
+    event_count, event_bytes = 0, 0
+    for event_history in list(database["system_events"].values()):
+        event_count += len(event_history)
+        event_bytes += event_history.nbytes()
+
+    warning_count, warning_bytes = 0, 0
+    for warnings in list(database["resource_warnings"].values()):
+        if warnings:
+            sample = next(iter(warnings.values()))
+            warning_count += len(warnings)
+            warning_bytes += len(warnings) * history.deep_sizeof(sample)
+
+    component_bytes = sum(
+        history.deep_sizeof(component)
+        for component in list(database["system_components"].values())
+    )
+
+    rollup_bytes = sum(
+        component_rollups.nbytes()
+        for component_rollups in list(database["rollups"].values())
+    )
+
+    return {
+        "system_components": len(database["system_components"]),
+        "component_events": event_count,
+        "resource_warnings": warning_count,
+        "component_bytes": component_bytes,
+        "event_bytes": event_bytes,
+        "warning_bytes": warning_bytes,
+        "rollup_bytes": rollup_bytes,
+        "total_bytes": component_bytes + event_bytes + warning_bytes + rollup_bytes,
+    }
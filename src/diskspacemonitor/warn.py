@@ -10,6 +10,23 @@ from enum import Enum
 class WarningEnum(str, Enum):
     close_to_memory_limit = "close to memory limit"
     over_memory_limit = "over memory limit"
+    predicted_to_reach_memory_limit = "predicted to reach memory limit"
+
+
+# the severity of each type of warning, see settings.WARNING_CLEAR_MARGIN
+WARNING_SEVERITY = {
+    WarningEnum.predicted_to_reach_memory_limit: 1,
+    WarningEnum.close_to_memory_limit: 2,
+    WarningEnum.over_memory_limit: 3,
+}
+
+
+class WarningState(str, Enum):
+    """Which resource warnings to list: those of the incidents still active,
+    or all those retained, resolved or not."""
+
+    active = "active"
+    all = "all"
 
 
 class OverMemoryLimitError(Exception):
@@ -4,6 +4,10 @@ tests the application API functions.
 
 This file is intentionally incomplete for the sake of time.
 """
+import json
+from csv import DictReader
+
+import pytest
 from fastapi.testclient import TestClient
 
 from diskspacemonitor.main import app
@@ -46,3 +50,288 @@ def test_reject_duplicate_system_component():
     )
 
     assert second_response.status_code == 422
+
+
+def test_useage_history_paginated():
+    client.post(
+        "/v1/system_components",
+        json={"name": "VersioningSystem", "total_available_storage": 200},
+    )
+    for useage in range(1, 6):
+        client.patch(
+            "/v1/system_components/VersioningSystem",
+            json={"current_storage_useage": useage},
+        )
+
+    response = client.get(
+        "/v1/component_events/VersioningSystem/history", params={"skip": 2, "limit": 2}
+    )
+
+    actual = [
+        event["component_snapshot"]["current_storage_useage"]
+        for event in response.json()
+    ]
+    expected = [2, 3]
+
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/v1/system_components",
+        "/v1/component_events",
+        "/v1/component_events/CrashDump/history",
+        "/v1/resource_warnings",
+        "/v1/forecasts",
+    ],
+)
+@pytest.mark.parametrize("params", [{"skip": -1}, {"limit": -1}])
+def test_negative_pagination_rejected(path: str, params: dict):
+    response = client.get(path, params=params)
+
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_least_headroom_rejects_k_below_one(k: int):
+    response = client.get("/v1/system_components:least_headroom", params={"k": k})
+
+    assert response.status_code == 422
+
+
+def test_deleted_component_dropped_from_latest_useages():
+    client.post(
+        "/v1/system_components",
+        json={"name": "BuildDistribution", "total_available_storage": 600},
+    )
+    client.patch(
+        "/v1/system_components/BuildDistribution",
+        json={"current_storage_useage": 120},
+    )
+
+    latest = client.get("/v1/component_events/BuildDistribution").json()
+    assert latest["component_snapshot"]["current_storage_useage"] == 120
+
+    client.delete("/v1/system_components/BuildDistribution")
+
+    response = client.get("/v1/component_events/BuildDistribution")
+    all_latest = client.get("/v1/component_events").json()
+
+    assert response.status_code == 404
+    assert all(
+        event["component_snapshot"]["component_name"] != "BuildDistribution"
+        for event in all_latest
+    )
+
+
+def test_batch_useage_reports():
+    client.post(
+        "/v1/system_components",
+        json={"name": "BatchedStore", "total_available_storage": 100},
+    )
+
+    response = client.post(
+        "/v1/component_events:batch",
+        json=[
+            {"name": "BatchedStore", "current_storage_useage": 20},
+            {"name": "ImaginaryComponent", "current_storage_useage": 20},
+            {"name": "BatchedStore", "storage_limit": 101},
+            {"name": "BatchedStore", "current_storage_useage": 95},
+        ],
+    )
+
+    actual = [
+        (result["status_code"], result.get("warning_type"))
+        for result in response.json()["results"]
+    ]
+    expected = [(200, None), (404, None), (400, None), (200, "close to memory limit")]
+
+    assert response.json()["applied"] == 2
+    assert actual == expected
+
+
+def test_export_useage_history():
+    client.post(
+        "/v1/system_components",
+        json={"name": "ExportedStore", "total_available_storage": 100},
+    )
+    client.patch(
+        "/v1/system_components/ExportedStore", json={"current_storage_useage": 95}
+    )
+
+    ndjson = client.get(
+        "/v1/exports/component_events", params={"component_name": "ExportedStore"}
+    )
+    csv = client.get(
+        "/v1/exports/component_events",
+        params={"component_name": "ExportedStore", "format": "csv"},
+    )
+    warnings = client.get(
+        "/v1/exports/resource_warnings", params={"component_name": "ExportedStore"}
+    )
+
+    events = [json.loads(line) for line in ndjson.text.splitlines()]
+    rows = list(DictReader(csv.text.splitlines()))
+    exported_warnings = [json.loads(line) for line in warnings.text.splitlines()]
+
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert [
+        event["component_snapshot"]["current_storage_useage"] for event in events
+    ] == [0, 95]
+    assert [row["current_storage_useage"] for row in rows] == ["0", "95"]
+    assert [warning["warning_type"] for warning in exported_warnings] == [
+        "close to memory limit"
+    ]
+
+
+def test_useage_rollups():
+    client.post(
+        "/v1/system_components",
+        json={"name": "RolledUpStore", "total_available_storage": 200},
+    )
+    client.patch(
+        "/v1/system_components/RolledUpStore", json={"current_storage_useage": 100}
+    )
+
+    response = client.get(
+        "/v1/component_events/RolledUpStore/rollups", params={"resolution": "day"}
+    )
+    missing = client.get("/v1/component_events/ImaginaryComponent/rollups")
+
+    (bucket,) = response.json()
+
+    assert bucket["event_count"] == 2
+    assert bucket["current_storage_useage"] == {"min": 0, "max": 100, "avg": 50}
+    assert bucket["proportion_of_total_storage_used"]["max"] == 50
+    assert missing.status_code == 404
+
+
+def test_list_system_components_filtered():
+    for name, useage in [("FilteredStore1", 10), ("FilteredStore2", 80)]:
+        client.post(
+            "/v1/system_components",
+            json={"name": name, "total_available_storage": 100},
+        )
+        client.patch(
+            f"/v1/system_components/{name}", json={"current_storage_useage": useage}
+        )
+
+    response = client.get(
+        "/v1/system_components",
+        params={
+            "name_prefix": "FilteredStore",
+            "min_utilisation": 50,
+            "sort_by": "utilisation",
+        },
+    )
+
+    assert [component["name"] for component in response.json()] == ["FilteredStore2"]
+
+
+def test_conditional_get_not_modified_until_component_changes():
+    for name in ["CachedStore", "OtherStore"]:
+        client.post(
+            "/v1/system_components", json={"name": name, "total_available_storage": 100}
+        )
+
+    first = client.get("/v1/system_components/CachedStore")
+    etag = first.headers["ETag"]
+    unchanged = client.get(
+        "/v1/system_components/CachedStore", headers={"If-None-Match": etag}
+    )
+
+    # an update to another component leaves this component's ETag current
+    client.patch("/v1/system_components/OtherStore", json={"current_storage_useage": 5})
+    still_unchanged = client.get(
+        "/v1/system_components/CachedStore", headers={"If-None-Match": etag}
+    )
+
+    client.patch(
+        "/v1/system_components/CachedStore", json={"current_storage_useage": 5}
+    )
+    changed = client.get(
+        "/v1/system_components/CachedStore", headers={"If-None-Match": etag}
+    )
+
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert still_unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json()["current_storage_useage"] == 5
+    assert changed.headers["ETag"] != etag
+
+
+def test_rejected_update_changes_nothing():
+    client.post(
+        "/v1/system_components",
+        json={"name": "RejectedStore", "total_available_storage": 100},
+    )
+    before = client.get("/v1/system_components/RejectedStore")
+
+    response = client.patch(
+        "/v1/system_components/RejectedStore",
+        json={"total_available_storage": 500, "storage_limit": 150},
+    )
+    after = client.get(
+        "/v1/system_components/RejectedStore",
+        headers={"If-None-Match": before.headers["ETag"]},
+    )
+
+    assert response.status_code == 400
+    assert after.status_code == 304
+    assert client.get("/v1/system_components/RejectedStore").json() == before.json()
+
+
+def test_conditional_get_of_collections():
+    urls = ["/v1/system_components", "/v1/component_events", "/v1/resource_warnings"]
+    etags = {url: client.get(url).headers["ETag"] for url in urls}
+
+    unchanged = {
+        url: client.get(url, headers={"If-None-Match": etag}).status_code
+        for url, etag in etags.items()
+    }
+
+    client.post(
+        "/v1/system_components",
+        json={"name": "NewCollectionStore", "total_available_storage": 100},
+    )
+    client.patch(
+        "/v1/system_components/NewCollectionStore",
+        json={"current_storage_useage": 100},
+    )
+    changed = {
+        url: client.get(url, headers={"If-None-Match": etag}).status_code
+        for url, etag in etags.items()
+    }
+
+    assert unchanged == {url: 304 for url in urls}
+    assert changed == {url: 200 for url in urls}
+
+
+def test_list_active_resource_warnings():
+    client.post(
+        "/v1/system_components",
+        json={"name": "HoveringStore", "total_available_storage": 100},
+    )
+    for useage in [95, 99, 80, 101, 99]:
+        client.patch(
+            "/v1/system_components/HoveringStore",
+            json={"current_storage_useage": useage},
+        )
+
+    def warning_types(state: str) -> list:
+        warnings = client.get(
+            "/v1/resource_warnings", params={"state": state, "limit": None}
+        ).json()
+        snapshots = [
+            warning["component_event"]["component_snapshot"] for warning in warnings
+        ]
+        return [
+            warning["warning_type"]
+            for warning, snapshot in zip(warnings, snapshots)
+            if snapshot["name"] == "HoveringStore"
+        ]
+
+    assert warning_types("active") == ["over memory limit"]
+    assert warning_types("all") == ["close to memory limit", "over memory limit"]
@@ -0,0 +1,198 @@
+"""test_feed.py
+
+Tests that the change feed pushes the events and warnings registered in
+our db to its subscribers, filtered, in order and without loss, and that
+subscribers can resume after the last record they received.
+"""
+import asyncio
+import json
+import typing as t
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.feed import ChangeFeed
+from diskspacemonitor.feed import FeedKind
+from diskspacemonitor.main import app
+from diskspacemonitor.main import in_memory_db
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+
+def publish(change_feed: ChangeFeed, component_names: t.List[str]) -> None:
+    for name in component_names:
+        change_feed.publish(FeedKind.component_event, name, b"{}")
+
+
+def parse_events(body: bytes) -> t.List[t.Dict[str, str]]:
+    """Parse a Server-Sent Events stream, skipping comments."""
+    events = []
+    for message in body.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in message.splitlines() if line[:1] != ":"
+        )
+        if fields:
+            events.append(fields)
+
+    return events
+
+
+def test_records_filtered_and_numbered() -> bool:
+    async def subscribe_and_publish() -> list:
+        change_feed = ChangeFeed(buffer_size=10, queue_size=10)
+        subscription = change_feed.subscribe(
+            asyncio.get_running_loop(), ["CrashDumpStore"]
+        )
+        publish(change_feed, ["CrashDumpStore", "Logs", "CrashDumpStore"])
+
+        return change_feed.take(subscription)
+
+    records, missed = asyncio.run(subscribe_and_publish())
+
+    assert missed is None
+    assert [record.sequence for record in records] == [1, 3]
+
+
+def test_slow_subscriber_catches_up_from_buffer() -> bool:
+    async def subscribe_and_publish() -> t.Tuple[list, list]:
+        change_feed = ChangeFeed(buffer_size=10, queue_size=2)
+        slow = change_feed.subscribe(asyncio.get_running_loop())
+        slower = change_feed.subscribe(asyncio.get_running_loop())
+        publish(change_feed, ["Logs"] * 5)
+
+        # the queue is sent first, then the rest is read from the ring buffer
+        batches = [change_feed.take(slow) for _ in range(4)]
+
+        publish(change_feed, ["Logs"] * 10)
+        slower_batches = [change_feed.take(slower) for _ in range(2)]
+
+        return batches, slower_batches
+
+    batches, slower_batches = asyncio.run(subscribe_and_publish())
+    sequences = [[record.sequence for record in records] for records, _ in batches]
+
+    assert sequences == [[1, 2], [3, 4], [5], []]
+    assert all(missed is None for _, missed in batches)
+
+    # records 3 to 5 were evicted from the ring buffer before they were read
+    (queued, missed), (caught_up, missed_after) = slower_batches
+    assert [record.sequence for record in queued] == [1, 2]
+    assert missed_after == 5
+    assert [record.sequence for record in caught_up] == [6, 7]
+
+
+def test_resume_after_event_id() -> bool:
+    async def resume() -> t.Tuple[list, list]:
+        change_feed = ChangeFeed(buffer_size=10, queue_size=10)
+        publish(change_feed, ["Logs"] * 4)
+
+        loop = asyncio.get_running_loop()
+        resumed = change_feed.subscribe(loop, after=change_feed.event_id(2))
+        unknown = change_feed.subscribe(loop, after="0badcafe-2")
+        publish(change_feed, ["Logs"])
+
+        return change_feed.take(resumed), change_feed.take(unknown)
+
+    (resumed, resumed_missed), (unknown, unknown_missed) = asyncio.run(resume())
+
+    assert resumed_missed is None
+    assert [record.sequence for record in resumed] == [3, 4, 5]
+    # an id from another process cannot be resumed from, so a reset is sent
+    assert unknown_missed == 4
+    assert [record.sequence for record in unknown] == [5]
+
+
+def test_stream_pushes_registered_events_and_warnings(
+    crash_dump_50: SystemComponent,
+) -> bool:
+    database = api_utils.create_in_memory_db()
+    api_utils.create_system_component(crash_dump_50, database)
+    change_feed = database["feed"]
+
+    async def stream_report() -> bytes:
+        loop = asyncio.get_running_loop()
+        subscription = change_feed.subscribe(loop, ["CrashDumpStore"])
+        stream = change_feed.stream(subscription, idle_seconds=5)
+
+        # useage is reported from another thread, as by a sync endpoint
+        usage_report = SystemComponentUpdate(
+            name="CrashDumpStore", current_storage_useage=120
+        )
+        await loop.run_in_executor(
+            None, api_utils.apply_usage_report, usage_report, database
+        )
+        body = await stream.__anext__()
+        await stream.aclose()
+
+        return body
+
+    events = parse_events(asyncio.run(stream_report()))
+    component_event, resource_warning = (json.loads(e["data"]) for e in events)
+    latest_event = database["latest_events"]["CrashDumpStore"]
+
+    assert [event["event"] for event in events] == [
+        "component_event",
+        "resource_warning",
+    ]
+    # the first event was registered as the component was created
+    assert events[1]["id"] == change_feed.event_id(3)
+    assert component_event == latest_event.return_custom_event_dict()
+    assert resource_warning["component_event"]["event_id"] == latest_event.event_id
+    assert len(change_feed) == 0
+
+
+def test_change_feed_endpoint(crash_dump_50: SystemComponent) -> bool:
+    api_utils.create_system_component(crash_dump_50, in_memory_db)
+    change_feed = in_memory_db["feed"]
+    resume_from = change_feed.event_id(change_feed._sequence)
+
+    usage_report = SystemComponentUpdate(
+        name="CrashDumpStore", current_storage_useage=60
+    )
+    api_utils.apply_usage_report(usage_report, in_memory_db)
+
+    async def get_change_feed() -> t.Tuple[int, bytes]:
+        received = asyncio.Event()
+        response = {"body": b""}
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/v1/change_feed",
+            "raw_path": b"/v1/change_feed",
+            "root_path": "",
+            "query_string": b"component_name=CrashDumpStore&kind=component_event",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"last-event-id", resume_from.encode()),
+            ],
+            "server": ("localhost", 80),
+            "client": ("localhost", 50000),
+        }
+
+        async def receive() -> t.Dict[str, t.Any]:
+            # the client disconnects once the first records are received
+            await received.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: t.Dict[str, t.Any]) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message.get("body"):
+                response["body"] += message["body"]
+                received.set()
+
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+        return response["status"], response["body"]
+
+    status, body = asyncio.run(get_change_feed())
+    events = parse_events(body)
+    snapshot = json.loads(events[0]["data"])["component_snapshot"]
+
+    assert status == 200
+    assert [event["event"] for event in events] == ["component_event"]
+    assert snapshot["current_storage_useage"] == 60
+    assert len(change_feed) == 0
+
+    api_utils.delete_system_component("CrashDumpStore", in_memory_db)
@@ -0,0 +1,67 @@
+"""test_fleet.py
+
+Tests the column snapshot of the fleet and the statistics computed over it.
+"""
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.fleet import FleetColumns
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+
+def test_summary_matches_component_rules() -> bool:
+    fleet = FleetColumns(capacity=2)
+    fleet.update("Healthy", 100, 90, 20)
+    fleet.update("CloseToLimit", 100, 90, 85)
+    fleet.update("OverLimit", 200, 50, 150)
+    fleet.update("Empty", 0, 100, 0)
+
+    summary = fleet.summary()
+
+    assert summary["system_components"] == 4
+    assert summary["total_available_storage"] == 400
+    assert summary["current_storage_useage"] == 255
+    assert summary["free_storage"] == 145
+    assert summary["proportion_of_total_storage_used"]["max"] == 85
+    assert summary["over_storage_limit"] == 1
+    # a component without storage is always at its limit
+    assert summary["close_to_storage_limit"] == 2
+
+
+def test_removed_rows_are_refilled() -> bool:
+    fleet = FleetColumns()
+    for name, useage in [("A", 10), ("B", 20), ("C", 30)]:
+        fleet.update(name, 100, 100, useage)
+
+    fleet.remove("A")
+    fleet.update("B", 100, 100, 25)
+
+    assert len(fleet) == 2
+    assert "A" not in fleet
+    assert fleet.summary()["current_storage_useage"] == 55
+
+
+def test_empty_fleet_summary() -> bool:
+    summary = FleetColumns().summary()
+
+    assert summary["system_components"] == 0
+    assert summary["proportion_of_total_storage_used"]["p99"] == 0.0
+
+
+def test_fleet_follows_component_updates() -> bool:
+    database = api_utils.create_in_memory_db()
+    for name in ["BuildSystem", "CrashDumpStore"]:
+        component = SystemComponent(name=name, total_available_storage=100)
+        api_utils.register_system_component(component, database)
+        api_utils.register_system_event(component, database)
+
+    api_utils.apply_usage_reports(
+        [SystemComponentUpdate(name="BuildSystem", current_storage_useage=95)],
+        database,
+    )
+    api_utils.deregister_system_component("CrashDumpStore", database)
+
+    summary = api_utils.summarise_fleet(database)
+
+    assert summary["system_components"] == 1
+    assert summary["current_storage_useage"] == 95
+    assert summary["close_to_storage_limit"] == 1
@@ -0,0 +1,80 @@
+"""test_forecast.py
+
+Tests the growth forecasts of component storage useage.
+"""
+import pytest
+
+import diskspacemonitor.settings as settings
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.forecast import GrowthForecast
+from diskspacemonitor.models.component_event import ComponentEvent
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.warn import WarningEnum
+
+
+def make_event(epoch_s: int, useage: int) -> ComponentEvent:
+    return ComponentEvent(
+        event_id=api_utils.return_uuid(),
+        timestamp=api_utils.return_timestamp(epoch_s * 10**9),
+        epoch_ns=epoch_s * 10**9,
+        component_name="BuildSystem",
+        total_available_storage=1000,
+        storage_limit=50,
+        current_storage_useage=useage,
+    )
+
+
+def test_recent_growth_outweighs_old_growth() -> bool:
+    growth_forecast = GrowthForecast("BuildSystem", half_life_seconds=600)
+    # flat for an hour, then growing 1G per minute for an hour
+    for minute in range(60):
+        growth_forecast.observe(make_event(minute * 60, 100))
+    for minute in range(60, 120):
+        growth_forecast.observe(make_event(minute * 60, 100 + minute - 60))
+
+    assert growth_forecast.growth_rate == pytest.approx(1 / 60, rel=0.1)
+    assert growth_forecast.to_dict()["storage_limit_in_gigabits"] == 500
+
+
+def test_exact_line_is_recovered() -> bool:
+    growth_forecast = GrowthForecast("BuildSystem", half_life_seconds=600)
+    for minute in range(30):
+        growth_forecast.observe(make_event(minute * 60, 100 + 2 * minute))
+
+    # 2G per minute with 500 - 158 = 342G to go
+    assert growth_forecast.growth_rate == pytest.approx(2 / 60)
+    assert growth_forecast.seconds_until_limit == pytest.approx(342 * 30)
+
+
+def test_no_forecast_without_growth() -> bool:
+    growth_forecast = GrowthForecast("BuildSystem", half_life_seconds=3600)
+    growth_forecast.observe(make_event(0, 300))
+    assert growth_forecast.growth_rate is None
+
+    for minute in range(1, 5):
+        growth_forecast.observe(make_event(minute * 60, 300 - minute))
+
+    assert growth_forecast.seconds_until_limit is None
+    assert growth_forecast.to_dict()["predicted_limit_timestamp"] is None
+
+
+def test_predicted_warning_registered(monkeypatch: pytest.MonkeyPatch) -> bool:
+    monkeypatch.setattr(settings, "FORECAST_WARNING_HORIZON_SECONDS", 6.5 * 3600)
+    database = api_utils.create_in_memory_db()
+    component = SystemComponent(name="BuildSystem", total_available_storage=1000)
+    api_utils.register_system_component(component, database)
+
+    results = []
+    for hour in range(4):
+        monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: hour * 3600 * 10**9)
+        usage_report = SystemComponentUpdate(
+            name="BuildSystem", current_storage_useage=100 + 100 * hour
+        )
+        results += api_utils.apply_usage_reports([usage_report], database)
+
+    # growing 100G an hour, the limit is 6 hours away at the last report
+    actual = [result["warning_type"] for result in results]
+    expected = [None, None, None, WarningEnum.predicted_to_reach_memory_limit]
+
+    assert actual == expected
@@ -0,0 +1,130 @@
+"""test_history.py
+
+Tests the event history storage engines. Every test is run against both
+the reference EventHistory and the ColumnarEventHistory, which must
+behave identically.
+"""
+import typing as t
+
+import pytest
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.history import ColumnarEventHistory
+from diskspacemonitor.history import EventHistory
+from diskspacemonitor.models.component_event import ComponentEvent
+
+EVENT_STORES = [EventHistory, ColumnarEventHistory]
+
+
+def make_event(epoch_s: int, useage: int) -> ComponentEvent:
+    epoch_ns = epoch_s * 10**9
+
+    return ComponentEvent(
+        event_id=api_utils.return_uuid(),
+        timestamp=api_utils.return_timestamp(epoch_ns),
+        epoch_ns=epoch_ns,
+        component_name="CrashDumpStore",
+        total_available_storage=400,
+        storage_limit=90,
+        current_storage_useage=useage,
+    )
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+def test_events_round_trip(event_store: t.Type) -> bool:
+    event_history = event_store("CrashDumpStore")
+    events = [make_event(epoch_s, epoch_s * 10) for epoch_s in range(5)]
+    for event in events:
+        event_history.append(event)
+
+    assert list(event_history) == events
+    assert event_history[-1] == events[-1]
+    assert event_history.latest() == events[-1]
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+def test_full_history_evicts_oldest(event_store: t.Type) -> bool:
+    event_history = event_store("CrashDumpStore", maxlen=3)
+    events = [make_event(epoch_s, 1) for epoch_s in range(10)]
+
+    evicted = sum(event_history.append(event) for event in events)
+
+    assert evicted == 7
+    assert list(event_history) == events[7:]
+    assert event_history.oldest_epoch_ns() == events[7].epoch_ns
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+def test_iter_range_filters_by_time(event_store: t.Type) -> bool:
+    event_history = event_store("CrashDumpStore", maxlen=8)
+    events = [make_event(epoch_s, 1) for epoch_s in range(10)]
+    for event in events:
+        event_history.append(event)
+
+    since_ns, until_ns = events[4].epoch_ns, events[6].epoch_ns
+
+    assert list(event_history.iter_range()) == events[2:]
+    assert list(event_history.iter_range(since_ns, until_ns)) == events[4:7]
+    assert list(event_history.iter_range(until_ns=until_ns)) == events[2:7]
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+def test_expire_evicts_older_events(event_store: t.Type) -> bool:
+    event_history = event_store("CrashDumpStore")
+    events = [make_event(epoch_s, 1) for epoch_s in range(10)]
+    for event in events:
+        event_history.append(event)
+
+    evicted = event_history.expire(cutoff_ns=4 * 10**9)
+
+    assert evicted == 4
+    assert list(event_history) == events[4:]
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+@pytest.mark.parametrize("start,stop", [(0, 3), (2, 5), (8, 100), (4, None)])
+def test_page(event_store: t.Type, start: int, stop: t.Optional[int]) -> bool:
+    event_history = event_store("CrashDumpStore")
+    events = [make_event(epoch_s, 1) for epoch_s in range(10)]
+    for event in events:
+        event_history.append(event)
+
+    assert event_history.page(start, stop) == events[start:stop]
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+@pytest.mark.parametrize("start,stop", [(-2, 1), (-5, -1), (5, 100), (9, 12)])
+def test_page_clamped_to_history(
+    event_store: t.Type, start: int, stop: t.Optional[int]
+) -> bool:
+    event_history = event_store("CrashDumpStore")
+    events = [make_event(epoch_s, 1) for epoch_s in range(10)]
+    for event in events:
+        event_history.append(event)
+    # evicted events must not be paged back in
+    event_history.expire(cutoff_ns=3 * 10**9)
+    live_events = events[3:]
+
+    expected = live_events[max(start, 0) : max(stop, 0)]
+    assert event_history.page(start, stop) == expected
+
+
+@pytest.mark.parametrize("event_store", EVENT_STORES)
+def test_storage_figures_round_trip(event_store: t.Type) -> bool:
+    event_history = event_store("CrashDumpStore")
+    # storage limits are not validated, so need not fit in a byte
+    event = make_event(0, 1).copy(update={"storage_limit": 300})
+    event_history.append(event)
+
+    assert list(event_history) == [event]
+
+
+def test_columnar_history_is_compact() -> bool:
+    dict_history = EventHistory("CrashDumpStore")
+    columnar_history = ColumnarEventHistory("CrashDumpStore")
+    for epoch_s in range(1_000):
+        event = make_event(epoch_s, epoch_s)
+        dict_history.append(event)
+        columnar_history.append(event)
+
+    assert columnar_history.nbytes() * 10 < dict_history.nbytes()
@@ -0,0 +1,132 @@
+"""test_indexes.py
+
+Tests the secondary indexes over system components.
+"""
+import random
+
+import pytest
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.indexes import ComponentSortKey
+from diskspacemonitor.indexes import HeadroomOrder
+from diskspacemonitor.indexes import SortedIndex
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+
+def test_sorted_index_orders_keys_by_value() -> bool:
+    sorted_index = SortedIndex()
+    for key, value in [("A", 30), ("B", 10), ("C", 20), ("D", 40)]:
+        sorted_index.update(key, value)
+
+    sorted_index.update("D", 5)
+    sorted_index.remove("C")
+
+    assert len(sorted_index) == 3
+    assert sorted_index.first(2) == ["D", "B"]
+    assert sorted_index.last(2) == ["A", "B"]
+    assert sorted_index.last(10) == ["A", "B", "D"]
+
+
+def test_least_headroom_follows_updates() -> bool:
+    database = api_utils.create_in_memory_db()
+    for name, total in [("BuildSystem", 100), ("CrashDumpStore", 400)]:
+        component = SystemComponent(name=name, total_available_storage=total)
+        api_utils.register_system_component(component, database)
+        api_utils.register_system_event(component, database)
+
+    api_utils.apply_usage_reports(
+        [
+            SystemComponentUpdate(name="BuildSystem", current_storage_useage=50),
+            SystemComponentUpdate(name="CrashDumpStore", current_storage_useage=300),
+        ],
+        database,
+    )
+
+    by_limit_used = api_utils.list_least_headroom(database, 1)
+    by_free_storage = api_utils.list_least_headroom(
+        database, 2, HeadroomOrder.free_storage
+    )
+
+    assert by_limit_used[0]["name"] == "CrashDumpStore"
+    assert by_limit_used[0]["proportion_of_storage_limit_used"] == 75
+    assert [component["free_storage"] for component in by_free_storage] == [50, 100]
+
+    api_utils.deregister_system_component("CrashDumpStore", database)
+
+    assert [c["name"] for c in api_utils.list_least_headroom(database, 5)] == [
+        "BuildSystem"
+    ]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {},
+        {"name_prefix": "Build"},
+        {"min_utilisation": 40, "max_utilisation": 60},
+        {"min_storage_limit": 95, "sort_by": ComponentSortKey.utilisation},
+        {"has_warning": True, "sort_by": ComponentSortKey.free_storage},
+        {"has_warning": False, "name_prefix": "Crash", "descending": True},
+        {"max_utilisation": 10, "sort_by": ComponentSortKey.name, "skip": 2},
+    ],
+)
+def test_list_system_components_matches_a_scan(query: dict) -> bool:
+    random.seed(4)
+    database = api_utils.create_in_memory_db()
+    for i in range(200):
+        name = random.choice(["BuildSystem", "CrashDumpStore", "Versioning"])
+        component = SystemComponent(
+            name=f"{name}{i}",
+            total_available_storage=100,
+            storage_limit=random.randint(80, 100),
+        )
+        api_utils.register_system_component(component, database)
+        api_utils.register_system_event(component, database)
+        api_utils.apply_usage_reports(
+            [
+                SystemComponentUpdate(
+                    name=component.name, current_storage_useage=random.randint(1, 99)
+                )
+            ],
+            database,
+        )
+
+    def scanned_matches(component: SystemComponent) -> bool:
+        utilisation = component.proportion_of_total_storage_used
+        warned = component.name in database["indexes"].warned
+        return all(
+            [
+                component.name.startswith(query.get("name_prefix", "")),
+                query.get("min_utilisation", 0) <= utilisation,
+                utilisation <= query.get("max_utilisation", 100),
+                query.get("min_storage_limit", 0) <= component.storage_limit,
+                query.get("has_warning", warned) == warned,
+            ]
+        )
+
+    registered = list(database["system_components"])
+    sort_values = {
+        ComponentSortKey.name: lambda component: component.name,
+        ComponentSortKey.utilisation: lambda component: (
+            component.proportion_of_total_storage_used
+        ),
+        ComponentSortKey.free_storage: lambda component: component.free_storage,
+    }
+    sort_value = sort_values.get(
+        query.get("sort_by"), lambda component: registered.index(component.name)
+    )
+
+    scanned = sorted(
+        filter(scanned_matches, database["system_components"].values()),
+        key=lambda component: (sort_value(component), component.name),
+        reverse=query.get("descending", False),
+    )
+    skip = query.pop("skip", 0)
+
+    actual = api_utils.list_system_components(database, skip, 20, **query)
+    expected = scanned[skip : skip + 20]
+
+    assert [component.name for component in actual] == [
+        component.name for component in expected
+    ]
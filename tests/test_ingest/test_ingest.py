@@ -0,0 +1,63 @@
+"""test_ingest.py
+
+Tests the ingestion of newline-delimited JSON useage report streams.
+"""
+import asyncio
+import typing as t
+
+from fastapi.testclient import TestClient
+
+from diskspacemonitor.ingest import iter_ndjson_lines
+from diskspacemonitor.main import app
+
+client = TestClient(app)
+
+
+async def as_stream(chunks: t.List[bytes]) -> t.AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+def split_lines(chunks: t.List[bytes], max_line_bytes: int) -> list:
+    async def collect() -> list:
+        return [
+            line async for line in iter_ndjson_lines(as_stream(chunks), max_line_bytes)
+        ]
+
+    return asyncio.run(collect())
+
+
+def test_lines_split_across_chunks() -> bool:
+    actual = split_lines([b'{"a": ', b"1}\n\n{", b'"b": 2}\n{"c"', b": 3}"], 100)
+    expected = [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+    assert actual == expected
+
+
+def test_oversized_lines_discarded() -> bool:
+    actual = split_lines([b"x" * 6, b"x" * 6, b"\nshort\n", b"y" * 20], 10)
+    expected = [None, b"short", None]
+
+    assert actual == expected
+
+
+def test_stream_useage_reports() -> bool:
+    client.post(
+        "/v1/system_components",
+        json={"name": "StreamedStore", "total_available_storage": 100},
+    )
+    body = b"\n".join(
+        [
+            b'{"name": "StreamedStore", "current_storage_useage": 10}',
+            b'{"name": "StreamedStore", "current_storage_useage": 200}',
+            b"not json",
+            b'{"name": "ImaginaryComponent", "current_storage_useage": 10}',
+        ]
+    )
+
+    summary = client.post("/v1/component_events:stream", data=body).json()
+
+    assert summary["lines"] == 4
+    assert summary["applied"] == 2
+    assert summary["warnings"] == {"over memory limit": 1}
+    assert [error["line"] for error in summary["errors"]] == [3, 4]
@@ -0,0 +1,154 @@
+"""test_notify.py
+
+Tests that resource warnings are delivered to webhooks in batches, with
+repeats coalesced and failed batches retried, against a local HTTP server
+standing in for the webhook.
+"""
+import http.server
+import json
+import threading
+import time
+import typing as t
+
+import pytest
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.notify import WarningDispatcher
+from diskspacemonitor.notify import Webhook
+
+
+class WebhookStandIn(http.server.ThreadingHTTPServer):
+    """Records the batches POSTed to it, answering the first failures
+    requests with a 503, and every request after a delay of delay seconds."""
+
+    def __init__(self, failures: int = 0, delay: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), WebhookHandler)
+        self.failures = failures
+        self.delay = delay
+        self.requests = 0
+        self.batches = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.server.delay)
+
+        self.server.requests += 1
+        if self.server.requests <= self.server.failures:
+            self.send_response(503)
+        else:
+            self.server.batches.append(json.loads(body))
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args: t.Any) -> None:
+        pass
+
+
+@pytest.fixture()
+def start_stand_in() -> t.Iterator[t.Callable[..., WebhookStandIn]]:
+    servers = []
+
+    def start(failures: int = 0, delay: float = 0.0) -> WebhookStandIn:
+        server = WebhookStandIn(failures, delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def warning_dict(component_name: str, warning_type: str) -> t.Dict[str, t.Any]:
+    return {"component": component_name, "warning_type": warning_type}
+
+
+def test_repeats_coalesced_into_one_batch(start_stand_in: t.Callable) -> bool:
+    stand_in = start_stand_in()
+    webhook = Webhook(stand_in.url, batch_size=10, flush_interval=0.2)
+
+    for _ in range(5):
+        for name in ["CrashDumpStore", "Logs"]:
+            webhook.submit(name, "over memory limit", warning_dict(name, "over"))
+    webhook.submit("Logs", "close to memory limit", warning_dict("Logs", "close"))
+
+    assert webhook.flush(timeout=5)
+    assert stand_in.batches == [
+        [
+            warning_dict("CrashDumpStore", "over"),
+            warning_dict("Logs", "over"),
+            warning_dict("Logs", "close"),
+        ]
+    ]
+    assert webhook.stats()["delivered"] == 3
+    assert webhook.stats()["coalesced"] == 8
+
+    webhook.close()
+
+
+def test_failed_batches_retried(start_stand_in: t.Callable) -> bool:
+    stand_in = start_stand_in(failures=2)
+    webhook = Webhook(stand_in.url, batch_size=2, retry_backoff=0.01)
+
+    for name in ["A", "B", "C"]:
+        webhook.submit(name, "over memory limit", warning_dict(name, "over"))
+
+    assert webhook.flush(timeout=5)
+    assert stand_in.requests == 4
+    assert stand_in.batches == [
+        [warning_dict("A", "over"), warning_dict("B", "over")],
+        [warning_dict("C", "over")],
+    ]
+
+    # a batch still failing after every retry is dropped
+    unreachable = Webhook(
+        "http://127.0.0.1:9/hook", max_retries=2, retry_backoff=0.01, timeout=1
+    )
+    unreachable.submit("A", "over memory limit", warning_dict("A", "over"))
+
+    assert unreachable.flush(timeout=5)
+    assert unreachable.stats()["failed"] == 1
+
+    webhook.close()
+    unreachable.close()
+
+
+def test_warnings_dispatched_without_blocking(
+    crash_dump_50: SystemComponent, start_stand_in: t.Callable
+) -> bool:
+    stand_in = start_stand_in(delay=0.5)
+    notifier = WarningDispatcher([stand_in.url], flush_interval=0.01)
+    database = api_utils.create_in_memory_db(notifier=notifier)
+    api_utils.create_system_component(crash_dump_50, database)
+
+    start = time.perf_counter()
+    # the incident is resolved, and opened again within the coalescing window
+    for useage in [120, 130, 60, 120]:
+        usage_report = SystemComponentUpdate(
+            name="CrashDumpStore", current_storage_useage=useage
+        )
+        api_utils.apply_usage_report(usage_report, database)
+    elapsed = time.perf_counter() - start
+
+    assert notifier.flush(timeout=5)
+    (batch,) = stand_in.batches
+    first_warning = api_utils.list_warning_dicts(
+        api_utils.get_all_warnings(["CrashDumpStore"], database), database
+    )[0]
+
+    # the webhook answers slowly, but the useage reports never wait for it
+    assert elapsed < stand_in.delay
+    assert batch == [json.loads(json.dumps(first_warning))]
+    assert notifier.stats()[0]["coalesced"] == 1
+
+    notifier.close()
@@ -0,0 +1,84 @@
+"""test_rollups.py
+
+Tests the downsampled rollups of component useage histories.
+"""
+import pytest
+
+import diskspacemonitor.settings as settings
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.rollups import Resolution
+from diskspacemonitor.rollups import RollupSeries
+
+
+def test_series_folds_points_into_buckets() -> bool:
+    rollup_series = RollupSeries(bucket_seconds=60, max_buckets=None)
+    for epoch_s, useage in [(0, 10), (30, 30), (59, 20), (60, 50)]:
+        rollup_series.add(epoch_s * 10**9, useage, useage / 2)
+
+    first, second = rollup_series.query()
+
+    assert len(rollup_series) == 2
+    assert first["event_count"] == 3
+    assert first["current_storage_useage"] == {"min": 10, "max": 30, "avg": 20}
+    assert first["proportion_of_total_storage_used"]["max"] == 15
+    assert second["current_storage_useage"] == {"min": 50, "max": 50, "avg": 50}
+
+
+def test_series_evicts_oldest_buckets() -> bool:
+    rollup_series = RollupSeries(bucket_seconds=60, max_buckets=3)
+    for minute in range(5):
+        rollup_series.add(minute * 60 * 10**9, minute, 0.0)
+
+    actual = [
+        bucket["current_storage_useage"]["min"] for bucket in rollup_series.query()
+    ]
+
+    assert actual == [2, 3, 4]
+
+
+def test_series_unpacks_packed_buckets() -> bool:
+    rollup_series = RollupSeries(bucket_seconds=60, max_buckets=None)
+    for minute in range(5):
+        rollup_series.add(minute * 60 * 10**9, minute, minute / 3)
+    restored = RollupSeries(bucket_seconds=60, max_buckets=3)
+
+    restored.unpack(rollup_series.pack())
+
+    assert len(rollup_series.pack()) == 5 * RollupSeries.BUCKET_SIZE
+    assert restored.query() == rollup_series.query()[2:]
+
+
+def test_series_query_returns_overlapping_buckets() -> bool:
+    rollup_series = RollupSeries(bucket_seconds=60, max_buckets=None)
+    for minute in range(10):
+        rollup_series.add(minute * 60 * 10**9, minute, 0.0)
+
+    # 150s falls in the bucket starting at 120s
+    buckets = rollup_series.query(since_ns=150 * 10**9, until_ns=300 * 10**9)
+
+    assert [bucket["current_storage_useage"]["min"] for bucket in buckets] == [
+        2,
+        3,
+        4,
+        5,
+    ]
+
+
+def test_registered_events_are_rolled_up(
+    monkeypatch: pytest.MonkeyPatch, crash_dump_50: SystemComponent
+) -> bool:
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 2)
+    database = api_utils.create_in_memory_db()
+    for hour in range(3):
+        monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: hour * 3600 * 10**9)
+        api_utils.register_system_event(crash_dump_50, database)
+
+    hours = api_utils.list_rollups("CrashDumpStore", database, Resolution.hour)
+    days = api_utils.list_rollups("CrashDumpStore", database, Resolution.day)
+
+    # rollups outlive the events evicted from the history
+    assert len(database["system_events"]["CrashDumpStore"]) == 2
+    assert len(hours) == 3
+    assert days[0]["event_count"] == 3
+    assert days[0]["proportion_of_total_storage_used"]["avg"] == 50
@@ -0,0 +1,141 @@
+"""test_rules.py
+
+Tests that warning rules are compiled into the evaluation plan of each
+component by scope, and that the plans decide the warnings registered.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import diskspacemonitor.settings as settings
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor import warn
+from diskspacemonitor.main import app
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.rules import compile_plan
+from diskspacemonitor.rules import RuleEngine
+from diskspacemonitor.warn import WarningEnum
+
+client = TestClient(app)
+
+RULES = [
+    {"components": "*", "kind": "percentage", "threshold": 90},
+    {"components": "build-*", "kind": "percentage", "threshold": 80},
+    {"components": "build-*", "kind": "percentage", "threshold": 70},
+    {"components": "build-cache", "kind": "percentage", "threshold": 95},
+    {"components": "CrashDumpStore", "kind": "absolute", "threshold": 2},
+    {"components": "build-?", "kind": "growth_rate", "threshold": 5},
+]
+
+
+@pytest.mark.parametrize(
+    "component_name,expected",
+    [
+        ("Logs", {"absolute": 10, "percentage": 90, "growth_rate": None}),
+        ("build-logs", {"absolute": 10, "percentage": 70, "growth_rate": None}),
+        ("build-cache", {"absolute": 10, "percentage": 95, "growth_rate": None}),
+        ("build-1", {"absolute": 10, "percentage": 70, "growth_rate": 5}),
+        ("CrashDumpStore", {"absolute": 2, "percentage": 90, "growth_rate": None}),
+    ],
+)
+def test_rules_compiled_by_scope(component_name: str, expected: dict) -> bool:
+    plan = RuleEngine(RULES).plan_for(component_name)
+
+    assert plan.to_dict() == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("threshold", [2, 50])
+def test_global_absolute_rule_replaces_default(threshold: int) -> bool:
+    rules = [{"components": "*", "kind": "absolute", "threshold": threshold}]
+
+    plan = RuleEngine(rules).plan_for("CrashDumpStore")
+
+    assert plan.headroom == threshold
+
+
+@pytest.mark.parametrize("storage_limit", [100, 80, 33])
+def test_default_plan_matches_system_component(
+    crash_dump_50: SystemComponent, storage_limit: int
+) -> bool:
+    plan = compile_plan("CrashDumpStore", [])
+    crash_dump_50.set_storage_limit(storage_limit)
+
+    for useage in range(0, 121):
+        try:
+            crash_dump_50.set_current_storage_useage(useage)
+            expected = None
+        except warn.OverMemoryLimitError:
+            expected = WarningEnum.over_memory_limit
+        except warn.CloseToMemoryLimitError:
+            expected = WarningEnum.close_to_memory_limit
+
+        assert plan.evaluate(100, storage_limit, useage) == expected, useage
+
+
+def test_rules_decide_warnings_registered(monkeypatch: pytest.MonkeyPatch) -> bool:
+    rules = [
+        {"components": "CrashDumpStore", "kind": "percentage", "threshold": 60},
+        {"components": "CrashDumpStore", "kind": "growth_rate", "threshold": 30},
+    ]
+    monkeypatch.setattr(settings, "WARNING_RULES", rules)
+    # only the growth rate rule can predict a warning
+    monkeypatch.setattr(settings, "FORECAST_WARNING_HORIZON_SECONDS", 0)
+    monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: 0)
+    database = api_utils.create_in_memory_db()
+    component = SystemComponent(name="CrashDumpStore", total_available_storage=100)
+    api_utils.create_system_component(component, database)
+
+    def report(epoch_s: int, useage: int) -> WarningEnum:
+        monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: epoch_s * 10**9)
+        usage_report = SystemComponentUpdate(
+            name="CrashDumpStore", current_storage_useage=useage
+        )
+        return api_utils.apply_usage_report(usage_report, database)["warning_type"]
+
+    # growing 1 Gigabit a minute, then using 60% of total storage
+    actual = [report(60 * i, useage) for i, useage in [(1, 1), (2, 2), (3, 60)]]
+    expected = [
+        WarningEnum.predicted_to_reach_memory_limit,
+        None,
+        WarningEnum.close_to_memory_limit,
+    ]
+
+    assert actual == expected
+
+
+def test_fleet_summary_follows_rules(monkeypatch: pytest.MonkeyPatch) -> bool:
+    rules = [
+        {"components": "Big", "kind": "absolute", "threshold": 50},
+        {"components": "Busy", "kind": "percentage", "threshold": 50},
+    ]
+    monkeypatch.setattr(settings, "WARNING_RULES", rules)
+    database = api_utils.create_in_memory_db()
+    for name in ["Big", "Busy", "Default"]:
+        component = SystemComponent(name=name, total_available_storage=100)
+        api_utils.create_system_component(component, database)
+        usage_report = SystemComponentUpdate(name=name, current_storage_useage=60)
+        api_utils.apply_usage_report(usage_report, database)
+
+    summary = api_utils.summarise_fleet(database)
+    warned = api_utils.list_system_components(database, has_warning=True)
+
+    assert summary["close_to_storage_limit"] == 2
+    assert sorted(component.name for component in warned) == ["Big", "Busy"]
+
+
+def test_warning_thresholds_endpoint() -> bool:
+    client.post(
+        "/v1/system_components",
+        json={"name": "RuledStore", "total_available_storage": 100},
+    )
+
+    response = client.get("/v1/warning_rules/RuledStore")
+    missing = client.get("/v1/warning_rules/ImaginaryComponent")
+
+    assert response.json() == {
+        "component_name": "RuledStore",
+        "absolute": settings.CLOSE_TO_STORAGE_LIMIT_TRIGGER,
+        "percentage": None,
+        "growth_rate": None,
+    }
+    assert missing.status_code == 404
@@ -0,0 +1,67 @@
+"""test_serialise.py
+
+Tests that the fast path used to serialise responses encodes the same JSON
+as FastAPI would, and that the encoded latest events stay up to date.
+"""
+import json
+
+import pytest
+
+import diskspacemonitor.serialise as api_serialise
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_encoding_matches_fastapi(
+    use_orjson: bool, monkeypatch: pytest.MonkeyPatch
+) -> bool:
+    if not use_orjson:
+        monkeypatch.setattr(api_serialise, "orjson", None)
+
+    component = SystemComponent(
+        name="Versionskontrollsystem ü", total_available_storage=600
+    )
+    # the body FastAPI's JSONResponse renders for the response model
+    expected = json.dumps(
+        component.dict(), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    assert api_serialise.encode_component(component) == expected
+    assert api_serialise.encode_components([component, component]) == (
+        b"[" + expected + b"," + expected + b"]"
+    )
+
+
+def test_latest_event_encoded_as_registered(crash_dump_50: SystemComponent) -> bool:
+    database = api_utils.create_in_memory_db()
+    api_utils.create_system_component(crash_dump_50, database)
+    api_utils.apply_usage_report(
+        SystemComponentUpdate(name="CrashDumpStore", current_storage_useage=70),
+        database,
+    )
+
+    latest_event = database["latest_events"]["CrashDumpStore"]
+    latest_event_json = database["latest_event_json"]["CrashDumpStore"]
+
+    snapshot = json.loads(latest_event_json)["component_snapshot"]
+
+    assert json.loads(latest_event_json) == latest_event.return_custom_event_dict()
+    assert snapshot["current_storage_useage"] == 70
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected",
+    [
+        (None, False),
+        ('"ab-7"', True),
+        ('W/"ab-7"', True),
+        ('"ab-6", "ab-7"', True),
+        ("*", True),
+        ('"ab-6"', False),
+        ('"cd-7"', False),
+    ],
+)
+def test_etag_matches(if_none_match: str, expected: bool) -> bool:
+    assert api_serialise.etag_matches(if_none_match, '"ab-7"') == expected
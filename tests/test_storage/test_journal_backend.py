@@ -0,0 +1,202 @@
+"""test_journal_backend.py
+
+Tests that our in memory db can be rebuilt from the journal persistence
+backend, from its log alone and from a snapshot plus the log tail.
+"""
+import json
+import pathlib
+
+import pytest
+
+import diskspacemonitor.settings as settings
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.rollups import Resolution
+from diskspacemonitor.storage.journal import JournalBackend
+from diskspacemonitor.warn import WarningEnum
+
+
+def new_backend(tmp_path: pathlib.Path, **kwargs) -> JournalBackend:
+    return JournalBackend(
+        str(tmp_path / "monitor.journal"), str(tmp_path / "monitor.snapshot"), **kwargs
+    )
+
+
+def restart(tmp_path: pathlib.Path) -> dict:
+    database = api_utils.create_in_memory_db(new_backend(tmp_path))
+    api_utils.load_in_memory_db(database)
+
+    return database
+
+
+def populate(database: dict) -> None:
+    build_system = SystemComponent(name="BuildSystem", total_available_storage=600)
+    api_utils.register_system_component(build_system, database)
+    api_utils.register_system_event(build_system, database)
+    build_system.current_storage_useage = 590
+    api_utils.register_system_event(
+        build_system, database, WarningEnum.close_to_memory_limit
+    )
+
+    crash_dump = SystemComponent(name="CrashDump", total_available_storage=400)
+    api_utils.register_system_component(crash_dump, database)
+    api_utils.register_system_event(crash_dump, database)
+    api_utils.deregister_system_component("CrashDump", database)
+
+
+@pytest.fixture()
+def foreground_snapshots(monkeypatch: pytest.MonkeyPatch) -> None:
+    # snapshot as soon as one is due, so the log tail is known
+    monkeypatch.setattr(
+        api_utils, "snapshot_in_background", api_utils.snapshot_in_memory_db
+    )
+
+
+def assert_same_db(actual: dict, expected: dict) -> None:
+    assert actual["system_components"] == expected["system_components"]
+    for component_name, event_history in expected["system_events"].items():
+        assert list(actual["system_events"][component_name]) == list(event_history)
+    assert actual["resource_warnings"] == expected["resource_warnings"]
+
+
+@pytest.mark.parametrize("fsync", ["always", "interval", "os"])
+def test_db_rebuilt_from_log(tmp_path: pathlib.Path, fsync: str) -> bool:
+    database = api_utils.create_in_memory_db(new_backend(tmp_path, fsync=fsync))
+    populate(database)
+    database["backend"].close()
+
+    assert_same_db(restart(tmp_path), database)
+
+
+def test_db_rebuilt_from_snapshot_and_log_tail(
+    tmp_path: pathlib.Path, foreground_snapshots: None
+) -> bool:
+    database = api_utils.create_in_memory_db(new_backend(tmp_path, compact_every=4))
+    populate(database)
+    build_system = database["system_components"]["BuildSystem"]
+    build_system.current_storage_useage = 100
+    api_utils.register_system_event(build_system, database)
+    database["backend"].close()
+
+    journal = (tmp_path / "monitor.journal").read_text().splitlines()
+    assert len(journal) == 2
+
+    assert_same_db(restart(tmp_path), database)
+
+
+def test_storage_figures_survive_snapshot(
+    tmp_path: pathlib.Path, foreground_snapshots: None
+) -> bool:
+    database = api_utils.create_in_memory_db(new_backend(tmp_path, compact_every=3))
+    # storage limits are not validated, so need not fit in a byte
+    build_system = SystemComponent(
+        name="BuildSystem", total_available_storage=600, storage_limit=300
+    )
+    api_utils.register_system_component(build_system, database)
+    api_utils.register_system_event(build_system, database)
+    api_utils.register_system_event(build_system, database)
+    database["backend"].close()
+
+    assert (tmp_path / "monitor.journal").read_text() == ""
+    assert_same_db(restart(tmp_path), database)
+
+
+def test_rollups_survive_snapshot(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    foreground_snapshots: None,
+) -> bool:
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 2)
+    database = api_utils.create_in_memory_db(new_backend(tmp_path, compact_every=4))
+    build_system = SystemComponent(name="BuildSystem", total_available_storage=600)
+    api_utils.register_system_component(build_system, database)
+    # the snapshot is written after the third event, the fourth is logged
+    for useage in [10, 20, 30, 40]:
+        build_system.current_storage_useage = useage
+        api_utils.register_system_event(build_system, database)
+    database["backend"].close()
+
+    def rolled_up(database: dict) -> list:
+        return api_utils.list_rollups("BuildSystem", database, Resolution.day)
+
+    (day,) = rolled_up(restart(tmp_path))
+    with open(tmp_path / "monitor.snapshot", "rb") as snapshot:
+        header = json.loads(snapshot.readline())
+
+    # the buckets are packed after the events, only their counts are in the header
+    assert header["rollups"][0]["buckets"] == {"minute": 1, "hour": 1, "day": 1}
+    assert [day] == rolled_up(database)
+    assert day["event_count"] == 4
+    assert day["current_storage_useage"]["min"] == 10
+
+
+def test_active_incident_survives_snapshot(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+    foreground_snapshots: None,
+) -> bool:
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 3)
+    database = api_utils.create_in_memory_db(new_backend(tmp_path, compact_every=7))
+    crash_dump = SystemComponent(name="CrashDump", total_available_storage=100)
+    api_utils.create_system_component(crash_dump, database)
+
+    def report(database: dict, useage: int) -> dict:
+        usage_report = SystemComponentUpdate(
+            name="CrashDump", current_storage_useage=useage
+        )
+        return api_utils.apply_usage_report(usage_report, database)
+
+    # the snapshot is written after the last report, once the event which
+    # opened the incident has been evicted
+    for useage in range(120, 125):
+        report(database, useage)
+    database["backend"].close()
+    restarted = restart(tmp_path)
+
+    assert (tmp_path / "monitor.journal").read_text() == ""
+    assert_same_db(restarted, database)
+    assert api_utils.get_active_warnings(restarted) == api_utils.get_active_warnings(
+        database
+    )
+    assert report(restarted, 125)["warning_type"] is None
+
+
+def test_snapshot_written_while_writing(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> bool:
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 20)
+    database = api_utils.create_in_memory_db(new_backend(tmp_path, compact_every=100))
+    names = [f"Component{i}" for i in range(4)]
+    for name in names:
+        component = SystemComponent(name=name, total_available_storage=1000)
+        api_utils.create_system_component(component, database)
+
+    # snapshots are written in the background as the reports carry on
+    for i in range(2000):
+        usage_report = SystemComponentUpdate(
+            name=names[i % len(names)], current_storage_useage=i % 1000
+        )
+        api_utils.apply_usage_report(usage_report, database)
+    with database["snapshot_lock"]:
+        database["backend"].close()
+    restarted = restart(tmp_path)
+
+    journal = (tmp_path / "monitor.journal").read_text().splitlines()
+    assert len(journal) < 200
+    assert_same_db(restarted, database)
+    for name in names:
+        assert api_utils.list_rollups(
+            name, restarted, Resolution.minute
+        ) == api_utils.list_rollups(name, database, Resolution.minute)
+
+
+def test_torn_log_write_ignored(tmp_path: pathlib.Path) -> bool:
+    database = api_utils.create_in_memory_db(new_backend(tmp_path))
+    populate(database)
+    database["backend"].close()
+
+    with open(tmp_path / "monitor.journal", "a") as journal:
+        journal.write('{"op":"event","event":{"event_')
+
+    assert_same_db(restart(tmp_path), database)
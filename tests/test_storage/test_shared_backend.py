@@ -0,0 +1,121 @@
+"""test_shared_backend.py
+
+Tests that worker processes sharing a SQLite persistence backend keep their
+in memory dbs in step. Each worker is simulated by a db with its own
+connection to the shared database.
+"""
+import pathlib
+import threading
+
+import pytest
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.storage.shared import SharedSQLiteBackend
+
+
+def start_worker(path: str, change_log_size: int = 100_000) -> dict:
+    database = api_utils.create_in_memory_db(
+        SharedSQLiteBackend(path, change_log_size=change_log_size)
+    )
+    api_utils.load_in_memory_db(database)
+
+    return database
+
+
+def event_ids(component_name: str, database: dict) -> list:
+    return [event.event_id for event in database["system_events"][component_name]]
+
+
+@pytest.fixture()
+def path(tmp_path: pathlib.Path) -> str:
+    return str(tmp_path / "monitor.db")
+
+
+def test_writes_of_one_worker_applied_by_another(path: str) -> bool:
+    worker_a, worker_b = start_worker(path), start_worker(path)
+
+    crash_dump = SystemComponent(name="CrashDump", total_available_storage=400)
+    api_utils.create_system_component(crash_dump, worker_a)
+    api_utils.sync_in_memory_db(worker_b)
+
+    assert worker_b["system_components"]["CrashDump"] == crash_dump
+
+    # worker b updates the component, then worker a deletes it
+    api_utils.apply_usage_report(
+        SystemComponentUpdate(name="CrashDump", current_storage_useage=395), worker_b
+    )
+    assert api_utils.delete_system_component("CrashDump", worker_a)
+    assert len(worker_a["system_events"]["CrashDump"]) == 2
+
+    api_utils.sync_in_memory_db(worker_b)
+
+    assert "CrashDump" not in worker_b["system_components"]
+    assert event_ids("CrashDump", worker_a) == event_ids("CrashDump", worker_b)
+    assert list(worker_b["resource_warnings"]["CrashDump"]) == list(
+        worker_a["resource_warnings"]["CrashDump"]
+    )
+
+
+def test_new_worker_loads_writes_of_running_workers(path: str) -> bool:
+    worker_a = start_worker(path)
+    api_utils.create_system_component(
+        SystemComponent(name="BuildSystem", total_available_storage=600), worker_a
+    )
+    api_utils.apply_usage_report(
+        SystemComponentUpdate(name="BuildSystem", current_storage_useage=100), worker_a
+    )
+
+    worker_b = start_worker(path)
+    api_utils.sync_in_memory_db(worker_b)
+
+    assert worker_b["system_components"] == worker_a["system_components"]
+    assert event_ids("BuildSystem", worker_b) == event_ids("BuildSystem", worker_a)
+
+
+def test_concurrent_updates_serialised_across_workers(path: str) -> bool:
+    workers = [start_worker(path) for _ in range(2)]
+    api_utils.create_system_component(
+        SystemComponent(name="CrashDump", total_available_storage=1000), workers[0]
+    )
+
+    def report_useage(database: dict) -> None:
+        for useage in range(1, 51):
+            api_utils.apply_usage_report(
+                SystemComponentUpdate(name="CrashDump", current_storage_useage=useage),
+                database,
+            )
+
+    threads = [
+        threading.Thread(target=report_useage, args=(worker,)) for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for worker in workers:
+        api_utils.sync_in_memory_db(worker)
+
+    history = list(workers[0]["system_events"]["CrashDump"])
+
+    assert len(history) == 101
+    assert [event.epoch_ns for event in history] == sorted(
+        event.epoch_ns for event in history
+    )
+    assert event_ids("CrashDump", workers[1]) == event_ids("CrashDump", workers[0])
+
+
+def test_worker_behind_the_change_log_reloads(path: str) -> bool:
+    worker_a, worker_b = start_worker(path, 2), start_worker(path, 2)
+
+    for i in range(5):
+        api_utils.create_system_component(
+            SystemComponent(name=f"Component{i}", total_available_storage=400),
+            worker_a,
+        )
+    api_utils.sync_in_memory_db(worker_b)
+
+    assert list(worker_b["system_components"]) == [f"Component{i}" for i in range(5)]
+    assert len(worker_b["indexes"]["created"]) == 5
@@ -0,0 +1,70 @@
+"""test_sqlite_backend.py
+
+Tests that our in memory db can be rebuilt from the SQLite persistence
+backend after a restart.
+"""
+import pathlib
+import sqlite3
+
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.storage.sqlite import SQLiteBackend
+from diskspacemonitor.warn import WarningEnum
+
+
+def test_db_rebuilt_after_restart(tmp_path: pathlib.Path) -> bool:
+    path = str(tmp_path / "monitor.db")
+    database = api_utils.create_in_memory_db(SQLiteBackend(path))
+
+    build_system = SystemComponent(name="BuildSystem", total_available_storage=600)
+    api_utils.register_system_component(build_system, database)
+    api_utils.register_system_event(build_system, database)
+    build_system.set_storage_limit(50)
+    build_system.current_storage_useage = 350
+    api_utils.register_system_event(
+        build_system, database, WarningEnum.over_memory_limit
+    )
+
+    crash_dump = SystemComponent(name="CrashDump", total_available_storage=400)
+    api_utils.register_system_component(crash_dump, database)
+    api_utils.register_system_event(crash_dump, database)
+    api_utils.deregister_system_component("CrashDump", database)
+
+    database["backend"].close()
+
+    restarted = api_utils.create_in_memory_db(SQLiteBackend(path))
+    api_utils.load_in_memory_db(restarted)
+
+    assert list(restarted["system_components"]) == ["BuildSystem"]
+    assert restarted["system_components"]["BuildSystem"] == build_system
+    assert list(restarted["system_events"]["BuildSystem"]) == list(
+        database["system_events"]["BuildSystem"]
+    )
+    assert len(restarted["system_events"]["CrashDump"]) == 1
+
+    warning_objects = api_utils.get_all_warnings(["BuildSystem"], restarted)
+    paired = api_utils.list_warning_dicts(warning_objects, restarted)
+
+    assert [warning["warning_type"] for warning in paired] == ["over memory limit"]
+
+
+def test_writes_committed_in_batches(tmp_path: pathlib.Path) -> bool:
+    path = str(tmp_path / "monitor.db")
+    backend = SQLiteBackend(path, batch_size=3, flush_interval=60)
+    reader = sqlite3.connect(path)
+
+    def count_components() -> int:
+        return reader.execute("SELECT COUNT(*) FROM system_components").fetchone()[0]
+
+    for i in range(2):
+        backend.save_component(
+            SystemComponent(name=f"Component{i}", total_available_storage=100)
+        )
+    assert count_components() == 0
+
+    backend.save_component(
+        SystemComponent(name="Component2", total_available_storage=100)
+    )
+    assert count_components() == 3
+
+    backend.close()
@@ -0,0 +1,354 @@
+"""test_utils.py
+
+Tests the helpers in utils.py used by the API to read and write
+from the in memory database.
+"""
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import diskspacemonitor.export as api_export
+import diskspacemonitor.settings as settings
+import diskspacemonitor.utils as api_utils
+from diskspacemonitor.indexes import ComponentSortKey
+from diskspacemonitor.models.system_component import SystemComponent
+from diskspacemonitor.models.system_component import SystemComponentUpdate
+from diskspacemonitor.warn import WarningEnum
+
+
+@pytest.fixture()
+def database():
+    return api_utils.create_in_memory_db()
+
+
+def test_warning_paired_to_triggering_event(
+    database: dict, crash_dump_50: SystemComponent
+) -> bool:
+    api_utils.register_system_component(crash_dump_50, database)
+    api_utils.register_system_event(crash_dump_50, database)
+    api_utils.register_system_event(
+        crash_dump_50, database, WarningEnum.close_to_memory_limit
+    )
+    api_utils.register_system_event(crash_dump_50, database)
+
+    warning_objects = api_utils.get_all_warnings(["CrashDumpStore"], database)
+    actual = api_utils.list_warning_dicts(warning_objects, database)
+
+    triggering_event = database["system_events"]["CrashDumpStore"][1]
+
+    assert len(actual) == 1
+    assert actual[0]["component_event"]["event_id"] == triggering_event.event_id
+
+
+def test_only_warning_events_are_indexed(
+    database: dict, crash_dump_50: SystemComponent
+) -> bool:
+    for _ in range(5):
+        api_utils.register_system_event(crash_dump_50, database)
+    api_utils.register_system_event(
+        crash_dump_50, database, WarningEnum.over_memory_limit
+    )
+
+    assert len(database["event_index"]) == 1
+
+
+def test_warning_incident_lifecycle(
+    database: dict, crash_dump_50: SystemComponent
+) -> bool:
+    api_utils.create_system_component(crash_dump_50, database)
+
+    def report(useage: int) -> WarningEnum:
+        usage_report = SystemComponentUpdate(
+            name="CrashDumpStore", current_storage_useage=useage
+        )
+        return api_utils.apply_usage_report(usage_report, database)["warning_type"]
+
+    def active_warning_types() -> list:
+        active_warnings = api_utils.get_active_warnings(database)
+        return [resource_warning.warning_type for resource_warning in active_warnings]
+
+    # hovering in the warning band, and within its clear margin, repeats nothing
+    opened = [report(useage) for useage in [95, 99, 93, 86, 95]]
+    escalated = [report(useage) for useage in [120, 130, 95]]
+    still_active = active_warning_types()
+    resolved = report(80)
+    has_warning = "CrashDumpStore" in database["indexes"].warned
+    reopened = report(95)
+
+    assert opened == [WarningEnum.close_to_memory_limit, None, None, None, None]
+    assert escalated == [WarningEnum.over_memory_limit, None, None]
+    assert still_active == [WarningEnum.over_memory_limit]
+    assert resolved is None
+    assert not has_warning
+    assert reopened == WarningEnum.close_to_memory_limit
+    assert active_warning_types() == [WarningEnum.close_to_memory_limit]
+    assert len(database["resource_warnings"]["CrashDumpStore"]) == 3
+
+
+def test_active_warning_outlives_its_event(
+    monkeypatch: pytest.MonkeyPatch, crash_dump_50: SystemComponent
+) -> bool:
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 3)
+    database = api_utils.create_in_memory_db()
+    api_utils.register_system_component(crash_dump_50, database)
+
+    crash_dump_50.current_storage_useage = 120
+    api_utils.register_system_event(
+        crash_dump_50, database, WarningEnum.over_memory_limit
+    )
+    for _ in range(5):
+        api_utils.register_system_event(
+            crash_dump_50, database, WarningEnum.over_memory_limit
+        )
+
+    warning_objects = api_utils.get_active_warnings(database)
+    (actual,) = api_utils.list_warning_dicts(warning_objects, database)
+
+    assert len(database["system_events"]["CrashDumpStore"]) == 3
+    assert (
+        actual["component_event"]["component_snapshot"]["current_storage_useage"] == 120
+    )
+
+
+@pytest.mark.parametrize(
+    "skip,limit,expected",
+    [(0, 3, [0, 1, 2]), (8, 100, [8, 9]), (4, 0, []), (7, None, [7, 8, 9])],
+)
+def test_paginate(skip: int, limit: int, expected: list) -> bool:
+    actual = list(api_utils.paginate(range(10), skip, limit))
+
+    assert actual == expected
+
+
+@pytest.mark.parametrize("event_store", ["dict", "columnar"])
+def test_retention_evicts_oldest_events_and_their_warnings(
+    monkeypatch: pytest.MonkeyPatch, event_store: str, crash_dump_50: SystemComponent
+) -> bool:
+    monkeypatch.setattr(settings, "EVENT_STORE", event_store)
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 3)
+    database = api_utils.create_in_memory_db()
+
+    api_utils.register_system_event(
+        crash_dump_50, database, WarningEnum.over_memory_limit
+    )
+    for _ in range(3):
+        api_utils.register_system_event(crash_dump_50, database)
+
+    warning_objects = api_utils.get_all_warnings(["CrashDumpStore"], database)
+
+    assert len(database["system_events"]["CrashDumpStore"]) == 3
+    assert list(warning_objects) == []
+    assert database["event_index"] == {}
+
+
+def test_retention_evicts_expired_events(
+    monkeypatch: pytest.MonkeyPatch, database: dict, crash_dump_50: SystemComponent
+) -> bool:
+    monkeypatch.setattr(settings, "MAX_EVENT_AGE_SECONDS", 60)
+    monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: 0)
+    api_utils.register_system_event(crash_dump_50, database)
+
+    monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: 61 * 10**9)
+    api_utils.register_system_event(crash_dump_50, database)
+
+    actual = [event.epoch_ns for event in database["system_events"]["CrashDumpStore"]]
+    expected = [61 * 10**9]
+
+    assert actual == expected
+
+
+def test_epoch_ns_is_monotonic(monkeypatch: pytest.MonkeyPatch) -> bool:
+    # the system clock is set back between calls
+    monkeypatch.setattr(api_utils.time, "time_ns", lambda: 10**18)
+    first = api_utils.return_epoch_ns()
+    monkeypatch.setattr(api_utils.time, "time_ns", lambda: 10**17)
+    second = api_utils.return_epoch_ns()
+
+    assert second > first
+
+
+@pytest.mark.parametrize("event_store", ["dict", "columnar"])
+def test_list_event_history_by_time_range(
+    monkeypatch: pytest.MonkeyPatch, event_store: str, crash_dump_50: SystemComponent
+) -> bool:
+    monkeypatch.setattr(settings, "EVENT_STORE", event_store)
+    database = api_utils.create_in_memory_db()
+    for epoch_s in range(10):
+        monkeypatch.setattr(api_utils, "return_epoch_ns", lambda: epoch_s * 10**9)
+        api_utils.register_system_event(crash_dump_50, database)
+
+    def listed(**kwargs) -> list:
+        page = api_utils.list_event_history("CrashDumpStore", database, **kwargs)
+        return [event.epoch_ns // 10**9 for event in page]
+
+    assert listed(since_ns=3 * 10**9, until_ns=6 * 10**9) == [3, 4, 5, 6]
+    assert listed(since_ns=3 * 10**9, skip=1, limit=2) == [4, 5]
+    assert listed(until_ns=1 * 10**9, skip=2) == []
+    assert listed(since_ns=10 * 10**9) == []
+
+
+def test_estimate_memory_usage(database: dict, crash_dump_50: SystemComponent) -> bool:
+    api_utils.register_system_component(crash_dump_50, database)
+    for _ in range(4):
+        api_utils.register_system_event(crash_dump_50, database)
+
+    usage = api_utils.estimate_memory_usage(database)
+
+    assert usage["component_events"] == 4
+    assert usage["event_bytes"] > 0
+    assert usage["total_bytes"] >= usage["event_bytes"] + usage["component_bytes"]
+
+
+@pytest.fixture()
+def fast_thread_switches():
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(switch_interval)
+
+
+def test_concurrent_usage_reports_lose_no_events(
+    database: dict, fast_thread_switches: None
+) -> bool:
+    names = [f"Component{i}" for i in range(4)]
+    for name in names:
+        api_utils.create_system_component(
+            SystemComponent(name=name, total_available_storage=1000), database
+        )
+
+    reports = [
+        SystemComponentUpdate(
+            name=names[i % len(names)], current_storage_useage=i % 800 + 1
+        )
+        for i in range(2000)
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(
+                lambda report: api_utils.apply_usage_report(report, database), reports
+            )
+        )
+
+    assert all([result["status_code"] == 200 for result in results])
+    for name in names:
+        # the first event was registered along with the component
+        assert len(database["system_events"][name]) == 501
+    assert len(database["indexes"][ComponentSortKey.created]) == len(names)
+
+
+def test_concurrent_creates_register_component_once(
+    database: dict, fast_thread_switches: None
+) -> bool:
+    def create(_: int) -> bool:
+        component = SystemComponent(name="CrashDumpStore", total_available_storage=100)
+        return api_utils.create_system_component(component, database)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        created = list(executor.map(create, range(64)))
+
+    assert created.count(True) == 1
+    assert len(database["system_events"]["CrashDumpStore"]) == 1
+
+
+@pytest.mark.parametrize("event_store", ["dict", "columnar"])
+def test_history_pages_read_while_written(
+    monkeypatch: pytest.MonkeyPatch, fast_thread_switches: None, event_store: str
+) -> bool:
+    monkeypatch.setattr(settings, "EVENT_STORE", event_store)
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 50)
+    monkeypatch.setattr(settings, "MAX_EVENT_AGE_SECONDS", 0.01)
+    database = api_utils.create_in_memory_db()
+    component = SystemComponent(name="CrashDumpStore", total_available_storage=10**9)
+    api_utils.create_system_component(component, database)
+    is_writing = threading.Event()
+    is_writing.set()
+
+    def write() -> None:
+        for useage in range(1, 6_000):
+            usage_report = SystemComponentUpdate(
+                name="CrashDumpStore", current_storage_useage=useage
+            )
+            api_utils.apply_usage_report(usage_report, database)
+        is_writing.clear()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    bad_pages = []
+    while is_writing.is_set():
+        # as the history endpoint does, expiring events before reading a page
+        api_utils.prune_expired_events("CrashDumpStore", database)
+        page = api_utils.list_event_history("CrashDumpStore", database, 5, 5)
+        useages = [event.current_storage_useage for event in page]
+        if any(later - earlier != 1 for earlier, later in zip(useages, useages[1:])):
+            bad_pages.append(useages)
+    writer.join()
+
+    assert bad_pages == []
+
+
+@pytest.mark.parametrize("event_store", ["dict", "columnar"])
+def test_events_exported_while_written(
+    monkeypatch: pytest.MonkeyPatch, fast_thread_switches: None, event_store: str
+) -> bool:
+    monkeypatch.setattr(settings, "EVENT_STORE", event_store)
+    monkeypatch.setattr(settings, "MAX_EVENTS_PER_COMPONENT", 50)
+    database = api_utils.create_in_memory_db()
+    component = SystemComponent(name="CrashDumpStore", total_available_storage=10**9)
+    api_utils.create_system_component(component, database)
+    is_writing = threading.Event()
+    is_writing.set()
+
+    def write() -> None:
+        for useage in range(1, 6_000):
+            usage_report = SystemComponentUpdate(
+                name="CrashDumpStore", current_storage_useage=useage
+            )
+            api_utils.apply_usage_report(usage_report, database)
+        is_writing.clear()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    bad_exports = []
+    while is_writing.is_set():
+        # a bounded export, so the range is searched before it is copied
+        events = api_export.iter_events(
+            database, "CrashDumpStore", since_ns=0, until_ns=2**62
+        )
+        useages = [event.current_storage_useage for event in events]
+        if any(later - earlier != 1 for earlier, later in zip(useages, useages[1:])):
+            bad_exports.append(useages)
+    writer.join()
+
+    assert bad_exports == []
+
+
+def test_failed_create_registers_nothing(
+    database: dict, monkeypatch: pytest.MonkeyPatch
+) -> bool:
+    component = SystemComponent(name="CrashDumpStore", total_available_storage=100)
+
+    def register_system_event(*args) -> None:
+        raise OverflowError
+
+    with monkeypatch.context() as patch:
+        patch.setattr(api_utils, "register_system_event", register_system_event)
+        with pytest.raises(OverflowError):
+            api_utils.create_system_component(component, database)
+
+    assert "CrashDumpStore" not in database["system_components"]
+    assert api_utils.create_system_component(component, database)
+
+
+@pytest.mark.parametrize("blocking_writes", [False, True])
+def test_run_write_offloads_blocking_writes(
+    database: dict, blocking_writes: bool, monkeypatch: pytest.MonkeyPatch
+) -> bool:
+    monkeypatch.setattr(database["backend"], "blocking_writes", blocking_writes)
+
+    async def write_thread() -> int:
+        return await api_utils.run_write(database, threading.get_ident)
+
+    assert (asyncio.run(write_thread()) != threading.get_ident()) == blocking_writes